@@ -0,0 +1,77 @@
+from functools import lru_cache
+from typing import Optional
+from app.services.llm_service import LLMService
+from app.services.vectore_store_service import VectorStoreService
+from app.services.invoice_index import InvoiceIndex
+from app.services.lexical_index import LexicalIndex
+from app.core.config import LEXICAL_INDEX_PATH, CHATBOT_ANSWER_CACHE_SIZE
+from app.services.chat_session_manager import ChatSessionManager
+from app.services.invoice_pipeline import InvoicePipeline
+from app.services.policy_cache import PolicyCache
+from app.services.analysis_cache import AnalysisCache, create_analysis_cache
+from app.services.job_manager import JobManager
+from app.services.filter_extractor import FilterExtractor
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.rule_engine import PolicyRuleEngine, load_rule_engine
+
+# Application-scoped services, created once per process and shared by every router
+
+
+@lru_cache
+def get_llm_service() -> LLMService:
+    return LLMService()
+
+
+@lru_cache
+def get_vector_store() -> VectorStoreService:
+    return VectorStoreService(invoice_index=get_invoice_index(), lexical_index=get_lexical_index())
+
+
+@lru_cache
+def get_invoice_index() -> InvoiceIndex:
+    return InvoiceIndex()
+
+
+@lru_cache
+def get_lexical_index() -> Optional[LexicalIndex]:
+    return LexicalIndex() if LEXICAL_INDEX_PATH else None
+
+
+@lru_cache
+def get_chat_manager() -> ChatSessionManager:
+    return ChatSessionManager()
+
+
+@lru_cache
+def get_invoice_pipeline() -> InvoicePipeline:
+    return InvoicePipeline(get_llm_service(), get_vector_store(), get_analysis_cache(), rule_engine=get_rule_engine())
+
+
+@lru_cache
+def get_policy_cache() -> PolicyCache:
+    return PolicyCache()
+
+
+@lru_cache
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    return create_analysis_cache()
+
+
+@lru_cache
+def get_job_manager() -> JobManager:
+    return JobManager(get_invoice_pipeline(), get_policy_cache())
+
+
+@lru_cache
+def get_filter_extractor() -> FilterExtractor:
+    return FilterExtractor(get_llm_service(), get_vector_store())
+
+
+@lru_cache
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    return SemanticAnswerCache(get_vector_store().embedding_model) if CHATBOT_ANSWER_CACHE_SIZE > 0 else None
+
+
+@lru_cache
+def get_rule_engine() -> Optional[PolicyRuleEngine]:
+    return load_rule_engine()
@@ -1,37 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from app.services.pdf_processor import PDFProcessor
-from app.services.llm_service import LLMService
-from app.services.vectore_store_service import VectorStoreService
-from app.services.chat_session_manager import ChatSessionManager
-import tempfile
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from app.api.deps import get_invoice_pipeline, get_policy_cache, get_job_manager
+from app.services.invoice_pipeline import InvoicePipeline, invoice_result
+from app.services.job_manager import JobManager
+from app.services.policy_cache import PolicyCache
+from app.services.invoice_archive import open_invoice_archive, ArchiveLimitError
 import zipfile
-from io import BytesIO
-from pathlib import Path
-from datetime import datetime
 from logger import logger
-from app.models.models import InvoiceAnalysisResponse
+from app.models.models import InvoiceAnalysisResponse, JobSubmissionResponse, JobStatusResponse
 
 router = APIRouter()
 
-# Initialize services
-pdf_processor = PDFProcessor()
-llm_service = LLMService()
-vector_store = VectorStoreService()
-chat_manager = ChatSessionManager()
+
+async def _resolve_policy(invoices_zip: UploadFile,
+                          policy_file: Optional[UploadFile],
+                          policy_id: Optional[str],
+                          policy_cache: PolicyCache):
+    """Validate the uploads and return (policy_id, policy_text) from the file or a registered ID"""
+
+    if policy_file is None and not policy_id:
+        raise HTTPException(status_code=400, detail="Either policy_file or policy_id is required")
+
+    if policy_file is not None and not policy_file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Policy file must be a PDF")
+    
+    if not invoices_zip.filename.endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Invoices file must be a ZIP archive")
+    
+    if policy_file is not None:
+        return await policy_cache.get_or_extract(await policy_file.read())
+
+    policy_content = policy_cache.get_text(policy_id)
+    if policy_content is None:
+        raise HTTPException(status_code=404, detail=f"Policy {policy_id} not found")
+    return policy_id, policy_content
+
 
 @router.post("/analyze-invoices")
 async def analyze_invoices(
     employee_name: str = Form(...),
-    policy_file: UploadFile = File(...),
-    invoices_zip: UploadFile = File(...)
+    invoices_zip: UploadFile = File(...),
+    policy_file: Optional[UploadFile] = File(None),
+    policy_id: Optional[str] = Form(None),
+    invoice_pipeline: InvoicePipeline = Depends(get_invoice_pipeline),
+    policy_cache: PolicyCache = Depends(get_policy_cache)
     ):
     """
     Endpoint to analyze employee invoices against company policy
     
     Args:
         employee_name: Name of the employee
-        policy_file: PDF file containing HR reimbursement policy
         invoices_zip: ZIP file containing invoice PDFs
+        policy_file: PDF file containing HR reimbursement policy
+        policy_id: ID of a policy registered via /policies, instead of policy_file
     
     Returns:
         JSON response with analysis results
@@ -39,54 +60,74 @@ async def analyze_invoices(
 
     try:
 
-        if not policy_file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Policy file must be a PDF")
-        
-        if not invoices_zip.filename.endswith('.zip'):
-            raise HTTPException(status_code=400, detail="Invoices file must be a ZIP archive")
-        
-        policy_content = await policy_file.read()
-        policy_content = pdf_processor.extract_text_from_pdf(policy_content)
-
-        invoices_content = await invoices_zip.read()
-        invoices_processed = 0
-        errors = []
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with zipfile.ZipFile(BytesIO(invoices_content), 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            for file_path in Path(temp_dir).rglob("*.pdf"):
-                try:
-                    invoice_content = pdf_processor.extract_text_from_pdf(file_path.read_bytes())
-
-                    analysis_result = llm_service.analyze_invoice(invoice_content, policy_content, employee_name)
-                    
-                    employee_name = employee_name.replace(" ", "_").lower()
-                    # Generate unique invoice ID
-                    invoice_id = f"{employee_name}_{file_path.stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-                    success = vector_store.store_invoice_analysis(
-                        invoice_id, invoice_content, analysis_result, employee_name
-                    )
-
-                    if success:
-                        invoices_processed += 1
-                    else:
-                        errors.append(f"Failed to store analysis for {file_path.name}")
-
-                except Exception as e:
-                    error_msg = f"Error processing {file_path.name}: {str(e)}"
-                    errors.append(error_msg)
-                    logger.error(error_msg)
+        policy_id, policy_content = await _resolve_policy(invoices_zip, policy_file, policy_id, policy_cache)
+
+        # UploadFile is already spooled to disk in chunks; read PDFs member by member from it
+        try:
+            zip_ref, invoice_files = open_invoice_archive(invoices_zip.file)
+        except (zipfile.BadZipFile, ArchiveLimitError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid invoices archive: {str(e)}")
+
+        results = []
+        with zip_ref:
+            invoices_processed, errors = await invoice_pipeline.run(
+                invoice_files, policy_content, employee_name, policy_id=policy_id,
+                progress_callback=lambda *outcome: results.append(invoice_result(*outcome))
+            )
 
         return InvoiceAnalysisResponse(
                 status="success" if invoices_processed > 0 else "partial_success",
                 message=f"Successfully processed {invoices_processed} invoice(s)",
                 invoices_processed=invoices_processed,
+                results=results,
                 errors=errors
             )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in analyze_invoices endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/jobs", response_model=JobSubmissionResponse)
+async def submit_analysis_job(
+    employee_name: str = Form(...),
+    invoices_zip: UploadFile = File(...),
+    policy_file: Optional[UploadFile] = File(None),
+    policy_id: Optional[str] = Form(None),
+    policy_cache: PolicyCache = Depends(get_policy_cache),
+    job_manager: JobManager = Depends(get_job_manager)
+    ):
+    """
+    Endpoint to queue invoice analysis as a background job
+    
+    Takes the same inputs as /analyze-invoices but returns immediately with a
+    job ID. Poll /jobs/{job_id} for progress and results.
+    """
+
+    try:
+        policy_id, _ = await _resolve_policy(invoices_zip, policy_file, policy_id, policy_cache)
+
+        try:
+            job_id, total_invoices = await job_manager.submit(employee_name, policy_id, invoices_zip.file)
+        except (zipfile.BadZipFile, ArchiveLimitError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid invoices archive: {str(e)}")
+
+        return JobSubmissionResponse(job_id=job_id, status="queued", total_invoices=total_invoices)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in submit_analysis_job endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_analysis_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Report a job's progress, per-invoice results so far and errors"""
+
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatusResponse(**job)
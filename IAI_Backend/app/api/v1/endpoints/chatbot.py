@@ -1,21 +1,216 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from app.api.deps import (
+    get_llm_service,
+    get_vector_store,
+    get_chat_manager,
+    get_filter_extractor,
+    get_invoice_index,
+    get_answer_cache,
+)
 from app.models.models import ChatbotRequest, ChatbotResponse
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, CHATBOT_ERROR_RESPONSE
 from app.services.vectore_store_service import VectorStoreService
 from app.services.chat_session_manager import ChatSessionManager
+from app.services.filter_extractor import FilterExtractor, detect_query_intent, AGGREGATE_INTENT
+from app.services.invoice_index import InvoiceIndex
+from app.services.answer_cache import SemanticAnswerCache
 from app.models.models import ReimbursementStatus
-from app.core.prompts import FILTER_EXTRACTION_PROMPT
+from app.core.config import CHATBOT_SPECULATIVE_RETRIEVAL, CHATBOT_OVERFETCH_FACTOR
 from logger import logger
-import json
-import re
 router = APIRouter()
-# Initialize services
-llm_service = LLMService()
-vector_store = VectorStoreService()
-chat_manager = ChatSessionManager()
+
+_RESULT_LIMIT = 10
+_LIST_LIMIT = 50
+
+LocalFilters = Tuple[Dict[str, Any], float, bool]
+
+async def _extract_filters(
+    request: ChatbotRequest,
+    filter_extractor: FilterExtractor,
+    local: LocalFilters
+    ) -> Dict[str, Any]:
+    """Search filters mentioned in the query, dropping empty ones"""
+
+    extracted_filters = await filter_extractor.extract_filters(request.query, local)
+
+    filters = {}
+    if extracted_filters.get("employee_name"):
+        filters["employee_name"] = extracted_filters["employee_name"]
+    if extracted_filters.get("status"):
+        filters["status"] = extracted_filters["status"]
+    if extracted_filters.get("invoice_id"):
+        filters["invoice_id"] = extracted_filters["invoice_id"]
+    if extracted_filters.get("date"):
+        filters["date"] = extracted_filters["date"]
+    if extracted_filters.get("amount"):
+        filters["amount"] = extracted_filters["amount"]
+
+    logger.info("Filters extracted: %s", filters)
+    return filters
+
+async def _answer_from_index(
+    request: ChatbotRequest,
+    intent: str,
+    filter_extractor: FilterExtractor,
+    invoice_index: InvoiceIndex,
+    local: LocalFilters
+    ) -> str:
+    """Answer totals and list-all questions exactly from the invoice index, without the LLM"""
+
+    filters = await _extract_filters(request, filter_extractor, local)
+    if intent == AGGREGATE_INTENT:
+        aggregate = await asyncio.to_thread(invoice_index.aggregate, filters)
+        return _format_aggregate_answer(filters, aggregate)
+    rows, total = await asyncio.to_thread(invoice_index.list_invoices, filters, _LIST_LIMIT)
+    return _format_invoice_list(filters, rows, total)
+
+def _describe_filters(filters: Dict[str, Any]) -> str:
+    parts = []
+    if filters.get("status"):
+        parts.append(f"status **{filters['status']}**")
+    if filters.get("employee_name"):
+        parts.append(f"employee **{filters['employee_name']}**")
+    if filters.get("invoice_id"):
+        parts.append(f"invoice **{filters['invoice_id']}**")
+    if filters.get("date"):
+        parts.append(f"date **{filters['date']}**")
+    if filters.get("amount"):
+        parts.append(f"amount around **${float(filters['amount']):.2f}**")
+    return ("matching " + ", ".join(parts)) if parts else "in the database"
+
+def _format_aggregate_answer(filters: Dict[str, Any], aggregate: Dict[str, Any]) -> str:
+    if not aggregate["count"]:
+        return f"No invoices found {_describe_filters(filters)}."
+
+    lines = [
+        f"There are **{aggregate['count']}** invoice(s) {_describe_filters(filters)}.",
+        "",
+        f"- **Total Amount:** ${aggregate['total_amount']:.2f}",
+        f"- **Approved Amount:** ${aggregate['approved_amount']:.2f}",
+    ]
+    if len(aggregate["by_status"]) > 1:
+        lines += ["", "| Status | Invoices | Total Amount | Approved Amount |", "|---|---|---|---|"]
+        for status, entry in aggregate["by_status"].items():
+            lines.append(
+                f"| {status} | {entry['count']} | ${entry['total_amount']:.2f} | ${entry['approved_amount']:.2f} |"
+            )
+    return "\n".join(lines)
+
+def _format_invoice_list(filters: Dict[str, Any], rows: List[Dict[str, Any]], total: int) -> str:
+    if not total:
+        return f"No invoices found {_describe_filters(filters)}."
+
+    lines = [
+        f"Found **{total}** invoice(s) {_describe_filters(filters)}:",
+        "",
+        "| Invoice ID | Employee | Status | Total Amount | Approved Amount | Date |",
+        "|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['invoice_id']} | {row['employee_name']} | {row['status']} | "
+            f"${row['total_amount']:.2f} | ${row['approved_amount']:.2f} | {(row['date'] or 'N/A')[:10]} |"
+        )
+    if total > len(rows):
+        lines += ["", f"Showing the {len(rows)} most recent; {total - len(rows)} more match."]
+    return "\n".join(lines)
+
+async def _retrieve_context(
+    request: ChatbotRequest,
+    filter_extractor: FilterExtractor,
+    vector_store: VectorStoreService,
+    local: LocalFilters
+    ) -> str:
+    """Extract filters from the query, search the vector store and format the hits as prompt context"""
+
+    # Over-fetch unfiltered candidates while the LLM fallback extracts filters; local extraction leaves nothing to overlap
+    _, confidence, _ = local
+    candidates_task = None
+    if CHATBOT_SPECULATIVE_RETRIEVAL and confidence < filter_extractor.min_confidence:
+        candidates_task = asyncio.create_task(vector_store.retrieve_candidates_async(
+            request.query, _RESULT_LIMIT * CHATBOT_OVERFETCH_FACTOR
+        ))
+
+    try:
+        filters = await _extract_filters(request, filter_extractor, local)
+    except BaseException:
+        if candidates_task:
+            candidates_task.cancel()
+        raise
+
+    # Search vector database
+    search_results = None
+    if candidates_task:
+        candidates = await candidates_task
+        search_results = vector_store.filter_results(candidates, filters)[:_RESULT_LIMIT]
+        if len(search_results) < _RESULT_LIMIT and filters:
+            # The filters may have been too selective for the over-fetched pool; run the filtered search
+            search_results = None
+    if search_results is None:
+        search_results = await vector_store.search_invoices_async(request.query, filters, _RESULT_LIMIT)
+    
+    # Format context from search results
+    context = ""
+    for result in search_results:
+        metadata = result["metadata"]
+        context += f"""
+                **Invoice ID:** {metadata.get('invoice_id', 'N/A')}
+                **Employee:** {metadata.get('employee_name', 'N/A')}
+                **Status:** {metadata.get('status', 'N/A')}
+                **Total Amount:** ${metadata.get('total_amount', 0):.2f}
+                **Approved Amount:** ${metadata.get('approved_amount', 0):.2f}
+                **Date:** {metadata.get('date', 'N/A')}
+
+                ---
+                """
+    return context
+
+async def _lookup_cached_answer(
+    request: ChatbotRequest,
+    intent: Optional[str],
+    answer_cache: SemanticAnswerCache,
+    local: LocalFilters,
+    data_version: int
+    ) -> Tuple[Optional[str], Optional[Hashable]]:
+    """
+    Cached answer to a paraphrase of the query, plus the scope to cache a new answer under
+
+    The scope is the intent and the filters the answer is built from, so
+    questions that differ only in a status, name or date never share an
+    answer. Only exact local extractions have such filters: an LLM fallback or
+    an unread phrase like "last week" or "over $500" leaves the filters blind
+    to part of the question, so those queries get no scope and skip the cache.
+    """
+    filters, _, exact = local
+    if not exact:
+        return None, None
+    scope = (intent, tuple(sorted((key, value) for key, value in filters.items() if value)))
+    answer = await asyncio.to_thread(answer_cache.lookup, request.query, scope, data_version)
+    return answer, scope
+
+async def _single_chunk(text: str):
+    yield text
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format one server-sent event; data is JSON so newlines in tokens survive framing"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @router.post("/chatbot", response_model=ChatbotResponse)
-async def chatbot_query(request: ChatbotRequest):
+async def chatbot_query(
+    request: ChatbotRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    vector_store: VectorStoreService = Depends(get_vector_store),
+    chat_manager: ChatSessionManager = Depends(get_chat_manager),
+    filter_extractor: FilterExtractor = Depends(get_filter_extractor),
+    invoice_index: InvoiceIndex = Depends(get_invoice_index),
+    answer_cache: Optional[SemanticAnswerCache] = Depends(get_answer_cache)
+    ):
     """
     Endpoint for RAG chatbot to query invoice information
     
@@ -27,61 +222,42 @@ async def chatbot_query(request: ChatbotRequest):
     """
     
     try:
-
-        filter_extraction_prompt = FILTER_EXTRACTION_PROMPT.format(query=request.query)
-        filter_response = llm_service.model.generate_content(filter_extraction_prompt).text.strip()
-
-        json_match = re.search(r'\{.*?\}', filter_response, re.DOTALL)
-        if not json_match:
-            raise ValueError("No JSON found")
-        try:
-            extracted_filters = json.loads(json_match.group(0))
-        except Exception as e:
-            logger.error(f"Failed to parse LLM filters: {e}")
-            extracted_filters = {}
-
-        filters = {}
-        if extracted_filters.get("employee_name"):
-            filters["employee_name"] = extracted_filters["employee_name"]
-        if extracted_filters.get("status"):
-            filters["status"] = extracted_filters["status"]
-        if extracted_filters.get("invoice_id"):
-            filters["invoice_id"] = extracted_filters["invoice_id"]
-        if extracted_filters.get("date"):
-            filters["date"] = extracted_filters["date"]
-        if extracted_filters.get("amount"):
-            filters["amount"] = extracted_filters["amount"]
-
         # If session_id is not provided, create a new session
         if not request.session_id:
             request.session_id = chat_manager.create_session()
 
-        logger.info("Filters extracted from LLM: %s", filters)
-        # Search vector database
-        search_results = vector_store.search_invoices(request.query, filters)
-        
-        # Format context from search results
-        context = ""
-        for result in search_results:
-            metadata = result["metadata"]
-            context += f"""
-                    **Invoice ID:** {metadata.get('invoice_id', 'N/A')}
-                    **Employee:** {metadata.get('employee_name', 'N/A')}
-                    **Status:** {metadata.get('status', 'N/A')}
-                    **Total Amount:** ${metadata.get('total_amount', 0):.2f}
-                    **Approved Amount:** ${metadata.get('approved_amount', 0):.2f}
-                    **Date:** {metadata.get('date', 'N/A')}
-
-                    ---
-                    """
-        
-        # Get chat history
+        started = time.perf_counter()
+        intent = detect_query_intent(request.query)
+        # Get chat history; LLM answers can lean on it, so only those to opening questions are cached
         chat_history = chat_manager.get_session_history(request.session_id)
-        
-        # Generate response using LLM
-        response_text = llm_service.generate_chatbot_response(
-            request.query, context, chat_history
-        )
+        cacheable = bool(intent) or not chat_history
+        # Read before retrieval so an answer racing with newly stored invoices is cached as stale
+        data_version = vector_store.data_version
+
+        # Extracted once; the cache scope and the answer both use these filters
+        local = await filter_extractor.extract_local(request.query)
+        response_text = cache_scope = None
+        if answer_cache:
+            response_text, cache_scope = await _lookup_cached_answer(
+                request, intent, answer_cache, local, data_version
+            )
+
+        if response_text is None:
+            if intent:
+                # Totals and complete listings come straight from the invoice index
+                response_text = await _answer_from_index(request, intent, filter_extractor, invoice_index, local)
+            else:
+                context = await _retrieve_context(request, filter_extractor, vector_store, local)
+
+                # Generate response using LLM
+                response_text = await llm_service.generate_chatbot_response(
+                    request.query, context, chat_history
+                )
+            if cache_scope is not None and cacheable and response_text != CHATBOT_ERROR_RESPONSE:
+                await asyncio.to_thread(
+                    answer_cache.store, request.query, cache_scope, data_version,
+                    response_text, time.perf_counter() - started
+                )
         
         # Update chat history
         chat_manager.add_to_session(request.session_id, request.query, response_text)
@@ -93,4 +269,81 @@ async def chatbot_query(request: ChatbotRequest):
         
     except Exception as e:
         logger.error(f"Error in chatbot endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def chatbot_stream(
+    request: ChatbotRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    vector_store: VectorStoreService = Depends(get_vector_store),
+    chat_manager: ChatSessionManager = Depends(get_chat_manager),
+    filter_extractor: FilterExtractor = Depends(get_filter_extractor),
+    invoice_index: InvoiceIndex = Depends(get_invoice_index),
+    answer_cache: Optional[SemanticAnswerCache] = Depends(get_answer_cache)
+    ):
+    """
+    Streaming variant of the chatbot endpoint using server-sent events
+
+    Emits a "session" event with the session_id, then one data event per
+    generated chunk ({"token": ...}), then a "done" event. The full answer is
+    written to the chat history once generation finishes.
+    """
+    started = time.perf_counter()
+
+    try:
+        if not request.session_id:
+            request.session_id = chat_manager.create_session()
+
+        intent = detect_query_intent(request.query)
+        chat_history = chat_manager.get_session_history(request.session_id)
+        cacheable = bool(intent) or not chat_history
+        data_version = vector_store.data_version
+
+        # Cached and index answers are complete up front and sent as a single chunk
+        local = await filter_extractor.extract_local(request.query)
+        ready_answer = cache_scope = None
+        cached = False
+        if answer_cache:
+            ready_answer, cache_scope = await _lookup_cached_answer(
+                request, intent, answer_cache, local, data_version
+            )
+            cached = ready_answer is not None
+        if ready_answer is None:
+            if intent:
+                ready_answer = await _answer_from_index(request, intent, filter_extractor, invoice_index, local)
+            else:
+                context = await _retrieve_context(request, filter_extractor, vector_store, local)
+    except Exception as e:
+        logger.error(f"Error in chatbot stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        yield _sse_event({"session_id": request.session_id}, event="session")
+
+        if ready_answer is not None:
+            tokens = _single_chunk(ready_answer)
+        else:
+            tokens = llm_service.stream_chatbot_response(request.query, context, chat_history)
+
+        chunks = []
+        async for token in tokens:
+            if not chunks:
+                logger.info(f"Chatbot time to first token: {time.perf_counter() - started:.3f}s")
+            chunks.append(token)
+            yield _sse_event({"token": token})
+
+        response_text = "".join(chunks).strip()
+        if cache_scope is not None and cacheable and not cached and response_text not in ("", CHATBOT_ERROR_RESPONSE):
+            await asyncio.to_thread(
+                answer_cache.store, request.query, cache_scope, data_version,
+                response_text, time.perf_counter() - started
+            )
+        chat_manager.add_to_session(request.session_id, request.query, response_text)
+        logger.info(f"Chatbot stream finished in {time.perf_counter() - started:.3f}s")
+        yield _sse_event({"session_id": request.session_id}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from app.api.deps import get_policy_cache
+from app.services.policy_cache import PolicyCache
+from app.models.models import PolicyRegistrationResponse
+from logger import logger
+
+router = APIRouter()
+
+@router.post("/policies", response_model=PolicyRegistrationResponse)
+async def register_policy(
+    policy_file: UploadFile = File(...),
+    policy_cache: PolicyCache = Depends(get_policy_cache)
+    ):
+    """
+    Endpoint to register an HR reimbursement policy once and reuse it by ID
+    
+    Args:
+        policy_file: PDF file containing HR reimbursement policy
+    
+    Returns:
+        Policy ID (SHA-256 of the PDF) to pass as policy_id to /analyze-invoices
+    """
+
+    if not policy_file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Policy file must be a PDF")
+
+    try:
+        policy_id, policy_text = await policy_cache.get_or_extract(await policy_file.read())
+        return PolicyRegistrationResponse(
+            policy_id=policy_id,
+            filename=policy_file.filename,
+            characters=len(policy_text)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in register_policy endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/policies/{policy_id}", response_model=PolicyRegistrationResponse)
+async def get_policy(policy_id: str, policy_cache: PolicyCache = Depends(get_policy_cache)):
+    """Check that a registered policy is still available"""
+
+    policy_text = policy_cache.get_text(policy_id)
+    if policy_text is None:
+        raise HTTPException(status_code=404, detail=f"Policy {policy_id} not found")
+    return PolicyRegistrationResponse(policy_id=policy_id, filename="", characters=len(policy_text))
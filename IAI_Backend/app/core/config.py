@@ -0,0 +1,117 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Invoice analysis pipeline
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# PDF text extraction library: "pypdf2", "pypdfium2" (PDFium, much faster) or "pdfminer"
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pypdf2")
+# Documents with at least this many pages are extracted in parallel page ranges (0 disables)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+
+# Vector store
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# "onnx" (ONNX Runtime, no torch), "onnx-int8" (quantized ONNX), "sentence-transformers" (PyTorch,
+# needs requirement-torch.txt) or "hash" (offline word hashing, for benchmarks)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))
+# LRU cache of embeddings keyed on whitespace-normalised text, shared by queries and ingest; 0 disables it
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Invoice text is embedded in overlapping word windows so long invoices fit the
+# embedding model's 256 token limit; 0 embeds each invoice as a single document
+EMBEDDING_CHUNK_WORDS = int(os.getenv("EMBEDDING_CHUNK_WORDS", "150"))
+EMBEDDING_CHUNK_OVERLAP_WORDS = int(os.getenv("EMBEDDING_CHUNK_OVERLAP_WORDS", "30"))
+
+# Policies of at least POLICY_RETRIEVAL_MIN_WORDS words are chunked into clauses and embedded
+# once; each invoice is then analysed against only its POLICY_RETRIEVAL_TOP_K most similar
+# clauses instead of the whole policy (0 always sends the whole policy)
+POLICY_RETRIEVAL_TOP_K = int(os.getenv("POLICY_RETRIEVAL_TOP_K", "8"))
+POLICY_RETRIEVAL_MIN_WORDS = int(os.getenv("POLICY_RETRIEVAL_MIN_WORDS", "1500"))
+POLICY_CLAUSE_WORDS = int(os.getenv("POLICY_CLAUSE_WORDS", "80"))
+POLICY_CLAUSE_OVERLAP_WORDS = int(os.getenv("POLICY_CLAUSE_OVERLAP_WORDS", "20"))
+
+# YAML or JSON spec of per-category caps and exclusions (see PolicyRuleEngine) mirroring the
+# reimbursement policies listed in its policy_ids; invoices it decides unambiguously skip the LLM (empty disables)
+POLICY_RULES_PATH = os.getenv("POLICY_RULES_PATH", "")
+
+# Policy document cache
+POLICY_CACHE_SIZE = int(os.getenv("POLICY_CACHE_SIZE", "32"))
+# Set to an empty string to keep the cache in memory only
+POLICY_CACHE_DIR = os.getenv("POLICY_CACHE_DIR", "./policy_cache")
+# Policies kept on disk; the least recently used beyond this are deleted
+POLICY_CACHE_DISK_SIZE = int(os.getenv("POLICY_CACHE_DISK_SIZE", "256"))
+
+# LLM
+# "gemini", "openai" (OpenAI-compatible server at LLM_BASE_URL), "huggingface" (in-process transformers,
+# needs requirement-torch.txt) or "fake" (deterministic offline responses after LLM_FAKE_LATENCY seconds)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+# Empty uses the backend's own default model; the openai backend has none and must be told
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:8080/v1")
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1024"))
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.5"))
+# Upload the policy once as Gemini cached context and send only the invoice per call
+LLM_CONTEXT_CACHE_ENABLED = os.getenv("LLM_CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+LLM_CONTEXT_CACHE_TTL_MINUTES = int(os.getenv("LLM_CONTEXT_CACHE_TTL_MINUTES", "60"))
+# Invoices packed into one analysis prompt (1 disables batch prompting)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))
+# Upper bound on estimated invoice tokens per batch prompt
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "24000"))
+# Client-side quota shared by every Gemini call in the process; 0 disables a limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "1000"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+# Retries on 429/5xx and timeouts, with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+# Seconds per attempt, and for the whole call including retries
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "180"))
+# Alternative Gemini API host, e.g. a local fake server for load tests; empty uses Google's
+LLM_API_ENDPOINT = os.getenv("LLM_API_ENDPOINT", "")
+
+# Invoice analysis result cache: "memory", "sqlite" or "none"
+ANALYSIS_CACHE_BACKEND = os.getenv("ANALYSIS_CACHE_BACKEND", "sqlite")
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "./analysis_cache.db")
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Invoice ZIP ingestion limits
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "5000"))
+ZIP_MAX_UNCOMPRESSED_BYTES = int(os.getenv("ZIP_MAX_UNCOMPRESSED_BYTES", str(2 * 1024 ** 3)))
+ZIP_MAX_MEMBER_BYTES = int(os.getenv("ZIP_MAX_MEMBER_BYTES", str(100 * 1024 ** 2)))
+ZIP_MAX_COMPRESSION_RATIO = float(os.getenv("ZIP_MAX_COMPRESSION_RATIO", "100"))
+
+# Background analysis jobs
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "./jobs.db")
+JOBS_UPLOAD_DIR = os.getenv("JOBS_UPLOAD_DIR", "./job_uploads")
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+
+# Chatbot filters are extracted locally; below this confidence the LLM is asked instead
+FILTER_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("FILTER_EXTRACTION_MIN_CONFIDENCE", "0.6"))
+# Start an unfiltered vector search while the LLM fallback extracts filters,
+# fetching this many times the result limit to filter afterwards
+CHATBOT_SPECULATIVE_RETRIEVAL = os.getenv("CHATBOT_SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+CHATBOT_OVERFETCH_FACTOR = int(os.getenv("CHATBOT_OVERFETCH_FACTOR", "5"))
+# Reuse the answer to a paraphrased question (cosine similarity at or above the
+# threshold) until new invoices are stored; 0 entries disables the cache
+CHATBOT_ANSWER_CACHE_SIZE = int(os.getenv("CHATBOT_ANSWER_CACHE_SIZE", "500"))
+CHATBOT_ANSWER_CACHE_THRESHOLD = float(os.getenv("CHATBOT_ANSWER_CACHE_THRESHOLD", "0.92"))
+
+# Chatbot search: "around 150" matches totals within this many currency units
+AMOUNT_FILTER_TOLERANCE = float(os.getenv("AMOUNT_FILTER_TOLERANCE", "20"))
+# Upper bound on n_results when re-querying to fill the result limit
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+# SQLite side index of invoice metadata for exact aggregate and listing queries
+INVOICE_INDEX_PATH = os.getenv("INVOICE_INDEX_PATH", "./invoice_index.db")
+
+# BM25 keyword index fused with vector search results; empty path disables it
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index.db")
+# Reciprocal rank fusion constant: higher values flatten the advantage of top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
@@ -1,9 +1,16 @@
 
-ANALYSE_INVOICE_PROMPT = """
+# Bump whenever the analysis prompts change so cached analyses are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+
+# The policy block is kept as a separate prefix so it can be uploaded once as
+# cached context and only the invoice part sent per call.
+POLICY_CONTEXT_PROMPT = """
 You are an expert financial analyst. Analyze the following employee invoice against the company reimbursement policy.
 COMPANY POLICY:
 {policy_text} 
-EMPLOYEE INVOICE:
+"""
+
+INVOICE_ANALYSIS_PROMPT = """EMPLOYEE INVOICE:
 Employee: {employee_name}
 Invoice Content: {invoice_text}
 Based on the policy, determine:
@@ -20,6 +27,34 @@ Provide a structured JSON response only with no extra response with the followin
 }}
 """
 
+ANALYSE_INVOICE_PROMPT = POLICY_CONTEXT_PROMPT + INVOICE_ANALYSIS_PROMPT
+
+# Stands in for {policy_text} when only the clauses retrieved for the invoice are sent
+POLICY_EXCERPTS_PROMPT = """(Excerpts: the policy sections most relevant to this invoice, in document order.)
+{clauses}
+"""
+
+INVOICE_BATCH_ANALYSIS_PROMPT = """EMPLOYEE INVOICES:
+Employee: {employee_name}
+There are {invoice_count} invoices below, each introduced by INVOICE [index].
+{invoices_text}
+Analyze each invoice independently. Based on the policy, determine for every invoice:
+1. Reimbursement Status: "Fully Reimbursed", "Partially Reimbursed", or "Declined"
+2. Detailed reason for the status
+3. If partially reimbursed, specify the approved amount
+Provide a JSON array only with no extra response, containing exactly one object per invoice with the following fields:
+```json
+[
+    {{
+        "index": "int (the INVOICE [index] it refers to)",
+        "status": "ReimbursementStatus",
+        "reason": "string",
+        "approved_amount": "float",
+        "total_amount": "float"
+    }}
+]
+"""
+
 CHATBOT_RESPONSE_PROMPT = """
 You are a helpful assistant for an invoice reimbursement system.
 Answer the user's query based on the provided context from the invoice database.
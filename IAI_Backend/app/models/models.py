@@ -13,12 +13,46 @@ class ChatbotRequest(BaseModel):
     query: str
     session_id: Optional[str] = "default"
 
+class InvoiceResult(BaseModel):
+    file_name: str
+    status: Optional[str] = None
+    reason: Optional[str] = None
+    approved_amount: Optional[float] = None
+    total_amount: Optional[float] = None
+    # "rules" (local rule engine) or "llm", plus " (cached)" when reused from an earlier analysis
+    decided_by: Optional[str] = None
+    error: Optional[str] = None
+
 class InvoiceAnalysisResponse(BaseModel):
     status: str
     message: str
     invoices_processed: int
+    results: List[InvoiceResult] = []
     errors: List[str] = []
 
 class ChatbotResponse(BaseModel):
     response: str
-    session_id: str
\ No newline at end of file
+    session_id: str
+
+class PolicyRegistrationResponse(BaseModel):
+    policy_id: str
+    filename: str
+    characters: int
+
+class JobSubmissionResponse(BaseModel):
+    job_id: str
+    status: str
+    total_invoices: int
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    employee_name: str
+    total_invoices: int
+    completed_invoices: int
+    invoices_processed: int
+    message: str = ""
+    results: List[InvoiceResult] = []
+    errors: List[str] = []
+    created_at: str
+    updated_at: str
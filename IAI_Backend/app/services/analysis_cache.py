@@ -0,0 +1,202 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from app.core.config import (
+    ANALYSIS_CACHE_BACKEND,
+    ANALYSIS_CACHE_PATH,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_TTL_SECONDS,
+)
+from app.core.prompts import ANALYSIS_PROMPT_VERSION
+from logger import logger
+
+
+class CacheBackend:
+    """Storage interface for the analysis cache"""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryLRUBackend(CacheBackend):
+    """Process-local LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend(CacheBackend):
+    """On-disk cache that survives restarts, evicting least recently used entries"""
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache (last_access)"
+            )
+            self._conn.execute("DELETE FROM analysis_cache WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl_seconds, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM analysis_cache WHERE key IN "
+                    "(SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+
+class AnalysisCache:
+    """Cache of LLM invoice analyses keyed by (invoice text, policy, model, prompt version)"""
+
+    def __init__(self,
+                 backend: CacheBackend,
+                 ttl_seconds: int = ANALYSIS_CACHE_TTL_SECONDS,
+                 prompt_version: str = ANALYSIS_PROMPT_VERSION):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.prompt_version = prompt_version
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Collapse whitespace and case so re-extracted copies of the same invoice match"""
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def make_key(self, invoice_text: str, policy_id: str, model_name: str) -> str:
+        invoice_hash = hashlib.sha256(self.normalize_text(invoice_text).encode()).hexdigest()
+        return hashlib.sha256(
+            f"{invoice_hash}|{policy_id}|{model_name}|{self.prompt_version}".encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached entry for a key
+
+        Entries hold the "analysis" plus the "invoice_ids" (one per stored
+        copy) and "employee_name" it was stored under, so callers can skip
+        re-embedding as well.
+        """
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Analysis cache lookup failed: {str(e)}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        try:
+            self.backend.set(key, entry, self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Analysis cache write failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0)
+        }
+
+
+def create_analysis_cache(backend_name: str = ANALYSIS_CACHE_BACKEND) -> Optional[AnalysisCache]:
+    """Build the analysis cache selected by configuration, or None when disabled"""
+    if backend_name == "none":
+        return None
+    if backend_name == "memory":
+        return AnalysisCache(InMemoryLRUBackend())
+    if backend_name == "sqlite":
+        return AnalysisCache(SQLiteBackend())
+    raise ValueError(f"Unknown analysis cache backend: {backend_name}")
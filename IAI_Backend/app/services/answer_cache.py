@@ -0,0 +1,97 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import numpy as np
+from app.core.config import CHATBOT_ANSWER_CACHE_SIZE, CHATBOT_ANSWER_CACHE_THRESHOLD
+from app.services.embedding_backend import EmbeddingBackend
+from logger import logger
+
+
+class SemanticAnswerCache:
+    """
+    Chatbot answers reused for paraphrased questions
+
+    A cached answer is returned when a new query embeds within `threshold`
+    cosine similarity of a cached one with the same scope (intent and
+    locally extracted filters, so "rejected" and "approved" never share an
+    answer) and the invoice data version is unchanged since it was cached.
+    """
+
+    def __init__(self,
+                 embedding_model: EmbeddingBackend,
+                 threshold: float = CHATBOT_ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = CHATBOT_ANSWER_CACHE_SIZE):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r'\s+', ' ', query).strip().lower()
+
+    def lookup(self, query: str, scope: Hashable, data_version: int) -> Optional[str]:
+        """Cached answer for the closest paraphrase of the query, or None"""
+        query_embedding = self.embedding_model.encode(self.normalize_query(query))
+        best_key, best_similarity = None, self.threshold
+        with self._lock:
+            self._drop_stale(data_version)
+            for key, entry in self._entries.items():
+                if key[0] != scope:
+                    continue
+                similarity = float(np.dot(query_embedding, entry["embedding"]))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+            if best_key is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best_key]
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            self.seconds_saved += entry["elapsed"]
+        logger.info(f"Answer cache hit (similarity {best_similarity:.3f}) for '{best_key[1]}'")
+        return entry["answer"]
+
+    def store(self, query: str, scope: Hashable, data_version: int, answer: str, elapsed: float):
+        """
+        Cache an answer computed against `data_version`
+
+        Pass the version read before retrieval, so an answer that raced with
+        new invoices being stored is already stale.
+        """
+        normalized = self.normalize_query(query)
+        embedding = self.embedding_model.encode(normalized)
+        with self._lock:
+            key = (scope, normalized)
+            self._entries[key] = {
+                "embedding": embedding,
+                "answer": answer,
+                "data_version": data_version,
+                "elapsed": elapsed,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop_stale(self, data_version: int):
+        stale = [key for key, entry in self._entries.items() if entry["data_version"] != data_version]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "seconds_saved": round(self.seconds_saved, 3)
+        }
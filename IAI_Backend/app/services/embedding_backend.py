@@ -0,0 +1,254 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Union
+import numpy as np
+from app.core.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_MAX_TOKENS,
+    EMBEDDING_CACHE_SIZE,
+)
+from logger import logger
+
+
+class EmbeddingBackend:
+    """
+    Text embedding model interface
+
+    Implementations load their model lazily on the first encode call and
+    return L2-normalised float32 vectors, one row per input text (or a single
+    vector for a single string, like SentenceTransformer.encode).
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = self._encode(self._get_model(), batch, max(1, batch_size))
+        return embeddings[0] if single else embeddings
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _get_model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    logger.info(f"Loading {self.name} embedding model {self.model_name}")
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _encode(self, model, texts: List[str], batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """PyTorch sentence-transformers model"""
+
+    name = "sentence-transformers"
+
+    def _load(self):
+        # Imported here so torch is only loaded when this backend is actually used
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                f"The {self.name} embedding backend needs the packages in requirement-torch.txt: {str(e)}"
+            )
+        return SentenceTransformer(self.model_name)
+
+    def _encode(self, model, texts: List[str], batch_size: int) -> np.ndarray:
+        return np.asarray(
+            model.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32
+        )
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    ONNX Runtime export of a sentence-transformers model, without torch
+
+    Reproduces the MiniLM sentence-transformers pipeline (truncation to
+    EMBEDDING_MAX_TOKENS, mean pooling, L2 normalisation). onnx_file selects
+    the export in the model repository, e.g. an int8-quantized variant.
+    """
+
+    name = "onnx"
+
+    def __init__(self,
+                 model_name: str = EMBEDDING_MODEL_NAME,
+                 onnx_file: str = "onnx/model.onnx",
+                 max_tokens: int = EMBEDDING_MAX_TOKENS,
+                 name: str = "onnx"):
+        super().__init__(model_name)
+        self.name = name
+        self.onnx_file = onnx_file
+        self.max_tokens = max_tokens
+
+    def _load(self):
+        try:
+            import onnxruntime
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                f"The {self.name} embedding backend needs onnxruntime, tokenizers and huggingface_hub: {str(e)}"
+            )
+
+        tokenizer = Tokenizer.from_file(hf_hub_download(self.model_name, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_tokens)
+        tokenizer.enable_padding()
+        session = onnxruntime.InferenceSession(
+            hf_hub_download(self.model_name, self.onnx_file),
+            providers=["CPUExecutionProvider"]
+        )
+        return tokenizer, session, {model_input.name for model_input in session.get_inputs()}
+
+    def _encode(self, model, texts: List[str], batch_size: int) -> np.ndarray:
+        tokenizer, session, input_names = model
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = tokenizer.encode_batch(texts[start:start + batch_size])
+            inputs = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            token_embeddings = session.run(None, {name: inputs[name] for name in input_names})[0]
+
+            # Mean pooling over real tokens, then L2 normalisation
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        return np.concatenate(batches).astype(np.float32)
+
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic offline stand-in for benchmarks
+
+    Hashes each word into one of `dimensions` buckets; texts sharing words
+    get similar vectors, and nothing has to be downloaded.
+    """
+
+    name = "hash"
+
+    def __init__(self, model_name: str = "hash", dimensions: int = 384):
+        super().__init__(model_name)
+        self.dimensions = dimensions
+
+    def _load(self):
+        return re.compile(r"\w+")
+
+    def _encode(self, model, texts: List[str], batch_size: int) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in model.findall(text.lower()):
+                embeddings[row, int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % self.dimensions] += 1
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+
+class CachedEmbeddingBackend(EmbeddingBackend):
+    """
+    LRU cache of embeddings in front of another backend
+
+    Keys are hashes of the text with whitespace collapsed, which the model's
+    tokenizer ignores anyway, so a hit returns exactly the vector the model
+    would have produced. Only texts missing from the cache are encoded.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.name = backend.name
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha256(re.sub(r'\s+', ' ', text).strip().encode()).hexdigest()
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        keys = [self.make_key(text) for text in batch]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+            self.hits += sum(1 for key in keys if key in vectors)
+            self.misses += sum(1 for key in keys if key not in vectors)
+
+        # Encode each missing text once, even if it repeats within the batch
+        missing = {key: text for key, text in zip(keys, batch) if key not in vectors}
+        if missing:
+            encoded = self.backend.encode(list(missing.values()), batch_size=batch_size)
+            with self._lock:
+                for key, vector in zip(missing, encoded):
+                    vectors[key] = vector
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        embeddings = np.stack([vectors[key] for key in keys])
+        return embeddings[0] if single else embeddings
+
+    @property
+    def loaded(self) -> bool:
+        return self.backend.loaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+def create_embedding_backend(backend_name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    """Build the embedding backend selected by configuration"""
+    if backend_name == "sentence-transformers":
+        return SentenceTransformerBackend()
+    if backend_name == "onnx":
+        return OnnxEmbeddingBackend()
+    if backend_name == "onnx-int8":
+        return OnnxEmbeddingBackend(onnx_file="onnx/model_quint8_avx2.onnx", name="onnx-int8")
+    if backend_name == "hash":
+        return HashEmbeddingBackend()
+    raise ValueError(f"Unknown embedding backend: {backend_name}")
+
+
+@lru_cache
+def get_embedding_backend() -> EmbeddingBackend:
+    """Return the embedding backend shared by everything in this process, behind the embedding cache if enabled"""
+    backend = create_embedding_backend()
+    return CachedEmbeddingBackend(backend) if EMBEDDING_CACHE_SIZE > 0 else backend
@@ -0,0 +1,322 @@
+import asyncio
+import re
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Set, Tuple
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
+from app.core.config import FILTER_EXTRACTION_MIN_CONFIDENCE
+from logger import logger
+
+if TYPE_CHECKING:
+    from app.services.llm_service import LLMService
+    from app.services.vectore_store_service import VectorStoreService
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+_MONTH_PATTERN = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+# Checked in order; the first match wins, so the more specific phrases come first
+_STATUS_PATTERNS = [
+    (re.compile(r"\bpartial(?:ly)?\b"), "Partially Reimbursed"),
+    (re.compile(r"\b(?:declined|rejected|denied|refused|not reimbursed)\b"), "Declined"),
+    (re.compile(r"\b(?:fully(?: reimbursed| approved| paid)?|approved|accepted)\b(?! amounts?)"), "Fully Reimbursed"),
+]
+_AMBIGUOUS_STATUS = re.compile(r"\breimbursed\b(?! amounts?)")
+# "how much was approved" asks for approved amounts across statuses, not for fully reimbursed invoices
+_APPROVED_AMOUNT_QUESTION = re.compile(r"\bhow much (?:\w+ ){0,3}(?:approved|reimbursed)\b")
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b")
+_DAY_MONTH_YEAR = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+({_MONTH_PATTERN})\.?,?\s+(\d{{4}})\b")
+_MONTH_DAY_YEAR = re.compile(rf"\b({_MONTH_PATTERN})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b")
+_MONTH_YEAR = re.compile(rf"\b({_MONTH_PATTERN})\.?,?\s+(\d{{4}})\b")
+_MONTH_ONLY = re.compile(rf"\b(?:in|during|for|from)\s+({_MONTH_PATTERN})\b")
+_RELATIVE_MONTH = re.compile(r"\b(this|last|previous) month\b")
+_UNSUPPORTED_DATE = re.compile(
+    r"\b(?:today|yesterday|week|weeks|days|quarter|year|years|since|before|after|between|recent(?:ly)?)\b"
+    r"|\bin \d{4}\b"
+)
+
+_AMOUNT = re.compile(
+    r"(?:(?:around|about|approximately|approx\.?|roughly|nearly|near|~|amount(?: of)?|total(?: of)?|worth|costing|for)\s*)?"
+    r"(?:\$|usd\s*|rs\.?\s*|inr\s*|₹)\s*(\d[\d,]*(?:\.\d+)?)"
+    r"|(?:around|about|approximately|approx\.?|roughly|nearly|~|amount(?: of)?|total(?: of)?|worth|costing)\s*"
+    r"(\d[\d,]*(?:\.\d+)?)"
+    r"|(\d[\d,]*(?:\.\d+)?)\s*(?:dollars|usd|bucks|rupees|inr|rs)\b"
+)
+_AMOUNT_RANGE = re.compile(
+    r"\b(?:over|above|more than|greater than|at least|under|below|less than|at most|between|upto|up to)\b"
+)
+
+# Underscore-joined parts of an invoice ID; the file stem part may itself contain hyphens
+_ID_PART = r"[a-z0-9]+(?:-[a-z0-9]+)*"
+_INVOICE_ID = re.compile(rf"\b{_ID_PART}(?:_{_ID_PART}){{2,}}\b")
+_NAME_AFTER_PREPOSITION = re.compile(r"\b(?:for|by|from|of|employee)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)")
+_BARE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+# Capitalised words that follow "for"/"by" without being a person's name
+_NOT_NAMES = set(_MONTHS) | {
+    "all", "any", "every", "the", "this", "last", "invoices", "invoice", "me", "my",
+    "declined", "rejected", "denied", "approved", "partially", "partial", "fully", "reimbursed", "status",
+}
+
+# Questions answered exactly from the invoice index instead of by semantic search
+AGGREGATE_INTENT = "aggregate"
+LIST_INTENT = "list"
+_AGGREGATE_QUERY = re.compile(
+    r"\b(?:how much|how many|sum of|count of|number of|total (?:amount|spent|spend|approved|reimbursed|declined|claimed|value)"
+    r"|(?:in|the) total|totals?$|average)\b"
+)
+_LIST_QUERY = re.compile(r"\b(?:list|show(?: me)?|give me|display)\s+(?:all|every)\b|\ball (?:of )?(?:the |my )?invoices\b")
+# Why/explain questions need the invoice text and reasons, not numbers
+_FREE_TEXT_QUERY = re.compile(r"\b(?:why|reason|reasons|explain|because|what for)\b")
+
+
+def detect_query_intent(query: str) -> Optional[str]:
+    """AGGREGATE_INTENT or LIST_INTENT for questions about totals or complete listings, else None"""
+    text = query.lower().strip(" ?.!")
+    if _FREE_TEXT_QUERY.search(text):
+        return None
+    if _AGGREGATE_QUERY.search(text):
+        return AGGREGATE_INTENT
+    if _LIST_QUERY.search(text):
+        return LIST_INTENT
+    return None
+
+
+class FilterExtractor:
+    """
+    Deterministic chatbot filter extraction with an LLM fallback
+
+    Handles the common phrasings (employee names already seen in the vector
+    store, status words, "May 2024" style dates, "around 150" style amounts)
+    with rules and regular expressions. Each extraction carries a confidence;
+    only queries below min_confidence go to LLMService.extract_filters.
+    """
+
+    def __init__(self,
+                 llm_service: "LLMService",
+                 vector_store: "VectorStoreService",
+                 min_confidence: float = FILTER_EXTRACTION_MIN_CONFIDENCE):
+        self.llm_service = llm_service
+        self.vector_store = vector_store
+        self.min_confidence = min_confidence
+        self.local_extractions = 0
+        self.llm_fallbacks = 0
+
+    async def extract_local(self, query: str) -> Tuple[Dict[str, Any], float, bool]:
+        """
+        Rule-based extraction against the employees already in the vector store
+
+        Returns:
+            Tuple of (filters, confidence, exact). exact means the filters are
+            confident and every date or amount phrase in the query was read into
+            them, so two queries with the same filters ask the same question.
+        """
+        known_employees = await asyncio.to_thread(self.vector_store.get_employee_names)
+        filters, confidence = self.extract(query, known_employees)
+        exact = confidence >= self.min_confidence and not self.has_unread_phrase(query)
+        return filters, confidence, exact
+
+    async def extract_filters(self,
+                              query: str,
+                              local: Optional[Tuple[Dict[str, Any], float, bool]] = None) -> Dict[str, Any]:
+        """
+        Extract search filters locally, asking the LLM only when the local result is uncertain
+
+        local, if given, is an extract_local result for the same query, so it isn't extracted twice.
+        """
+        filters, confidence, _ = local or await self.extract_local(query)
+        if confidence >= self.min_confidence:
+            self.local_extractions += 1
+            logger.info(f"Filters extracted locally (confidence {confidence:.2f})")
+            return filters
+
+        self.llm_fallbacks += 1
+        logger.info(f"Local filter extraction confidence {confidence:.2f}, falling back to LLM")
+        return await self.llm_service.extract_filters(query)
+
+    @staticmethod
+    def has_unread_phrase(query: str) -> bool:
+        """True when the query has a date or amount phrase the rules can't turn into a filter"""
+        text = query.lower()
+        return bool(_UNSUPPORTED_DATE.search(text) or _AMOUNT_RANGE.search(text))
+
+    def extract(self, query: str, known_employees: Iterable[str] = ()) -> Tuple[Dict[str, Any], float]:
+        """
+        Rule-based filter extraction
+
+        Returns:
+            Tuple of (filters in the FILTER_EXTRACTION_PROMPT shape, confidence between 0 and 1)
+        """
+        text = query.lower()
+        consumed = []
+        confidence = 1.0
+
+        invoice_id = self._extract_invoice_id(text, known_employees)
+        if invoice_id:
+            # IDs embed the employee name and dates; keep them out of the other rules
+            query = re.sub(re.escape(invoice_id), " ", query, flags=re.IGNORECASE)
+            text = text.replace(invoice_id, " ")
+
+        employee_name, employee_confidence = self._extract_employee(query, text, known_employees)
+        confidence = min(confidence, employee_confidence)
+        if employee_name:
+            consumed.append(employee_name.replace("_", " "))
+
+        status, status_confidence = self._extract_status(text)
+        confidence = min(confidence, status_confidence)
+
+        date, date_span, date_confidence = self._extract_date(text)
+        confidence = min(confidence, date_confidence)
+        if date_span:
+            consumed.append(date_span)
+
+        amount, amount_span, amount_confidence = self._extract_amount(text)
+        confidence = min(confidence, amount_confidence)
+        if amount_span:
+            consumed.append(amount_span)
+
+        # Numbers nobody accounted for could be an amount or date we failed to read
+        remainder = text
+        for span in consumed:
+            remainder = remainder.replace(span, " ")
+        if _BARE_NUMBER.search(remainder):
+            confidence = min(confidence, 0.4)
+
+        return {
+            "employee_name": employee_name,
+            "status": status,
+            "invoice_id": invoice_id,
+            "date": date,
+            "amount": amount,
+        }, confidence
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.local_extractions + self.llm_fallbacks
+        return {
+            "local": self.local_extractions,
+            "llm_fallback": self.llm_fallbacks,
+            "local_rate": round(self.local_extractions / total, 3) if total else 0.0
+        }
+
+    @staticmethod
+    def _extract_invoice_id(text: str, known_employees: Iterable[str]) -> Optional[str]:
+        for match in _INVOICE_ID.finditer(text):
+            candidate = match.group(0)
+            # A bare normalised employee name looks like an ID but is not one
+            if candidate not in known_employees and any(char.isdigit() for char in candidate):
+                return candidate
+        return None
+
+    @staticmethod
+    def _extract_employee(query: str, text: str, known_employees: Iterable[str]) -> Tuple[Optional[str], float]:
+        known: Set[str] = set(known_employees)
+
+        # Full names, longest first so "ronit shah" wins over "ronit"
+        for employee in sorted(known, key=len, reverse=True):
+            spoken = re.escape(employee.replace("_", " "))
+            if re.search(rf"\b(?:{spoken}|{re.escape(employee)})(?:'s)?\b", text):
+                return employee, 1.0
+
+        # First name alone, when it identifies exactly one known employee
+        first_names: Dict[str, Set[str]] = {}
+        for employee in known:
+            first_names.setdefault(employee.split("_")[0], set()).add(employee)
+        for word in re.findall(r"[a-z]+", text):
+            matches = first_names.get(word)
+            if matches and len(matches) == 1 and word not in _NOT_NAMES:
+                return next(iter(matches)), 0.8
+            if matches:
+                return None, 0.3
+
+        # A capitalised name we have never stored: normalise it, but be less sure
+        match = _NAME_AFTER_PREPOSITION.search(query)
+        if match:
+            words = [word for word in match.group(1).split() if word.lower() not in _NOT_NAMES]
+            if words:
+                return "_".join(word.lower() for word in words), 0.7
+
+        # "for john doe" in lower case: probably a name, but rules can't tell where it ends
+        if re.search(r"\b(?:employee|by|for)\s+(?!all\b|any\b|the\b|me\b|my\b|every\b)[a-z]+\s+[a-z]+\b", text) \
+                and not re.search(rf"\bfor\s+(?:{_MONTH_PATTERN}|this|last|previous|invoices?|\$|\d)", text):
+            return None, 0.5
+        return None, 1.0
+
+    @staticmethod
+    def _extract_status(text: str) -> Tuple[Optional[str], float]:
+        text = _APPROVED_AMOUNT_QUESTION.sub(" ", text)
+        for pattern, status in _STATUS_PATTERNS:
+            if pattern.search(text):
+                return status, 1.0
+        if _AMBIGUOUS_STATUS.search(text):
+            # "reimbursed" alone could mean fully or partially
+            return None, 0.5
+        return None, 1.0
+
+    @staticmethod
+    def _extract_date(text: str) -> Tuple[Optional[str], Optional[str], float]:
+        match = _ISO_DATE.search(text)
+        if match:
+            try:
+                parsed = datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                return parsed.strftime("%Y-%m-%d"), match.group(0), 1.0
+            except ValueError:
+                return None, match.group(0), 0.3
+
+        for pattern in (_DAY_MONTH_YEAR, _MONTH_DAY_YEAR):
+            match = pattern.search(text)
+            if match:
+                try:
+                    parsed = date_parser.parse(match.group(0).replace(",", " "))
+                    return parsed.strftime("%Y-%m-%d"), match.group(0), 1.0
+                except (ValueError, OverflowError):
+                    return None, match.group(0), 0.3
+
+        match = _NUMERIC_DATE.search(text)
+        if match:
+            # 03/04/2024 is ambiguous between locales
+            try:
+                parsed = date_parser.parse(match.group(0))
+                return parsed.strftime("%Y-%m-%d"), match.group(0), 0.6
+            except (ValueError, OverflowError):
+                return None, match.group(0), 0.3
+
+        match = _MONTH_YEAR.search(text)
+        if match:
+            month = _MONTHS[match.group(1)]
+            return datetime(int(match.group(2)), month, 1).strftime("%B %Y"), match.group(0), 1.0
+
+        match = _RELATIVE_MONTH.search(text)
+        if match:
+            month = datetime.now().replace(day=1)
+            if match.group(1) != "this":
+                month -= relativedelta(months=1)
+            return month.strftime("%B %Y"), match.group(0), 1.0
+
+        match = _MONTH_ONLY.search(text)
+        if match:
+            # No year given; the LLM is no better at guessing, so assume the most recent one
+            now = datetime.now()
+            month = _MONTHS[match.group(1)]
+            year = now.year if month <= now.month else now.year - 1
+            return datetime(year, month, 1).strftime("%B %Y"), match.group(0), 0.7
+
+        if _UNSUPPORTED_DATE.search(text):
+            return None, None, 0.4
+        return None, None, 1.0
+
+    @staticmethod
+    def _extract_amount(text: str) -> Tuple[Optional[float], Optional[str], float]:
+        if _AMOUNT_RANGE.search(text):
+            # Ranges can't be expressed as a single fuzzy amount
+            return None, None, 0.4
+        match = _AMOUNT.search(text)
+        if not match:
+            return None, None, 1.0
+        value = next(group for group in match.groups() if group)
+        return float(value.replace(",", "")), match.group(0), 1.0
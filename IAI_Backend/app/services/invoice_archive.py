@@ -0,0 +1,59 @@
+import zipfile
+from functools import partial
+from pathlib import PurePosixPath
+from typing import BinaryIO, Callable, List, Tuple, Union
+from app.core.config import (
+    ZIP_MAX_MEMBERS,
+    ZIP_MAX_UNCOMPRESSED_BYTES,
+    ZIP_MAX_MEMBER_BYTES,
+    ZIP_MAX_COMPRESSION_RATIO,
+)
+
+
+class ArchiveLimitError(ValueError):
+    """Raised when an uploaded archive exceeds the configured safety limits"""
+
+
+def list_invoice_pdfs(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """
+    Validate the archive's central directory and return its PDF members
+
+    Only the directory is inspected, so nothing is decompressed here. Member
+    sizes are bounded by the declared sizes because ZipFile never reads past
+    them.
+    """
+    members = zip_ref.infolist()
+    if len(members) > ZIP_MAX_MEMBERS:
+        raise ArchiveLimitError(f"Archive has {len(members)} entries, limit is {ZIP_MAX_MEMBERS}")
+
+    total_size = 0
+    pdf_members = []
+    for info in members:
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.suffix.lower() != ".pdf" or "__MACOSX" in path.parts:
+            continue
+        if info.file_size > ZIP_MAX_MEMBER_BYTES:
+            raise ArchiveLimitError(f"{path.name} is {info.file_size} bytes uncompressed, limit is {ZIP_MAX_MEMBER_BYTES}")
+        if info.compress_size and info.file_size / info.compress_size > ZIP_MAX_COMPRESSION_RATIO:
+            raise ArchiveLimitError(f"{path.name} has a suspicious compression ratio")
+        total_size += info.file_size
+        if total_size > ZIP_MAX_UNCOMPRESSED_BYTES:
+            raise ArchiveLimitError(f"Archive exceeds {ZIP_MAX_UNCOMPRESSED_BYTES} bytes uncompressed")
+        pdf_members.append(info)
+    return pdf_members
+
+
+def open_invoice_archive(fileobj: Union[str, BinaryIO]) -> Tuple[zipfile.ZipFile, List[Tuple[str, Callable[[], bytes]]]]:
+    """
+    Open a ZIP path or seekable upload and return it with (name, reader) pairs for each invoice PDF
+
+    Readers decompress one member on demand, so PDFs stream straight from the
+    archive without extracting it to disk or holding it in memory.
+    """
+    zip_ref = zipfile.ZipFile(fileobj, 'r')
+    try:
+        members = list_invoice_pdfs(zip_ref)
+    except Exception:
+        zip_ref.close()
+        raise
+    return zip_ref, [(info.filename, partial(zip_ref.read, info)) for info in members]
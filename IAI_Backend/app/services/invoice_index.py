@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.config import INVOICE_INDEX_PATH, AMOUNT_FILTER_TOLERANCE
+from app.utils.utils import parse_date_filter
+from logger import logger
+
+_COLUMNS = (
+    "invoice_id", "employee_name", "status", "total_amount", "approved_amount",
+    "date", "year_month", "date_day", "job_id",
+)
+
+
+class InvoiceIndex:
+    """Relational side index of stored invoice metadata for exact counts, sums and listings"""
+
+    def __init__(self, db_path: str = INVOICE_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS invoices (
+                    invoice_id TEXT PRIMARY KEY,
+                    employee_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total_amount REAL NOT NULL DEFAULT 0,
+                    approved_amount REAL NOT NULL DEFAULT 0,
+                    date TEXT,
+                    year_month INTEGER,
+                    date_day INTEGER,
+                    job_id TEXT
+                )"""
+            )
+            for column in ("employee_name", "status", "year_month", "date_day", "job_id"):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_invoices_{column} ON invoices ({column})")
+
+    def upsert_many(self, metadatas: Iterable[Dict[str, Any]], job_id: Optional[str] = None):
+        """Record invoice metadata as written to the vector store"""
+        rows = [
+            (
+                metadata["invoice_id"],
+                metadata.get("employee_name", ""),
+                metadata.get("status", ""),
+                float(metadata.get("total_amount") or 0.0),
+                float(metadata.get("approved_amount") or 0.0),
+                metadata.get("date"),
+                metadata.get("year_month"),
+                metadata.get("date_day"),
+                metadata.get("job_id", job_id),
+            )
+            for metadata in metadatas
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO invoices ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                rows
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+    def aggregate(self, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Exact totals over every invoice matching the chatbot filters
+
+        Returns:
+            Dict with count, total_amount and approved_amount overall and per status
+        """
+        where, params = self._where(filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*), COALESCE(SUM(total_amount), 0), COALESCE(SUM(approved_amount), 0) "
+                f"FROM invoices {where} GROUP BY status ORDER BY status",
+                params
+            ).fetchall()
+        by_status = {
+            status: {"count": count, "total_amount": total, "approved_amount": approved}
+            for status, count, total, approved in rows
+        }
+        return {
+            "count": sum(entry["count"] for entry in by_status.values()),
+            "total_amount": sum(entry["total_amount"] for entry in by_status.values()),
+            "approved_amount": sum(entry["approved_amount"] for entry in by_status.values()),
+            "by_status": by_status
+        }
+
+    def list_invoices(self, filters: Dict[str, Any] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Newest invoices matching the chatbot filters
+
+        Returns:
+            Tuple of (up to `limit` invoice rows, total number of matches)
+        """
+        where, params = self._where(filters)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM invoices {where}", params).fetchone()[0]
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM invoices {where} ORDER BY date DESC LIMIT ?",
+                (*params, limit)
+            )
+            rows = [dict(zip(_COLUMNS, row)) for row in cursor.fetchall()]
+        return rows, total
+
+    def matching_ids(self, filters: Dict[str, Any] = None) -> List[str]:
+        """IDs of every invoice matching the chatbot filters"""
+        where, params = self._where(filters)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT invoice_id FROM invoices {where}", params)]
+
+    @staticmethod
+    def _where(filters: Dict[str, Any] = None) -> Tuple[str, List[Any]]:
+        """Translate chatbot filters into SQL with the same semantics as the vector store search"""
+        clauses = []
+        params: List[Any] = []
+        for key, value in (filters or {}).items():
+            if not value:
+                continue
+            if key == "amount":
+                clauses.append("total_amount BETWEEN ? AND ?")
+                params.extend([float(value) - AMOUNT_FILTER_TOLERANCE, float(value) + AMOUNT_FILTER_TOLERANCE])
+            elif key == "date":
+                date_filter = parse_date_filter(value)
+                if date_filter:
+                    clauses.append(f"{date_filter[0]} = ?")
+                    params.append(date_filter[1])
+                else:
+                    logger.warning(f"Invalid date format in filter: {value}")
+            elif key in ("employee_name", "status", "invoice_id", "job_id"):
+                clauses.append(f"{key} = ?")
+                params.append(value)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import (
+    MAX_CONCURRENT_LLM_CALLS,
+    LLM_BATCH_SIZE,
+    PDF_EXTRACTION_WORKERS,
+    POLICY_RETRIEVAL_TOP_K,
+    POLICY_RETRIEVAL_MIN_WORDS,
+)
+from app.core.prompts import POLICY_EXCERPTS_PROMPT
+from app.services.pdf_processor import PDFProcessor
+from app.services.llm_service import LLMService
+from app.services.vectore_store_service import VectorStoreService
+from app.services.analysis_cache import AnalysisCache
+from app.services.rule_engine import PolicyRuleEngine
+from logger import logger
+
+
+def invoice_result(file_name: str, analysis_result: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    """One invoice's entry in the per-invoice results reported by the analysis endpoints"""
+    result = {"file_name": file_name}
+    if analysis_result:
+        result.update({
+            "status": analysis_result.get("status"),
+            "reason": analysis_result.get("reason"),
+            "approved_amount": analysis_result.get("approved_amount"),
+            "total_amount": analysis_result.get("total_amount"),
+            "decided_by": analysis_result.get("decided_by")
+        })
+    else:
+        result["error"] = error or "LLM analysis failed"
+    return result
+
+
+class InvoicePipeline:
+    """Bounded-concurrency pipeline for analysing a batch of invoice PDFs"""
+
+    def __init__(self,
+                 llm_service: LLMService,
+                 vector_store: VectorStoreService,
+                 analysis_cache: Optional[AnalysisCache] = None,
+                 max_concurrency: int = MAX_CONCURRENT_LLM_CALLS,
+                 batch_size: int = LLM_BATCH_SIZE,
+                 policy_top_k: int = POLICY_RETRIEVAL_TOP_K,
+                 policy_min_words: int = POLICY_RETRIEVAL_MIN_WORDS,
+                 rule_engine: Optional[PolicyRuleEngine] = None):
+        self.llm_service = llm_service
+        self.vector_store = vector_store
+        self.analysis_cache = analysis_cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.policy_top_k = policy_top_k
+        self.policy_min_words = policy_min_words
+        self.rule_engine = rule_engine
+
+    async def run(self,
+                  invoice_files: List[Tuple[str, Callable[[], bytes]]],
+                  policy_text: str,
+                  employee_name: str,
+                  policy_id: Optional[str] = None,
+                  progress_callback: Optional[Callable[[str, Optional[Dict[str, Any]], Optional[str]], None]] = None,
+                  job_id: Optional[str] = None
+                  ) -> Tuple[int, List[str]]:
+        """
+        Analyse every invoice file and store the results
+
+        Invoices are extracted lazily, analysed in groups of `batch_size` (or
+        decided by the rule engine, or served from the analysis cache) and
+        stored once all are done. A failure on one file is recorded in the
+        returned errors and never aborts the rest. progress_callback gets
+        (file_name, analysis_result, error) as each invoice finishes.
+
+        Returns:
+            Tuple of (number of invoices stored, list of error messages)
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        extraction_semaphore = asyncio.Semaphore(PDF_EXTRACTION_WORKERS * 2)
+        normalized_employee = employee_name.replace(" ", "_").lower()
+        if not policy_id:
+            policy_id = hashlib.sha256(policy_text.encode()).hexdigest()
+        condense_policy = await self._index_policy_clauses(policy_id, policy_text)
+        rule_engine = self.rule_engine
+        if rule_engine and not rule_engine.applies_to(policy_id):
+            logger.info(f"Policy rules don't cover policy {policy_id[:12]}, every invoice goes to the LLM")
+            rule_engine = None
+
+        errors = []
+        analysis_tasks = []
+        pending = []
+        extraction_tasks = [
+            self._extract_file(file_name, read_pdf, extraction_semaphore)
+            for file_name, read_pdf in invoice_files
+        ]
+        for next_extracted in asyncio.as_completed(extraction_tasks):
+            file_name, invoice_content, error = await next_extracted
+            if error:
+                errors.append(error)
+                logger.error(error)
+                if progress_callback:
+                    progress_callback(file_name, None, error)
+                continue
+
+            pending.append((file_name, invoice_content))
+            if len(pending) >= self.batch_size:
+                analysis_tasks.append(asyncio.create_task(self._analyze_group(
+                    pending, policy_text, policy_id, employee_name, normalized_employee, semaphore,
+                    progress_callback, condense_policy, rule_engine
+                )))
+                pending = []
+        if pending:
+            analysis_tasks.append(asyncio.create_task(self._analyze_group(
+                pending, policy_text, policy_id, employee_name, normalized_employee, semaphore,
+                progress_callback, condense_policy, rule_engine
+            )))
+
+        analysed = []
+        # Per analysis cache key: the cache entry and the invoice IDs given to its copies in this run
+        copies: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+        for group_outcomes in await asyncio.gather(*analysis_tasks):
+            for file_name, outcome, error in group_outcomes:
+                if error:
+                    errors.append(error)
+                    logger.error(error)
+                    continue
+                cache_key, cache_entry = outcome.pop("cache_key"), outcome.pop("cache_entry")
+                if cache_entry is not None:
+                    # The n-th copy of an invoice reuses the n-th ID it was stored under, so reruns store nothing new
+                    cache_entry, assigned = copies.setdefault(cache_key, (cache_entry, []))
+                    known_ids = cache_entry["invoice_ids"]
+                    if len(assigned) < len(known_ids):
+                        outcome["invoice_id"] = known_ids[len(assigned)]
+                    elif outcome["invoice_id"] in assigned:
+                        outcome["invoice_id"] = self._new_invoice_id(normalized_employee, file_name)
+                        outcome["cached"] = False
+                    assigned.append(outcome["invoice_id"])
+                analysed.append((file_name, outcome))
+        for cache_key, (cache_entry, assigned) in copies.items():
+            if len(assigned) > len(cache_entry["invoice_ids"]):
+                self.analysis_cache.set(cache_key, {**cache_entry, "invoice_ids": assigned})
+
+        # Cache hits whose earlier record is still stored need neither embedding nor storage
+        already_stored = await asyncio.to_thread(
+            self.vector_store.get_existing_invoice_ids,
+            [outcome["invoice_id"] for _, outcome in analysed if outcome["cached"]]
+        )
+        to_store = [(file_name, outcome) for file_name, outcome in analysed
+                    if outcome["invoice_id"] not in already_stored]
+
+        stored = await self.vector_store.store_invoice_analyses_bulk_async([
+            {
+                "invoice_id": outcome["invoice_id"],
+                "invoice_text": outcome["invoice_text"],
+                "analysis_result": outcome["analysis_result"],
+                "employee_name": normalized_employee
+            }
+            for _, outcome in to_store
+        ], job_id=job_id)
+
+        reused = len(analysed) - len(to_store)
+        invoices_processed = reused
+        for (file_name, outcome), success in zip(to_store, stored):
+            if success:
+                invoices_processed += 1
+            else:
+                errors.append(f"Failed to store analysis for {PurePosixPath(file_name).name}")
+
+        if reused:
+            logger.info(f"Reused {reused} cached invoice analyses without re-embedding")
+        return invoices_processed, errors
+
+    @staticmethod
+    def _new_invoice_id(normalized_employee: str, file_name: str) -> str:
+        """Unique invoice ID; the random suffix keeps same-named files from different folders apart"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"{normalized_employee}_{PurePosixPath(file_name).stem}_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+    async def _extract_file(self, file_name: str, read_pdf: Callable[[], bytes], semaphore: asyncio.Semaphore):
+        """Extract a single invoice's text, returning (file_name, text, error)"""
+        try:
+            async with semaphore:
+                pdf_content = await asyncio.to_thread(read_pdf)
+                return file_name, await PDFProcessor.extract_text_from_pdf_async(pdf_content), None
+        except Exception as e:
+            return file_name, None, f"Error processing {PurePosixPath(file_name).name}: {str(e)}"
+
+    async def _index_policy_clauses(self, policy_id: str, policy_text: str) -> bool:
+        """Index a long policy's clauses for per-invoice retrieval; False when the whole policy should be sent"""
+        if self.policy_top_k <= 0 or len(policy_text.split()) < self.policy_min_words:
+            return False
+        try:
+            await asyncio.to_thread(self.vector_store.index_policy, policy_id, policy_text)
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing policy clauses, sending the whole policy: {str(e)}")
+            return False
+
+    async def _policy_excerpts(self, policy_id: str, invoice_texts: List[str]) -> str:
+        """The policy clauses most relevant to any of the invoices, in policy order"""
+        clauses = {}
+        for invoice_text in invoice_texts:
+            clauses.update(await asyncio.to_thread(
+                self.vector_store.retrieve_policy_clauses, policy_id, invoice_text, self.policy_top_k
+            ))
+        return POLICY_EXCERPTS_PROMPT.format(clauses="\n...\n".join(clauses[index] for index in sorted(clauses)))
+
+    async def _analyze_group(self,
+                             group: List[Tuple[str, str]],
+                             policy_text: str,
+                             policy_id: Optional[str],
+                             employee_name: str,
+                             normalized_employee: str,
+                             semaphore: asyncio.Semaphore,
+                             progress_callback=None,
+                             condense_policy: bool = False,
+                             rule_engine: Optional[PolicyRuleEngine] = None):
+        """Analyse a group of extracted invoices, returning (file_name, outcome, error) per invoice"""
+        try:
+            # Decisions made against retrieved clauses are cached apart from whole-policy ones
+            cache_policy_id = f"{policy_id}:clauses{self.policy_top_k}" if condense_policy else policy_id
+            if rule_engine:
+                # Which invoices reach the LLM depends on the rule spec, so editing it re-decides them
+                cache_policy_id = f"{cache_policy_id}:rules{rule_engine.fingerprint}"
+            cache_keys = [None] * len(group)
+            cached_entries = [None] * len(group)
+            if self.analysis_cache:
+                for index, (_, invoice_content) in enumerate(group):
+                    cache_keys[index] = self.analysis_cache.make_key(
+                        invoice_content, cache_policy_id, self.llm_service.model_name
+                    )
+                    cached_entries[index] = self.analysis_cache.get(cache_keys[index])
+
+            # Cached analyses report the path that first decided them; only the rest go to the rules
+            analysis_results = []
+            for (_, invoice_content), entry in zip(group, cached_entries):
+                if entry:
+                    analysis = entry["analysis"]
+                    analysis_results.append({**analysis, "decided_by": f"{analysis['decided_by']} (cached)"})
+                    continue
+                rule_result = rule_engine.decide(invoice_content) if rule_engine else None
+                analysis_results.append({**rule_result, "decided_by": "rules"} if rule_result else None)
+            to_analyze = [index for index, result in enumerate(analysis_results) if result is None]
+            analysis_errors: Dict[int, Exception] = {}
+            if to_analyze:
+                group_policy_text, group_policy_id = policy_text, policy_id
+                if condense_policy:
+                    # Excerpts differ from group to group, so they can't use the policy's cached context
+                    group_policy_text = await self._policy_excerpts(policy_id, [group[index][1] for index in to_analyze])
+                    group_policy_id = None
+                async with semaphore:
+                    if len(to_analyze) == 1:
+                        fresh_results = [await self.llm_service.analyze_invoice(
+                            group[to_analyze[0]][1], group_policy_text, employee_name, policy_id=group_policy_id,
+                            return_exceptions=True
+                        )]
+                    else:
+                        fresh_results = await self.llm_service.analyze_invoices_batch(
+                            [group[index][1] for index in to_analyze],
+                            group_policy_text, employee_name, policy_id=group_policy_id, return_exceptions=True
+                        )
+                for index, analysis_result in zip(to_analyze, fresh_results):
+                    if isinstance(analysis_result, Exception):
+                        analysis_errors[index] = analysis_result
+                    else:
+                        analysis_results[index] = {**analysis_result, "decided_by": "llm"}
+
+            outcomes = []
+            for index, (file_name, invoice_content) in enumerate(group):
+                if index in analysis_errors:
+                    error = analysis_errors[index]
+                    outcomes.append((
+                        file_name, None,
+                        f"Error analysing {PurePosixPath(file_name).name}: {str(error) or type(error).__name__}"
+                    ))
+                    continue
+                cached_entry = cache_entry = cached_entries[index]
+                if cached_entry and cached_entry.get("employee_name") == normalized_employee:
+                    invoice_id = cached_entry["invoice_ids"][0]
+                else:
+                    # Another employee's copy reuses the analysis but is stored as a new invoice
+                    invoice_id = self._new_invoice_id(normalized_employee, file_name)
+                    cache_entry = None
+                if cached_entry is None and cache_keys[index]:
+                    # Cached as soon as it's decided, so an interrupted job doesn't pay for it again
+                    cache_entry = {
+                        "analysis": analysis_results[index],
+                        "invoice_ids": [invoice_id],
+                        "employee_name": normalized_employee
+                    }
+                    self.analysis_cache.set(cache_keys[index], cache_entry)
+                outcomes.append((file_name, {
+                    "invoice_id": invoice_id,
+                    "invoice_text": invoice_content,
+                    "analysis_result": analysis_results[index],
+                    "cached": cached_entry is not None,
+                    "cache_key": cache_keys[index],
+                    "cache_entry": cache_entry
+                }, None))
+
+        except Exception as e:
+            outcomes = [
+                (file_name, None, f"Error processing {PurePosixPath(file_name).name}: {str(e)}")
+                for file_name, _ in group
+            ]
+
+        if progress_callback:
+            for file_name, outcome, error in outcomes:
+                progress_callback(file_name, outcome["analysis_result"] if outcome else None, error)
+        return outcomes
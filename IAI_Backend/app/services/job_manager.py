@@ -0,0 +1,228 @@
+import asyncio
+import json
+import shutil
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple
+from app.core.config import JOBS_DB_PATH, JOBS_UPLOAD_DIR, MAX_CONCURRENT_JOBS
+from app.services.invoice_archive import open_invoice_archive
+from app.services.invoice_pipeline import InvoicePipeline, invoice_result
+from app.services.policy_cache import PolicyCache
+from logger import logger
+
+_JSON_FIELDS = ("errors",)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobManager:
+    """Run invoice analysis jobs in the background, tracked in a local SQLite job table"""
+
+    def __init__(self,
+                 pipeline: InvoicePipeline,
+                 policy_cache: PolicyCache,
+                 db_path: str = JOBS_DB_PATH,
+                 upload_dir: str = JOBS_UPLOAD_DIR,
+                 max_concurrent_jobs: int = MAX_CONCURRENT_JOBS):
+        self.pipeline = pipeline
+        self.policy_cache = policy_cache
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._job_slots = asyncio.Semaphore(max(1, max_concurrent_jobs))
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    employee_name TEXT NOT NULL,
+                    policy_id TEXT NOT NULL,
+                    total_invoices INTEGER NOT NULL,
+                    completed_invoices INTEGER NOT NULL DEFAULT 0,
+                    invoices_processed INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    errors TEXT NOT NULL DEFAULT '[]',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+            # One row per finished invoice, appended as the job progresses
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                )"""
+            )
+
+    async def submit(self, employee_name: str, policy_id: str, invoices_zip: BinaryIO) -> Tuple[str, int]:
+        """
+        Persist the uploaded archive, record a queued job and start it in the background
+
+        Returns:
+            Tuple of (job_id, number of invoice PDFs in the archive)
+        """
+        job_id = str(uuid.uuid4())
+        archive_path = self._archive_path(job_id)
+        try:
+            await asyncio.to_thread(self._save_upload, invoices_zip, archive_path)
+            zip_ref, invoice_files = await asyncio.to_thread(open_invoice_archive, str(archive_path))
+            zip_ref.close()
+        except Exception:
+            archive_path.unlink(missing_ok=True)
+            raise
+
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, employee_name, policy_id, total_invoices, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JobStatus.QUEUED, employee_name, policy_id, len(invoice_files), now, now)
+            )
+        self._start(job_id)
+        return job_id, len(invoice_files)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, or None if it doesn't exist"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+            if row is None:
+                return None
+            results = [json.loads(result) for (result,) in self._conn.execute(
+                "SELECT result FROM job_results WHERE job_id = ? ORDER BY position", (job_id,)
+            )]
+        job = dict(zip(columns, row))
+        for field in _JSON_FIELDS:
+            job[field] = json.loads(job[field])
+        job["results"] = results
+        return job
+
+    def resume_pending(self) -> int:
+        """Restart jobs left queued or running by a previous process"""
+        with self._lock:
+            job_ids = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JobStatus.QUEUED, JobStatus.RUNNING)
+            )]
+        for job_id in job_ids:
+            self._start(job_id)
+        if job_ids:
+            logger.info(f"Resumed {len(job_ids)} unfinished analysis job(s)")
+        return len(job_ids)
+
+    async def shutdown(self):
+        """Cancel running jobs; they stay queued/running in the table and resume on next start"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _start(self, job_id: str):
+        # Detached from the request, so a client disconnect doesn't cancel the work
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job_id: str):
+        async with self._job_slots:
+            job = await asyncio.to_thread(self.get_job, job_id)
+            if job is None:
+                return
+            await asyncio.to_thread(self._reset_results, job_id)
+            await asyncio.to_thread(
+                self._update, job_id, status=JobStatus.RUNNING, completed_invoices=0, errors=[], message=""
+            )
+
+            completed = 0
+            pending: List[Dict[str, Any]] = []
+            flush_task: Optional[asyncio.Task] = None
+
+            async def flush():
+                # Whatever finished while the previous write ran goes out in the next one
+                nonlocal pending
+                while pending:
+                    batch, pending = pending, []
+                    await asyncio.to_thread(self._append_results, job_id, completed - len(batch), batch)
+
+            def on_progress(file_name: str, analysis_result: Optional[Dict[str, Any]], error: Optional[str]):
+                nonlocal completed, flush_task
+                pending.append(invoice_result(file_name, analysis_result, error))
+                completed += 1
+                if flush_task is None or flush_task.done():
+                    flush_task = asyncio.create_task(flush())
+
+            archive_path = self._archive_path(job_id)
+            try:
+                policy_text = await asyncio.to_thread(self.policy_cache.get_text, job["policy_id"])
+                if policy_text is None:
+                    raise RuntimeError(f"Policy {job['policy_id']} is no longer available")
+
+                zip_ref, invoice_files = await asyncio.to_thread(open_invoice_archive, str(archive_path))
+                with zip_ref:
+                    invoices_processed, errors = await self.pipeline.run(
+                        invoice_files, policy_text, job["employee_name"],
+                        policy_id=job["policy_id"], progress_callback=on_progress, job_id=job_id
+                    )
+                if flush_task is not None:
+                    await flush_task
+                await asyncio.to_thread(
+                    self._update,
+                    job_id,
+                    status=JobStatus.COMPLETED,
+                    invoices_processed=invoices_processed,
+                    errors=errors,
+                    message=f"Successfully processed {invoices_processed} invoice(s)"
+                )
+            except Exception as e:
+                logger.error(f"Analysis job {job_id} failed: {str(e)}")
+                await asyncio.to_thread(self._update, job_id, status=JobStatus.FAILED, message=str(e))
+            archive_path.unlink(missing_ok=True)
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now().isoformat()
+        for field in _JSON_FIELDS:
+            if field in fields:
+                fields[field] = json.dumps(fields[field])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def _reset_results(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+
+    def _append_results(self, job_id: str, start: int, results: List[Dict[str, Any]]):
+        """Append finished invoices' results and bump the job's progress in one transaction"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, position, result) VALUES (?, ?, ?)",
+                [(job_id, start + offset, json.dumps(result)) for offset, result in enumerate(results)]
+            )
+            self._conn.execute(
+                "UPDATE jobs SET completed_invoices = ?, updated_at = ? WHERE job_id = ?",
+                (start + len(results), datetime.now().isoformat(), job_id)
+            )
+
+    def _archive_path(self, job_id: str) -> Path:
+        return self.upload_dir / f"{job_id}.zip"
+
+    @staticmethod
+    def _save_upload(source: BinaryIO, destination: Path, chunk_size: int = 1024 * 1024):
+        source.seek(0)
+        with open(destination, "wb") as target:
+            shutil.copyfileobj(source, target, chunk_size)
@@ -0,0 +1,84 @@
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+from app.core.config import LEXICAL_INDEX_PATH
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+class LexicalIndex:
+    """BM25 keyword index over stored invoice documents, kept in an SQLite FTS5 table"""
+
+    def __init__(self, db_path: str = LEXICAL_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            # FTS5 rows are addressed by rowid; this maps invoice IDs to them for cheap replacement
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS invoice_rowids (rowid INTEGER PRIMARY KEY, invoice_id TEXT UNIQUE NOT NULL)"
+            )
+            # unicode61 splits "INV-2024-001" into inv, 2024, 001 for documents and queries alike
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS invoice_documents USING fts5(document, tokenize='unicode61')"
+            )
+
+    def upsert_many(self, documents: Iterable[Tuple[str, str]]):
+        """Add or replace (invoice_id, document) pairs; postings are updated in place"""
+        documents = list(documents)
+        if not documents:
+            return
+        with self._lock, self._conn:
+            for invoice_id, document in documents:
+                row = self._conn.execute(
+                    "SELECT rowid FROM invoice_rowids WHERE invoice_id = ?", (invoice_id,)
+                ).fetchone()
+                if row:
+                    rowid = row[0]
+                    self._conn.execute("DELETE FROM invoice_documents WHERE rowid = ?", (rowid,))
+                else:
+                    rowid = self._conn.execute(
+                        "INSERT INTO invoice_rowids (invoice_id) VALUES (?)", (invoice_id,)
+                    ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO invoice_documents (rowid, document) VALUES (?, ?)", (rowid, document)
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM invoice_rowids").fetchone()[0]
+
+    def search(self,
+               query: str,
+               limit: int = 10,
+               invoice_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Best BM25 matches for any of the query's terms, among invoice_ids if given
+
+        Returns:
+            (invoice_id, score) pairs, best first; higher scores are better
+        """
+        terms = dict.fromkeys(_TOKEN.findall(query.lower()))
+        if not terms:
+            return []
+        # Quote every term so user text can't be read as FTS5 query syntax
+        match = " OR ".join(f'"{term}"' for term in terms)
+        scope_join = ""
+        with self._lock:
+            if invoice_ids is not None:
+                # Scoping inside the query ranks only the allowed invoices, however far down they'd be otherwise
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_scope (invoice_id TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM search_scope")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO search_scope (invoice_id) VALUES (?)",
+                    ((invoice_id,) for invoice_id in invoice_ids)
+                )
+                scope_join = "JOIN search_scope ON search_scope.invoice_id = invoice_rowids.invoice_id "
+            rows = self._conn.execute(
+                "SELECT invoice_rowids.invoice_id, bm25(invoice_documents) AS rank FROM invoice_documents "
+                "JOIN invoice_rowids ON invoice_rowids.rowid = invoice_documents.rowid "
+                f"{scope_join}WHERE invoice_documents MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        # SQLite reports BM25 negated so that ascending order is best first
+        return [(invoice_id, -rank) for invoice_id, rank in rows]
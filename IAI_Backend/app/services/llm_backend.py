@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.core.config import (
+    LLM_BACKEND,
+    LLM_MODEL_NAME,
+    LLM_API_ENDPOINT,
+    LLM_BASE_URL,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_FAKE_LATENCY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_CONTEXT_CACHE_TTL_MINUTES,
+)
+from logger import logger
+
+
+class LLMUsage:
+    """Token counts in the shape of Gemini's usage_metadata"""
+
+    def __init__(self, prompt_token_count: int = 0, candidates_token_count: int = 0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = 0
+
+
+class LLMResponse:
+    """A complete response, or one chunk of a streamed one"""
+
+    def __init__(self, text: str, usage_metadata: Optional[LLMUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class LLMStream:
+    """Async iterator of response chunks; usage_metadata is filled in once the stream is exhausted"""
+
+    def __init__(self, chunks: AsyncIterator[LLMResponse]):
+        self._chunks = chunks
+        self.usage_metadata: Optional[LLMUsage] = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for chunk in self._chunks:
+            if chunk.usage_metadata is not None:
+                self.usage_metadata = chunk.usage_metadata
+            if chunk.text:
+                yield chunk
+
+
+class LLMBackendError(Exception):
+    """Backend request failure; `code` is the HTTP status so the LLM client can decide whether to retry"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class LLMBackend:
+    """
+    Text generation model interface
+
+    Mirrors the part of genai.GenerativeModel the services use:
+    generate_content_async(prompt) returns an object with .text and
+    .usage_metadata, and with stream=True an async iterator of such chunks.
+    """
+
+    name = "base"
+    # Used when no model name is configured; backends without one need it set
+    default_model_name = ""
+    # Whether get_context_model can upload a prompt prefix once as cached context
+    supports_context_cache = False
+
+    def __init__(self, model_name: str = LLM_MODEL_NAME):
+        self.model_name = model_name or self.default_model_name
+        if not self.model_name:
+            raise ValueError(f"The {self.name} LLM backend needs LLM_MODEL_NAME set")
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if stream:
+            return LLMStream(self._stream(prompt))
+        return await self._generate(prompt)
+
+    async def _generate(self, prompt: str) -> LLMResponse:
+        raise NotImplementedError
+
+    async def _stream(self, prompt: str) -> AsyncIterator[LLMResponse]:
+        # Backends without native streaming send the whole answer as one chunk
+        yield await self._generate(prompt)
+
+    async def get_context_model(self, context_id: str, context: str):
+        """Model with `context` already uploaded as cached context, or None when unavailable"""
+        return None
+
+    def disable_context_model(self, context_id: str):
+        """Stop using the cached context for context_id after it failed"""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai, with context caching"""
+
+    name = "gemini"
+    default_model_name = "gemini-2.5-flash-preview-05-20"
+    supports_context_cache = True
+
+    def __init__(self,
+                 model_name: str = LLM_MODEL_NAME,
+                 api_endpoint: str = LLM_API_ENDPOINT,
+                 context_ttl_minutes: int = LLM_CONTEXT_CACHE_TTL_MINUTES):
+        super().__init__(model_name)
+        import google.generativeai as genai
+        genai.configure(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            client_options={"api_endpoint": api_endpoint} if api_endpoint else None
+        )
+        self._genai = genai
+        self._model = genai.GenerativeModel(self.model_name)
+        self.context_ttl = timedelta(minutes=context_ttl_minutes)
+        # context_id -> (model bound to the cached context or None when caching is unavailable, expiry)
+        self._context_models: Dict[str, Any] = {}
+        self._context_lock = asyncio.Lock()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        return await self._model.generate_content_async(prompt, stream=stream)
+
+    async def get_context_model(self, context_id: str, context: str):
+        """Model bound to the context as Gemini cached content, created once per context_id and TTL"""
+        async with self._context_lock:
+            cached = self._context_models.get(context_id)
+            if cached is not None:
+                model, expires_at = cached
+                if datetime.now() < expires_at:
+                    return model
+
+            try:
+                from google.generativeai import caching
+                cached_content = await asyncio.to_thread(
+                    caching.CachedContent.create,
+                    model=self.model_name,
+                    display_name=f"policy-{context_id[:16]}",
+                    system_instruction=context,
+                    ttl=self.context_ttl
+                )
+                model = self._genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                logger.info(f"Created cached policy context for {context_id[:12]}")
+            except Exception as e:
+                # Typically the context is below the model's minimum cacheable size; don't retry until the TTL passes
+                logger.warning(f"Context caching unavailable for policy {context_id[:12]}: {str(e)}")
+                model = None
+
+            # Expire a minute early so we never send a request against a cache the server just dropped
+            self._context_models[context_id] = (model, datetime.now() + self.context_ttl - timedelta(minutes=1))
+            return model
+
+    def disable_context_model(self, context_id: str):
+        """Send full prompts for this context until its cache entry would have expired"""
+        cached = self._context_models.get(context_id)
+        if cached is not None:
+            self._context_models[context_id] = (None, cached[1])
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Chat completions API of an OpenAI-compatible server such as vLLM, llama.cpp or Ollama"""
+
+    name = "openai"
+
+    def __init__(self,
+                 model_name: str = LLM_MODEL_NAME,
+                 base_url: str = LLM_BASE_URL,
+                 max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS):
+        super().__init__(model_name)
+        import httpx
+        headers = {"Authorization": f"Bearer {os.getenv('LLM_API_KEY')}"} if os.getenv("LLM_API_KEY") else {}
+        self._client = httpx.AsyncClient(base_url=base_url.rstrip("/"), headers=headers, timeout=LLM_REQUEST_TIMEOUT)
+        self.max_output_tokens = max_output_tokens
+
+    def _payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_output_tokens,
+            "temperature": 0,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _usage(body: Dict[str, Any]) -> Optional[LLMUsage]:
+        usage = body.get("usage")
+        if not usage:
+            return None
+        return LLMUsage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        import httpx
+        payload = self._payload(prompt, stream)
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        try:
+            # Streams are opened here, so a 429 on opening reaches the LLM client's retries
+            response = await self._client.send(
+                self._client.build_request("POST", "/chat/completions", json=payload), stream=stream
+            )
+        except httpx.TransportError as e:
+            # Connection problems are as retryable as an overloaded server
+            raise LLMBackendError(f"{type(e).__name__}: {str(e)}", code=503)
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            raise LLMBackendError(f"{response.status_code} {response.text[:200]}", code=response.status_code)
+        if stream:
+            return LLMStream(self._read_stream(response))
+        body = response.json()
+        return LLMResponse(body["choices"][0]["message"]["content"] or "", self._usage(body))
+
+    async def _read_stream(self, response) -> AsyncIterator[LLMResponse]:
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                body = json.loads(data)
+                choices = body.get("choices") or [{}]
+                yield LLMResponse((choices[0].get("delta") or {}).get("content") or "", self._usage(body))
+        finally:
+            await response.aclose()
+
+
+class HuggingFaceBackend(LLMBackend):
+    """Small causal LM run in-process with transformers, loaded on first use"""
+
+    name = "huggingface"
+    default_model_name = "Qwen/Qwen2.5-0.5B-Instruct"
+
+    def __init__(self, model_name: str = LLM_MODEL_NAME, max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS):
+        super().__init__(model_name)
+        self.max_output_tokens = max_output_tokens
+        self._pipeline = None
+        self._load_lock = threading.Lock()
+        # One generation at a time; the model is not safe to share between threads
+        self._generate_lock = threading.Lock()
+
+    def _get_pipeline(self):
+        if self._pipeline is None:
+            with self._load_lock:
+                if self._pipeline is None:
+                    from transformers import pipeline
+                    logger.info(f"Loading Hugging Face model {self.model_name}")
+                    self._pipeline = pipeline("text-generation", model=self.model_name)
+        return self._pipeline
+
+    def _generate_sync(self, prompt: str) -> LLMResponse:
+        generator = self._get_pipeline()
+        tokenizer = generator.tokenizer
+        if getattr(tokenizer, "chat_template", None):
+            prompt = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+            )
+        with self._generate_lock:
+            output = generator(
+                prompt,
+                max_new_tokens=self.max_output_tokens,
+                do_sample=False,
+                return_full_text=False
+            )[0]["generated_text"]
+        return LLMResponse(output, LLMUsage(len(tokenizer.encode(prompt)), len(tokenizer.encode(output))))
+
+    async def _generate(self, prompt: str) -> LLMResponse:
+        return await asyncio.to_thread(self._generate_sync, prompt)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic offline stand-in for throughput tests
+
+    Recognises the service's prompts and answers in their format after
+    `latency` seconds: invoice decisions derived from a hash of the invoice
+    text (total = the first amount in it), empty filters, and a chatbot reply
+    counting the invoices in its context.
+    """
+
+    name = "fake"
+    default_model_name = "fake"
+
+    _STATUSES = ("Fully Reimbursed", "Partially Reimbursed", "Declined")
+    _AMOUNT = re.compile(r"(\d[\d,]*\.\d{2})\b|\$\s*(\d[\d,]*(?:\.\d+)?)")
+    _BATCH_INVOICE = re.compile(r"INVOICE \[(\d+)\]:\n(.*?)(?=\nINVOICE \[\d+\]:\n|\nAnalyze each invoice)", re.DOTALL)
+
+    def __init__(self, model_name: str = "", latency: float = LLM_FAKE_LATENCY):
+        super().__init__(model_name)
+        self.latency = latency
+
+    def _decide(self, invoice_text: str) -> Dict[str, Any]:
+        match = self._AMOUNT.search(invoice_text)
+        total = float((match.group(1) or match.group(2)).replace(",", "")) if match else 0.0
+        status = self._STATUSES[int(hashlib.sha256(invoice_text.encode()).hexdigest(), 16) % 3]
+        approved = {"Fully Reimbursed": total, "Partially Reimbursed": round(total / 2, 2)}.get(status, 0.0)
+        return {
+            "status": status,
+            "reason": f"Fake backend decision for an invoice of {total:.2f}",
+            "approved_amount": approved,
+            "total_amount": total,
+        }
+
+    def _respond(self, prompt: str) -> str:
+        if "EMPLOYEE INVOICES:" in prompt:
+            return json.dumps([
+                {"index": int(index), **self._decide(text.strip())} for index, text in self._BATCH_INVOICE.findall(prompt)
+            ])
+        if "EMPLOYEE INVOICE:" in prompt:
+            invoice_text = prompt.split("Invoice Content:", 1)[-1].split("\nBased on the policy", 1)[0].strip()
+            return json.dumps(self._decide(invoice_text))
+        if "extracts structured filters" in prompt:
+            return json.dumps(dict.fromkeys(("employee_name", "status", "invoice_id", "date", "amount")))
+        invoices = prompt.count("**Invoice ID:**")
+        return f"The invoice database returned **{invoices}** relevant invoice(s) for your question."
+
+    def _usage(self, prompt: str, text: str) -> LLMUsage:
+        return LLMUsage(len(prompt) // 4 + 1, len(text) // 4 + 1)
+
+    async def _generate(self, prompt: str) -> LLMResponse:
+        await asyncio.sleep(self.latency)
+        text = self._respond(prompt)
+        return LLMResponse(text, self._usage(prompt, text))
+
+    async def _stream(self, prompt: str) -> AsyncIterator[LLMResponse]:
+        await asyncio.sleep(self.latency)
+        text = self._respond(prompt)
+        words: List[str] = re.findall(r"\S+\s*", text)
+        for word in words[:-1]:
+            yield LLMResponse(word)
+        yield LLMResponse(words[-1] if words else "", self._usage(prompt, text))
+
+
+def create_llm_backend(backend_name: str = LLM_BACKEND) -> LLMBackend:
+    """Build the LLM backend selected by configuration"""
+    if backend_name == "gemini":
+        return GeminiBackend()
+    if backend_name == "openai":
+        return OpenAICompatibleBackend()
+    if backend_name == "huggingface":
+        return HuggingFaceBackend()
+    if backend_name == "fake":
+        return FakeBackend()
+    raise ValueError(f"Unknown LLM backend: {backend_name}")
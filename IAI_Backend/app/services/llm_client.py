@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.core.config import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_CALL_DEADLINE,
+)
+from logger import logger
+
+# HTTP statuses (as reported by google.api_core exceptions) worth retrying
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`, holding at most one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        # Held while waiting, so callers are served in arrival order
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` units, sleeping until they are available; returns the seconds waited"""
+        if not self.enabled:
+            return 0.0
+        # A request larger than the bucket could never fit; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return waited
+                delay = (amount - self._level) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def consume(self, amount: float):
+        """Charge units after the fact (e.g. tokens beyond the estimate); the level may go negative"""
+        if self.enabled:
+            self._refill()
+            self._level -= amount
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reported the quota exhausted"""
+        if self.enabled:
+            self._refill()
+            self._level = min(self._level, 0.0)
+
+
+class RateLimitedLLMClient:
+    """
+    Shared call layer for every Gemini request
+
+    Each call waits for a request and an estimated-token slot in the
+    requests-per-minute and tokens-per-minute buckets, is bounded by a
+    per-attempt timeout and an overall deadline, and is retried on 429/5xx
+    and timeouts with exponential backoff and full jitter (or the server's
+    RetryInfo delay). Identical concurrent non-streaming prompts to the same
+    model share one request.
+    """
+
+    def __init__(self,
+                 requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY,
+                 request_timeout: float = LLM_REQUEST_TIMEOUT,
+                 deadline: float = LLM_CALL_DEADLINE):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self._in_flight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "timeouts": 0,
+            "failures": 0,
+            "deduplicated": 0,
+            "throttled_seconds": 0.0
+        }
+
+    async def generate(self,
+                       model,
+                       prompt: str,
+                       stream: bool = False,
+                       deadline: Optional[float] = None,
+                       on_response: Optional[Callable[[Any], None]] = None):
+        """
+        Rate-limited, retried model.generate_content_async(prompt)
+
+        With stream=True only opening the stream is retried; chunks already
+        handed to the caller can't be replayed. on_response is called once
+        per model request with its response, so callers sharing a
+        deduplicated request don't each account for it.
+
+        Raises:
+            TimeoutError: The deadline passed before a response arrived
+            Exception: The last model error once retries are exhausted or it isn't retryable
+        """
+        if stream:
+            return await self._generate_with_retries(model, prompt, True, deadline or self.deadline)
+
+        key = (id(model), prompt)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._generate_with_retries(model, prompt, False, deadline or self.deadline))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+            if on_response is not None:
+                task.add_done_callback(
+                    lambda done: on_response(done.result()) if not done.cancelled() and done.exception() is None else None
+                )
+        else:
+            self.stats["deduplicated"] += 1
+        # Shielded so one caller giving up doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _generate_with_retries(self, model, prompt: str, stream: bool, deadline: float):
+        expires_at = time.monotonic() + deadline
+        estimated_tokens = len(prompt) // 4 + 1
+        attempt = 0
+        while True:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                self.stats["failures"] += 1
+                raise TimeoutError(f"LLM call exceeded its {deadline:.0f}s deadline")
+            try:
+                return await asyncio.wait_for(
+                    self._attempt(model, prompt, stream, estimated_tokens),
+                    min(self.request_timeout, remaining)
+                )
+            except Exception as e:
+                retryable, retry_after = self._classify(e)
+                if not retryable or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = retry_after if retry_after is not None else random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2 ** attempt)
+                )
+                if time.monotonic() + delay >= expires_at:
+                    self.stats["failures"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(
+                    f"LLM call failed ({type(e).__name__}: {str(e)[:120]}), retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, model, prompt: str, stream: bool, estimated_tokens: int):
+        waited = await self.request_bucket.acquire(1)
+        waited += await self.token_bucket.acquire(estimated_tokens)
+        self.stats["throttled_seconds"] += waited
+        self.stats["requests"] += 1
+        if stream:
+            return await model.generate_content_async(prompt, stream=True)
+        response = await model.generate_content_async(prompt)
+        # Charge what the model actually counted beyond our estimate
+        usage_metadata = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0) or 0
+        if prompt_tokens > estimated_tokens:
+            self.token_bucket.consume(prompt_tokens - estimated_tokens)
+        return response
+
+    def _classify(self, error: Exception) -> Tuple[bool, Optional[float]]:
+        """Whether an error is worth retrying, and the server's requested delay if it gave one"""
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats["timeouts"] += 1
+            return True, None
+        code = getattr(error, "code", None)
+        if not isinstance(code, int) or code not in _RETRYABLE_CODES:
+            return False, None
+        if code == 429:
+            self.stats["rate_limited"] += 1
+            # Quota is spent for everyone; hold back the other callers too
+            self.request_bucket.drain()
+        for detail in getattr(error, "details", None) or []:
+            retry_delay = getattr(detail, "retry_delay", None)
+            if retry_delay is not None and hasattr(retry_delay, "seconds"):
+                return True, min(self.max_delay, retry_delay.seconds + retry_delay.nanos / 1e9)
+        return True, None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+        stats["in_flight"] = len(self._in_flight)
+        return stats
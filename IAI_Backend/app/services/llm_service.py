@@ -1,79 +1,352 @@
-from typing import Dict, Any, List
+from typing import AsyncIterator, Dict, Any, List, Optional
 from logger import logger
+import asyncio
 import json
 import re
 # from huggingface_hub import hf_hub_download
-import google.generativeai as genai
 from dotenv import load_dotenv
-from app.core.prompts import ANALYSE_INVOICE_PROMPT, CHATBOT_RESPONSE_PROMPT
+from app.core.config import (
+    LLM_MODEL_NAME,
+    LLM_CONTEXT_CACHE_ENABLED,
+    LLM_BATCH_TOKEN_BUDGET,
+)
+from app.core.prompts import (
+    POLICY_CONTEXT_PROMPT,
+    INVOICE_ANALYSIS_PROMPT,
+    INVOICE_BATCH_ANALYSIS_PROMPT,
+    CHATBOT_RESPONSE_PROMPT,
+    FILTER_EXTRACTION_PROMPT,
+)
 from app.models.models import ReimbursementStatus
-import os
+from app.services.llm_client import RateLimitedLLMClient
+from app.services.llm_backend import LLMBackend, create_llm_backend
 
 load_dotenv()
 
+_JSON_START = re.compile(r'[\{\[]')
+# Chatbot reply when the model is unavailable or fails; never worth caching
+CHATBOT_ERROR_RESPONSE = "Sorry, I couldn't process your request at the moment."
+
 class LLMService:
-    """Service for LLM operations using Hugging Face transformers"""
+    """Service for LLM operations on the configured backend (see LLM_BACKEND)"""
     
-    def __init__(self):
+    def __init__(self,
+                 use_context_cache: bool = LLM_CONTEXT_CACHE_ENABLED,
+                 client: Optional[RateLimitedLLMClient] = None,
+                 backend: Optional[LLMBackend] = None):
+        self.model: Optional[LLMBackend] = None
+        self.model_name = LLM_MODEL_NAME
+        self.use_context_cache = use_context_cache
+        self.usage = {
+            "calls": 0,
+            "context_cached_calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "output_tokens": 0
+        }
+        # Every model call goes through here for rate limiting, retries, deadlines and dedup
+        self.client = client or RateLimitedLLMClient()
         try:
-            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-            self.model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20")
+            self.model = backend or create_llm_backend()
+            self.model_name = self.model.model_name
         except Exception as e:
             logger.error(f"Failed to configure LLM service: {str(e)}")
 
 
-    def analyze_invoice(self, invoice_text: str, policy_text: str, employee_name: str) -> Dict[str, Any]:
-        """Analyze invoice against policy using LLM"""
+    async def analyze_invoice(self,
+                              invoice_text: str,
+                              policy_text: str,
+                              employee_name: str,
+                              policy_id: Optional[str] = None,
+                              return_exceptions: bool = False) -> Dict[str, Any]:
+        """
+        Analyze invoice against policy using LLM
+
+        When a policy_id is given and context caching is enabled, the policy is
+        uploaded once as cached context and only the invoice is sent per call.
+        Falls back to the full prompt if the cache cannot be created or used.
+        A failed analysis returns None, or the exception with return_exceptions=True.
+        """
 
         try:
-            if not self.model:
-                raise RuntimeError("LLM model not available")
-            prompt = ANALYSE_INVOICE_PROMPT.format(
-                policy_text=policy_text,
-                employee_name=employee_name,
-                invoice_text=invoice_text
+            response_text = await self._generate_with_policy(
+                INVOICE_ANALYSIS_PROMPT.format(employee_name=employee_name, invoice_text=invoice_text),
+                policy_text,
+                policy_id
             )
-            response = self.model.generate_content(prompt).text.strip()
-            return self._parse_analysis_response(response)
+            analysis = self._parse_analysis_response(response_text)
+            if analysis is None:
+                raise ValueError("LLM response was not a valid analysis")
+            return analysis
         except Exception as e:
             logger.error(f"Error in LLM analysis: {str(e)}")
-            return None
+            return e if return_exceptions else None
+
+    async def analyze_invoices_batch(self,
+                                     invoice_texts: List[str],
+                                     policy_text: str,
+                                     employee_name: str,
+                                     policy_id: Optional[str] = None,
+                                     token_budget: int = LLM_BATCH_TOKEN_BUDGET,
+                                     return_exceptions: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """
+        Analyze several invoices with as few LLM calls as possible
+
+        Invoices are packed into prompts that return a JSON array of decisions,
+        keeping each prompt's invoice text under token_budget. A batch whose
+        response can't be matched back to every invoice is split in half and
+        retried; single invoices fall back to analyze_invoice.
+
+        Returns:
+            One analysis (or None on failure; the exception with
+            return_exceptions=True) per invoice, in input order
+        """
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(invoice_texts)
+        groups = []
+        current, current_tokens = [], 0
+        for index, invoice_text in enumerate(invoice_texts):
+            tokens = self._estimate_tokens(invoice_text)
+            if current and current_tokens + tokens > token_budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+
+        await asyncio.gather(*[
+            self._analyze_batch_group(group, invoice_texts, policy_text, employee_name, policy_id, results, return_exceptions)
+            for group in groups
+        ])
+        return results
+
+    async def _analyze_batch_group(self,
+                                   group: List[int],
+                                   invoice_texts: List[str],
+                                   policy_text: str,
+                                   employee_name: str,
+                                   policy_id: Optional[str],
+                                   results: List[Optional[Dict[str, Any]]],
+                                   return_exceptions: bool = False):
+        """Analyze one packed group, re-splitting it until every invoice has a decision"""
+
+        if len(group) == 1:
+            index = group[0]
+            results[index] = await self.analyze_invoice(
+                invoice_texts[index], policy_text, employee_name, policy_id, return_exceptions
+            )
+            return
+
+        parsed = {}
+        try:
+            invoices_text = "\n".join(
+                f"INVOICE [{position}]:\n{invoice_texts[index]}\n"
+                for position, index in enumerate(group)
+            )
+            response_text = await self._generate_with_policy(
+                INVOICE_BATCH_ANALYSIS_PROMPT.format(
+                    employee_name=employee_name,
+                    invoice_count=len(group),
+                    invoices_text=invoices_text
+                ),
+                policy_text,
+                policy_id
+            )
+            parsed = self._parse_batch_analysis_response(response_text, len(group))
+        except Exception as e:
+            logger.warning(f"Batch analysis of {len(group)} invoices failed, re-splitting: {str(e)}")
+
+        missing = [index for position, index in enumerate(group) if position not in parsed]
+        for position, index in enumerate(group):
+            if position in parsed:
+                results[index] = parsed[position]
+
+        if missing:
+            if len(missing) < len(group):
+                logger.warning(f"Batch response missed {len(missing)} of {len(group)} invoices, retrying them")
+            middle = max(1, len(missing) // 2)
+            await asyncio.gather(*[
+                self._analyze_batch_group(part, invoice_texts, policy_text, employee_name, policy_id, results, return_exceptions)
+                for part in (missing[:middle], missing[middle:]) if part
+            ])
+
+    async def _generate_with_policy(self, invoice_prompt: str, policy_text: str, policy_id: Optional[str]) -> str:
+        """Run an invoice prompt against the policy, via cached context when available"""
+
+        if not self.model:
+            raise RuntimeError("LLM model not available")
+
+        if self.use_context_cache and policy_id and self.model.supports_context_cache:
+            cached_model = await self.model.get_context_model(
+                policy_id, POLICY_CONTEXT_PROMPT.format(policy_text=policy_text)
+            )
+            if cached_model is not None:
+                try:
+                    response = await self.client.generate(
+                        cached_model, invoice_prompt,
+                        on_response=lambda response: self._record_usage(response, context_cached=True)
+                    )
+                    return response.text.strip()
+                except Exception as e:
+                    logger.warning(f"Cached policy context failed, falling back to full prompt: {str(e)}")
+                    self.model.disable_context_model(policy_id)
+
+        prompt = POLICY_CONTEXT_PROMPT.format(policy_text=policy_text) + invoice_prompt
+        response = await self.client.generate(self.model, prompt, on_response=self._record_usage)
+        return response.text.strip()
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count (~4 characters per token) used for batch packing"""
+        return len(text) // 4 + 1
+
+    def _record_usage(self, response, context_cached: bool = False):
+        """Accumulate token usage reported by the model, once per model request"""
+
+        self.usage["calls"] += 1
+        if context_cached:
+            self.usage["context_cached_calls"] += 1
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata is None:
+            return
+        self.usage["prompt_tokens"] += getattr(usage_metadata, "prompt_token_count", 0) or 0
+        self.usage["cached_tokens"] += getattr(usage_metadata, "cached_content_token_count", 0) or 0
+        self.usage["output_tokens"] += getattr(usage_metadata, "candidates_token_count", 0) or 0
+
+    def get_usage_stats(self) -> Dict[str, int]:
+        """Token usage counters since startup"""
+        return dict(self.usage)
+
+    async def extract_filters(self, query: str) -> Dict[str, Any]:
+        """Extract structured search filters from a chatbot query using LLM"""
+
+        if not self.model:
+            raise RuntimeError("LLM model not available")
+        prompt = FILTER_EXTRACTION_PROMPT.format(query=query)
+        response = await self.client.generate(self.model, prompt, on_response=self._record_usage)
+        filter_response = response.text.strip()
+
+        # raw_decode takes the whole object, so nested filters aren't cut at the first "}"
+        for value in self._iter_json_values(filter_response):
+            if isinstance(value, dict):
+                return value
+        if "{" not in filter_response:
+            raise ValueError("No JSON found")
+        logger.error("Failed to parse LLM filters: no valid JSON object in response")
+        return {}
 
     def _parse_analysis_response(self, analysis_text: str) -> Dict[str, Any]:
         """Parse LLM response into structured format"""
 
-        try:
-            json_match = re.search(r'\{.*?\}', analysis_text, re.DOTALL)
-            if not json_match:
-                raise ValueError("No JSON found")
-            analysis_data = json.loads(json_match.group(0))
-            return {
-                "status": analysis_data.get("status", ReimbursementStatus.PARTIALLY_REIMBURSED),
-                "reason": analysis_data.get("reason", "No reason provided"),
-                "approved_amount": float(analysis_data.get("approved_amount", 0.0)),
-                "total_amount": float(analysis_data.get("total_amount", 0.0))
-            }
-        except json.JSONDecodeError:
-            logger.error("Failed to parse LLM response as JSON")
-            return None
-
-    def generate_chatbot_response(self, query: str, context: str, chat_history: List[Dict]) -> str:
+        for value in self._iter_json_values(analysis_text):
+            if isinstance(value, dict):
+                try:
+                    return self._normalize_analysis(value)
+                except (TypeError, ValueError):
+                    continue
+        logger.error("Failed to parse LLM response as JSON")
+        return None
+
+    def _parse_batch_analysis_response(self, analysis_text: str, expected: int) -> Dict[int, Dict[str, Any]]:
+        """Parse a batch response into {position: analysis}, skipping malformed items"""
+
+        items = []
+        for value in self._iter_json_values(analysis_text):
+            if isinstance(value, list):
+                items = value
+                break
+            if isinstance(value, dict):
+                items.append(value)
+
+        parsed = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index", position))
+                if 0 <= index < expected and index not in parsed:
+                    parsed[index] = self._normalize_analysis(item)
+            except (TypeError, ValueError):
+                continue
+        return parsed
+
+    @staticmethod
+    def _iter_json_values(text: str):
+        """Yield each top-level JSON object or array embedded in free text"""
+
+        decoder = json.JSONDecoder()
+        position = 0
+        while True:
+            match = _JSON_START.search(text, position)
+            if not match:
+                return
+            try:
+                value, end = decoder.raw_decode(text, match.start())
+            except json.JSONDecodeError:
+                position = match.start() + 1
+                continue
+            yield value
+            position = end
+
+    @staticmethod
+    def _normalize_analysis(analysis_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": analysis_data.get("status", ReimbursementStatus.PARTIALLY_REIMBURSED),
+            "reason": analysis_data.get("reason", "No reason provided"),
+            "approved_amount": float(analysis_data.get("approved_amount") or 0.0),
+            "total_amount": float(analysis_data.get("total_amount") or 0.0)
+        }
+
+    async def generate_chatbot_response(self, query: str, context: str, chat_history: List[Dict]) -> str:
         """Generate chatbot response based on query and retrieved context"""
         
         try:
-            history_text = ""
-            for msg in chat_history[-3:]:
-                history_text += f"User: {msg.get('user', '')}\nBot: {msg.get('bot', '')}\n"
-
             if not self.model:
                 raise RuntimeError("LLM model not available")
 
-            prompt = CHATBOT_RESPONSE_PROMPT.format(
-                        history_text=history_text, 
-                        context=context, 
-                        query=query
-                    )
-            return self.model.generate_content(prompt).text.strip()
+            prompt = self._build_chatbot_prompt(query, context, chat_history)
+            response = await self.client.generate(self.model, prompt, on_response=self._record_usage)
+            return response.text.strip()
         except Exception as e:
             logger.error(f"Error generating chatbot response: {str(e)}")
-            return "Sorry, I couldn't process your request at the moment."
\ No newline at end of file
+            return CHATBOT_ERROR_RESPONSE
+
+    async def stream_chatbot_response(self, query: str, context: str, chat_history: List[Dict]) -> AsyncIterator[str]:
+        """Generate the chatbot response as a stream of text chunks"""
+
+        if not self.model:
+            logger.error("Error generating chatbot response: LLM model not available")
+            yield CHATBOT_ERROR_RESPONSE
+            return
+
+        prompt = self._build_chatbot_prompt(query, context, chat_history)
+        sent_any = False
+        try:
+            response = await self.client.generate(self.model, prompt, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks carrying only a finish reason or safety ratings have no text
+                    continue
+                if text:
+                    sent_any = True
+                    yield text
+            self._record_usage(response)
+        except Exception as e:
+            logger.error(f"Error streaming chatbot response: {str(e)}")
+            if not sent_any:
+                yield CHATBOT_ERROR_RESPONSE
+
+    @staticmethod
+    def _build_chatbot_prompt(query: str, context: str, chat_history: List[Dict]) -> str:
+        history_text = ""
+        for msg in chat_history[-3:]:
+            history_text += f"User: {msg.get('user', '')}\nBot: {msg.get('bot', '')}\n"
+
+        return CHATBOT_RESPONSE_PROMPT.format(
+                    history_text=history_text, 
+                    context=context, 
+                    query=query
+                )
@@ -1,23 +1,219 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
+from typing import Any, List, Optional, Tuple
 import PyPDF2
+from app.core.config import PDF_EXTRACTION_WORKERS, PDF_EXTRACTOR, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK
 from app.utils.utils import clean_extracted_text
 from logger import logger
 from fastapi import HTTPException
 
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process pool shared by all CPU-bound PDF extraction work"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACTION_WORKERS)
+    return _process_pool
+
+
+class PDFExtractor:
+    """
+    PDF text extraction library interface
+
+    A document is opened once with open() and then asked for its page count
+    and page texts, so a worker needs to parse the file only once.
+    """
+
+    name = "base"
+
+    def open(self, pdf_content: bytes) -> Any:
+        raise NotImplementedError
+
+    def close(self, document: Any):
+        pass
+
+    def page_count(self, document: Any) -> int:
+        raise NotImplementedError
+
+    def extract_pages(self, document: Any, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Text of pages [start, stop), one string per page"""
+        raise NotImplementedError
+
+
+class PyPDF2Extractor(PDFExtractor):
+    """Pure-Python PyPDF2"""
+
+    name = "pypdf2"
+
+    def open(self, pdf_content: bytes) -> Any:
+        return PyPDF2.PdfReader(BytesIO(pdf_content))
+
+    def page_count(self, document: Any) -> int:
+        return len(document.pages)
+
+    def extract_pages(self, document: Any, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        pages = document.pages
+        stop = len(pages) if stop is None else min(stop, len(pages))
+        return [pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+class PdfiumExtractor(PDFExtractor):
+    """pypdfium2 bindings to PDFium, Chrome's C++ PDF engine"""
+
+    name = "pypdfium2"
+
+    def open(self, pdf_content: bytes) -> Any:
+        import pypdfium2
+        return pypdfium2.PdfDocument(pdf_content)
+
+    def close(self, document: Any):
+        document.close()
+
+    def page_count(self, document: Any) -> int:
+        return len(document)
+
+    def extract_pages(self, document: Any, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        stop = len(document) if stop is None else min(stop, len(document))
+        pages = []
+        for index in range(start, stop):
+            page = document[index]
+            text_page = page.get_textpage()
+            pages.append(text_page.get_text_range())
+            text_page.close()
+            page.close()
+        return pages
+
+
+class PdfMinerExtractor(PDFExtractor):
+    """pdfminer.six layout analysis, slower but strong on multi-column documents"""
+
+    name = "pdfminer"
+
+    def open(self, pdf_content: bytes) -> Any:
+        return BytesIO(pdf_content)
+
+    def page_count(self, document: Any) -> int:
+        from pdfminer.pdfpage import PDFPage
+        document.seek(0)
+        return sum(1 for _ in PDFPage.get_pages(document))
+
+    def extract_pages(self, document: Any, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        from pdfminer.high_level import extract_text
+        stop = self.page_count(document) if stop is None else stop
+        if stop <= start:
+            return []
+        document.seek(0)
+        # pdfminer ends every page with a form feed
+        text = extract_text(document, page_numbers=range(start, stop))
+        return text.split("\f")[:stop - start]
+
+
+@lru_cache
+def get_pdf_extractor(name: str = PDF_EXTRACTOR) -> PDFExtractor:
+    """PDF extractor selected by configuration"""
+    if name == "pypdf2":
+        return PyPDF2Extractor()
+    if name == "pypdfium2":
+        return PdfiumExtractor()
+    if name == "pdfminer":
+        return PdfMinerExtractor()
+    raise ValueError(f"Unknown PDF extractor: {name}")
+
+
+def _extract_text_worker(pdf_content: bytes,
+                         parallel_min_pages: int = 0,
+                         pages_per_task: int = 0) -> Tuple[Optional[List[str]], Optional[str], int]:
+    """
+    Process pool worker: returns (page texts, error, page_count) so failures cross the process boundary as plain strings
+
+    Documents with at least `parallel_min_pages` pages (when non-zero) are
+    only extracted up to `pages_per_task`; the caller fans the remaining
+    pages out with _extract_pages_worker.
+    """
+    try:
+        extractor = get_pdf_extractor()
+        document = extractor.open(pdf_content)
+        try:
+            page_count = extractor.page_count(document)
+            stop = page_count
+            if parallel_min_pages and page_count >= parallel_min_pages:
+                stop = min(page_count, max(1, pages_per_task))
+            return extractor.extract_pages(document, 0, stop), None, page_count
+        finally:
+            extractor.close(document)
+    except Exception as e:
+        return None, f"Error processing PDF: {str(e)}", 0
+
+
+def _extract_pages_worker(pdf_content: bytes, start: int, stop: int) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Process pool worker extracting one page range: returns (page texts, error)"""
+    try:
+        extractor = get_pdf_extractor()
+        document = extractor.open(pdf_content)
+        try:
+            return extractor.extract_pages(document, start, stop), None
+        finally:
+            extractor.close(document)
+    except Exception as e:
+        return None, f"Error processing PDF: {str(e)}"
+
+
 class PDFProcessor:
     """Service for processing PDF documents"""
-    
+
+    @staticmethod
+    def join_pages(pages: List[str]) -> str:
+        """Assemble page texts into the document text in one pass"""
+        text = "\n".join(page for page in pages if page)
+        # pypdfium2 ends lines with \r\n, which clean_extracted_text would collapse to a space
+        return clean_extracted_text(text.replace("\r\n", "\n").replace("\r", "\n"))
+
     @staticmethod
     def extract_text_from_pdf(pdf_content: bytes) -> str:
-        """Extract text content from PDF bytes"""
+        """Extract text content from PDF bytes with the configured extractor (PDF_EXTRACTOR)"""
         try:
-            pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_content))
-            text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return clean_extracted_text(text)
+            extractor = get_pdf_extractor()
+            document = extractor.open(pdf_content)
+            try:
+                return PDFProcessor.join_pages(extractor.extract_pages(document))
+            finally:
+                extractor.close(document)
         except Exception as e:
             logger.error(f"Error extracting PDF text: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+    @staticmethod
+    async def extract_text_from_pdf_async(pdf_content: bytes) -> str:
+        """
+        Extract text content from PDF bytes on the process pool, keeping the event loop free
+
+        Documents of PDF_PARALLEL_MIN_PAGES pages or more are split into
+        PDF_PAGES_PER_TASK page ranges extracted in parallel across the pool.
+        """
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        parallel_min_pages = PDF_PARALLEL_MIN_PAGES if PDF_EXTRACTION_WORKERS > 1 else 0
+        pages_per_task = max(1, PDF_PAGES_PER_TASK)
+        pages, error, page_count = await loop.run_in_executor(
+            pool, _extract_text_worker, pdf_content, parallel_min_pages, pages_per_task
+        )
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+        if not parallel_min_pages or page_count < parallel_min_pages or page_count <= pages_per_task:
+            return PDFProcessor.join_pages(pages)
+
+        # The first range came back with the page count; extract the rest in parallel
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, _extract_pages_worker, pdf_content, start, min(start + pages_per_task, page_count))
+            for start in range(pages_per_task, page_count, pages_per_task)
+        ])
+        for range_pages, error in results:
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+            pages.extend(range_pages)
+        logger.info(f"Extracted {page_count} pages in {len(results) + 1} parallel ranges")
+        return PDFProcessor.join_pages(pages)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from app.core.config import POLICY_CACHE_SIZE, POLICY_CACHE_DIR, POLICY_CACHE_DISK_SIZE
+from app.services.pdf_processor import PDFProcessor
+from logger import logger
+
+
+class PolicyCache:
+    """Content-addressed cache of extracted policy documents, bounded in memory and on disk"""
+
+    def __init__(self,
+                 max_entries: int = POLICY_CACHE_SIZE,
+                 persist_dir: str = POLICY_CACHE_DIR,
+                 max_disk_entries: int = POLICY_CACHE_DISK_SIZE):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.persist_dir:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_content(pdf_content: bytes) -> str:
+        """Policy ID for a PDF: SHA-256 of its raw bytes"""
+        return hashlib.sha256(pdf_content).hexdigest()
+
+    async def get_or_extract(self, pdf_content: bytes) -> Tuple[str, str]:
+        """Return (policy_id, policy_text), extracting the PDF only on a cache miss"""
+        policy_id = self.hash_content(pdf_content)
+        policy_text = self.get_text(policy_id)
+        if policy_text is None:
+            policy_text = await PDFProcessor.extract_text_from_pdf_async(pdf_content)
+            self.put(policy_id, policy_text)
+        else:
+            logger.info(f"Policy cache hit for {policy_id[:12]}")
+        return policy_id, policy_text
+
+    def get_text(self, policy_id: str) -> Optional[str]:
+        """Extracted policy text, or None if the policy is unknown"""
+        entry = self._get_entry(policy_id)
+        return entry["text"] if entry else None
+
+    def put(self, policy_id: str, policy_text: str):
+        """Cache extracted policy text under its content hash"""
+        entry = {
+            "policy_id": policy_id,
+            "text": policy_text,
+            "created_at": datetime.now().isoformat()
+        }
+        with self._lock:
+            self._insert(policy_id, entry)
+        self._persist(entry)
+
+    def _get_entry(self, policy_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(policy_id)
+            if entry is not None:
+                self._entries.move_to_end(policy_id)
+        if entry is not None:
+            self._touch(policy_id)
+            return entry
+
+        entry = self._load(policy_id)
+        if entry is not None:
+            with self._lock:
+                self._insert(policy_id, entry)
+        return entry
+
+    def _insert(self, policy_id: str, entry: Dict[str, Any]):
+        # Caller holds the lock
+        self._entries[policy_id] = entry
+        self._entries.move_to_end(policy_id)
+        while len(self._entries) > self.max_entries:
+            evicted_id, _ = self._entries.popitem(last=False)
+            logger.info(f"Evicted policy {evicted_id[:12]} from memory cache")
+
+    def _path(self, policy_id: str) -> Optional[Path]:
+        # Policy IDs are hex digests; anything else never touches the filesystem
+        if not self.persist_dir or not policy_id or not all(c in "0123456789abcdef" for c in policy_id):
+            return None
+        return self.persist_dir / f"{policy_id}.json"
+
+    def _persist(self, entry: Dict[str, Any]):
+        path = self._path(entry["policy_id"])
+        if path is None:
+            return
+        try:
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entry))
+            tmp_path.replace(path)
+            self._prune()
+        except Exception as e:
+            logger.error(f"Failed to persist policy {entry['policy_id'][:12]}: {str(e)}")
+
+    def _touch(self, policy_id: str):
+        # Marks the policy file as recently used for disk eviction
+        path = self._path(policy_id)
+        if path is None or not path.exists():
+            return
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        """Delete the least recently used policy files beyond max_disk_entries"""
+        paths = sorted(self.persist_dir.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in paths[:max(0, len(paths) - self.max_disk_entries)]:
+            path.unlink(missing_ok=True)
+            logger.info(f"Evicted policy {path.stem[:12]} from disk cache")
+
+    def _load(self, policy_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(policy_id)
+        if path is None or not path.exists():
+            return None
+        try:
+            entry = json.loads(path.read_text())
+            self._touch(policy_id)
+            return entry
+        except Exception as e:
+            logger.error(f"Failed to load cached policy {policy_id[:12]}: {str(e)}")
+            return None
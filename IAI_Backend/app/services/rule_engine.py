@@ -0,0 +1,163 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.core.config import POLICY_RULES_PATH
+from app.models.models import ReimbursementStatus
+from logger import logger
+
+# The invoice total: "Total: $42.50", "Grand total 1,200.00", "Amount due: USD 75"
+_TOTAL = re.compile(
+    r"\b(?:grand\s+total|total(?:\s+amount)?(?:\s+due)?|amount\s+due)\b\s*:?\s*"
+    r"(?:[$€£₹]|usd|eur|gbp|inr|rs\.?)?\s*(\d[\d,]*(?:\.\d{1,2})?)",
+    re.IGNORECASE
+)
+_OVER_CAP_OPTIONS = ("llm", "partial")
+
+
+class CategoryRule:
+    """Compiled rule for one expense category"""
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        keywords = spec.get("keywords") or []
+        if not keywords:
+            raise ValueError(f"Category '{name}' needs at least one keyword")
+        self.name = name
+        self.excluded = bool(spec.get("excluded", False))
+        self.cap = float(spec["cap"]) if spec.get("cap") is not None else None
+        self.over_cap = spec.get("over_cap", "llm")
+        if not self.excluded and self.cap is None:
+            raise ValueError(f"Category '{name}' needs a cap or excluded: true")
+        if self.over_cap not in _OVER_CAP_OPTIONS:
+            raise ValueError(f"Category '{name}': over_cap must be one of {_OVER_CAP_OPTIONS}")
+        self.reason = spec.get("reason")
+        self.pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(str(keyword).lower()) for keyword in keywords) + r")(?:s|es)?\b"
+        )
+
+
+class PolicyRuleEngine:
+    """
+    Local fast path for invoices the policy decides unambiguously
+
+    Built from a structured spec (YAML or JSON) of expense categories for
+    the policies it encodes:
+
+        policy_ids: [3f2a...]    # policy_id (PDF SHA-256) of each policy the spec mirrors
+        categories:
+          meals:
+            keywords: [meal, lunch, dinner, restaurant]
+            cap: 50              # Fully Reimbursed up to the cap
+            over_cap: partial    # reimburse the cap above it; "llm" (default) asks the LLM
+          alcohol:
+            keywords: [alcohol, wine, beer, liquor]
+            excluded: true       # always Declined
+
+    decide() returns an analysis only when the invoice has exactly one
+    total and matches exactly one category; anything else is ambiguous and
+    left to the LLM. Invoices analysed against any other policy never reach
+    the rules.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        spec = spec or {}
+        categories = spec.get("categories") or {}
+        if not categories:
+            raise ValueError("Policy rules need at least one category")
+        policy_ids = spec.get("policy_ids") or []
+        if not policy_ids:
+            raise ValueError("Policy rules need the policy_ids of the policies they encode")
+        self.policy_ids = {str(policy_id) for policy_id in policy_ids}
+        self.rules: List[CategoryRule] = [CategoryRule(name, rule) for name, rule in categories.items()]
+        # Changes whenever the spec does, so cached rule decisions never outlive an edit
+        self.fingerprint = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        self.decided = 0
+        self.ambiguous = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "PolicyRuleEngine":
+        text = Path(path).read_text(encoding="utf-8")
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return cls(yaml.safe_load(text))
+        return cls(json.loads(text))
+
+    def applies_to(self, policy_id: Optional[str]) -> bool:
+        """True when the spec encodes this policy"""
+        return policy_id in self.policy_ids
+
+    @staticmethod
+    def parse_total(invoice_text: str) -> Optional[float]:
+        """The invoice total, or None when there is none or several disagree"""
+        totals = {float(amount.replace(",", "")) for amount in _TOTAL.findall(invoice_text)}
+        return totals.pop() if len(totals) == 1 else None
+
+    def decide(self, invoice_text: str) -> Optional[Dict[str, Any]]:
+        """Analysis in the LLM's format, or None when the invoice needs the LLM"""
+        decision = self._decide(invoice_text)
+        if decision is None:
+            self.ambiguous += 1
+        else:
+            self.decided += 1
+        return decision
+
+    def _decide(self, invoice_text: str) -> Optional[Dict[str, Any]]:
+        total = self.parse_total(invoice_text)
+        if total is None:
+            return None
+        text = invoice_text.lower()
+        matched = [rule for rule in self.rules if rule.pattern.search(text)]
+        # Mixed invoices (e.g. a dinner with wine) may be partly reimbursable; that's a judgement call
+        if len(matched) != 1:
+            return None
+        rule = matched[0]
+
+        if rule.excluded:
+            return self._analysis(
+                ReimbursementStatus.DECLINED, 0.0, total,
+                rule.reason or f"{rule.name.title()} expenses are not reimbursable under the policy."
+            )
+        if total <= rule.cap:
+            return self._analysis(
+                ReimbursementStatus.FULLY_REIMBURSED, total, total,
+                rule.reason or f"{rule.name.title()} expense of {total:.2f} is within the policy cap of {rule.cap:.2f}."
+            )
+        if rule.over_cap == "partial":
+            return self._analysis(
+                ReimbursementStatus.PARTIALLY_REIMBURSED, rule.cap, total,
+                f"{rule.name.title()} expense of {total:.2f} exceeds the policy cap; {rule.cap:.2f} is reimbursed."
+            )
+        return None
+
+    @staticmethod
+    def _analysis(status: str, approved_amount: float, total_amount: float, reason: str) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "reason": reason,
+            "approved_amount": approved_amount,
+            "total_amount": total_amount
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.decided + self.ambiguous
+        return {
+            "policies": len(self.policy_ids),
+            "categories": len(self.rules),
+            "decided": self.decided,
+            "sent_to_llm": self.ambiguous,
+            "decided_rate": round(self.decided / total, 3) if total else 0.0
+        }
+
+
+def load_rule_engine(path: str = POLICY_RULES_PATH) -> Optional[PolicyRuleEngine]:
+    """Rule engine from the configured spec, or None when none is configured or it can't be loaded"""
+    if not path:
+        return None
+    try:
+        engine = PolicyRuleEngine.from_file(path)
+        logger.info(f"Loaded {len(engine.rules)} policy rule categories from {path}")
+        return engine
+    except Exception as e:
+        logger.error(f"Failed to load policy rules from {path}, every invoice goes to the LLM: {str(e)}")
+        return None
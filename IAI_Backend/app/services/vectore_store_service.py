@@ -1,26 +1,72 @@
+import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set, Tuple
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from app.core.config import (
+    CHROMA_PERSIST_DIR,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CHUNK_WORDS,
+    EMBEDDING_CHUNK_OVERLAP_WORDS,
+    POLICY_CLAUSE_WORDS,
+    POLICY_CLAUSE_OVERLAP_WORDS,
+    AMOUNT_FILTER_TOLERANCE,
+    SEARCH_MAX_CANDIDATES,
+    RRF_K,
+)
+from app.utils.utils import chunk_words, parse_date_filter
+from app.services.invoice_index import InvoiceIndex
+from app.services.lexical_index import LexicalIndex
+from app.services.embedding_backend import EmbeddingBackend, get_embedding_backend
 from logger import logger
 from dateutil import parser as date_parser
 
 class VectorStoreService:
     """Service for vector database operations using ChromaDB"""
     
-    def __init__(self):
-        self.client = chromadb.Client(Settings(anonymized_telemetry=False))
+    def __init__(self,
+                 persist_dir: str = CHROMA_PERSIST_DIR,
+                 invoice_index: Optional[InvoiceIndex] = None,
+                 lexical_index: Optional[LexicalIndex] = None,
+                 embedding_model: Optional[EmbeddingBackend] = None):
+        self.invoice_index = invoice_index
+        self.lexical_index = lexical_index
+        # Incremented whenever invoices are stored, so caches of answers over the data can tell they are stale
+        self.data_version = 0
+        self._data_version_lock = threading.Lock()
+        self.client = chromadb.PersistentClient(
+            path=persist_dir,
+            settings=Settings(anonymized_telemetry=False)
+        )
         
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Shared per process and loaded on first encode, not here
+        self.embedding_model = embedding_model or get_embedding_backend()
         
+        self.collection = self.client.get_or_create_collection(
+            name="invoice_reimbursements",
+            metadata={"description": "Invoice reimbursement analysis storage"}
+        )
+        self.policy_collection = self.client.get_or_create_collection(
+            name="policy_clauses",
+            metadata={"description": "Reimbursement policy clauses, embedded once per policy"}
+        )
         try:
-            self.collection = self.client.get_collection("invoice_reimbursements")
-        except Exception:
-            self.collection = self.client.create_collection(
-                name="invoice_reimbursements",
-                metadata={"description": "Invoice reimbursement analysis storage"}
-            )
+            self._backfill_numeric_dates()
+        except Exception as e:
+            logger.error(f"Error backfilling numeric date fields: {str(e)}")
+        try:
+            self._backfill_invoice_index()
+        except Exception as e:
+            logger.error(f"Error backfilling invoice index: {str(e)}")
+        try:
+            self._backfill_lexical_index()
+        except Exception as e:
+            logger.error(f"Error backfilling lexical index: {str(e)}")
+        # Normalised employee names seen in stored metadata, loaded on first use
+        self._employee_names: Optional[Set[str]] = None
+        self._employee_names_lock = threading.Lock()
+        logger.info(f"Vector store ready at {persist_dir} with {self.collection.count()} stored embedding(s)")
     
     def store_invoice_analysis(self, 
                              invoice_id: str,
@@ -29,115 +75,533 @@ class VectorStoreService:
                              employee_name: str) -> bool:
         """Store invoice analysis in vector database"""
         
+        return self.store_invoice_analyses_bulk([{
+            "invoice_id": invoice_id,
+            "invoice_text": invoice_text,
+            "analysis_result": analysis_result,
+            "employee_name": employee_name
+        }])[0]
+
+    def store_invoice_analyses_bulk(self,
+                                    records: List[Dict[str, Any]],
+                                    batch_size: int = EMBEDDING_BATCH_SIZE,
+                                    job_id: Optional[str] = None) -> List[bool]:
+        """
+        Store many invoice analyses, encoding and writing them in batches
+
+        Args:
+            records: Dicts with invoice_id, invoice_text, analysis_result and employee_name
+            batch_size: Number of invoices per encode call and per collection.add
+            job_id: Analysis job the records came from, recorded in the invoice index
+
+        Each invoice is embedded as one or more overlapping chunks (see
+        EMBEDDING_CHUNK_WORDS). The first chunk's ID is the invoice ID and
+        every chunk carries the invoice's metadata, so searches can collapse
+        chunk hits back to invoices.
+
+        Returns:
+            One success flag per input record, in input order
+        """
+
+        results = [False] * len(records)
+        prepared = []
+        seen_ids = set()
+        for index, record in enumerate(records):
+            try:
+                if record["invoice_id"] in seen_ids:
+                    raise ValueError(f"Duplicate invoice ID {record['invoice_id']} in batch")
+                seen_ids.add(record["invoice_id"])
+                document, metadata = self._prepare_invoice_document(**record)
+                chunks = self._chunk_invoice_document(record["invoice_text"], record["analysis_result"], metadata)
+                prepared.append((index, document, metadata, chunks))
+            except Exception as e:
+                logger.error(f"Error storing invoice analysis: {str(e)}")
+
+        batch_size = max(1, batch_size)
+        for start in range(0, len(prepared), batch_size):
+            batch = prepared[start:start + batch_size]
+            try:
+                documents = [document for _, document, _, _ in batch]
+                metadatas = [metadata for _, _, metadata, _ in batch]
+                chunks = [chunk for _, _, _, invoice_chunks in batch for chunk in invoice_chunks]
+                chunk_texts = [chunk_text for _, chunk_text, _ in chunks]
+
+                # Generate embeddings
+                embeddings = self.embedding_model.encode(chunk_texts, batch_size=batch_size).tolist()
+
+                # Store in vector database
+                self.collection.add(
+                    documents=chunk_texts,
+                    embeddings=embeddings,
+                    metadatas=[chunk_metadata for _, _, chunk_metadata in chunks],
+                    ids=[chunk_id for chunk_id, _, _ in chunks]
+                )
+                for index, _, metadata, _ in batch:
+                    results[index] = True
+                    self._remember_employee(metadata["employee_name"])
+                    logger.info(f"Metadata for invoice {metadata['invoice_id']}: {metadata}")
+                logger.info(f"Stored {len(batch)} invoice analyses as {len(chunks)} embedded chunk(s)")
+                self._index_metadatas(metadatas, job_id)
+                self._index_documents(metadatas, documents)
+                with self._data_version_lock:
+                    self.data_version += 1
+
+            except Exception as e:
+                logger.error(f"Error storing invoice analysis batch: {str(e)}")
+
+        return results
+
+    async def store_invoice_analyses_bulk_async(self,
+                                                records: List[Dict[str, Any]],
+                                                batch_size: int = EMBEDDING_BATCH_SIZE,
+                                                job_id: Optional[str] = None) -> List[bool]:
+        """Run store_invoice_analyses_bulk in a worker thread so embedding does not block the event loop"""
+        return await asyncio.to_thread(self.store_invoice_analyses_bulk, records, batch_size, job_id)
+
+    def _index_documents(self, metadatas: List[Dict[str, Any]], documents: List[str]):
+        """Add stored documents to the BM25 keyword index"""
+        if self.lexical_index is None:
+            return
         try:
-            # Prepare text for embedding
-            text_for_embedding = f"""
+            self.lexical_index.upsert_many(
+                (metadata["invoice_id"], document) for metadata, document in zip(metadatas, documents)
+            )
+        except Exception as e:
+            logger.error(f"Error updating lexical index: {str(e)}")
+
+    def _index_metadatas(self, metadatas: List[Dict[str, Any]], job_id: Optional[str] = None):
+        """Mirror stored metadata into the relational invoice index"""
+        if self.invoice_index is None:
+            return
+        try:
+            self.invoice_index.upsert_many(metadatas, job_id)
+        except Exception as e:
+            logger.error(f"Error updating invoice index: {str(e)}")
+
+    def get_existing_invoice_ids(self, invoice_ids: List[str]) -> Set[str]:
+        """Subset of the given invoice IDs that are already stored"""
+        if not invoice_ids:
+            return set()
+        try:
+            return set(self.collection.get(ids=invoice_ids, include=[])["ids"])
+        except Exception as e:
+            logger.error(f"Error looking up stored invoices: {str(e)}")
+            return set()
+
+    def count_invoices(self) -> int:
+        """Number of stored invoices; the collection itself holds one entry per chunk"""
+        if self.invoice_index is not None:
+            return self.invoice_index.count()
+        # Records stored before chunking have no chunk_index, so count distinct invoices instead
+        stored = self.collection.get(include=["metadatas"])
+        return len({
+            (metadata or {}).get("invoice_id") or record_id
+            for record_id, metadata in zip(stored["ids"], stored["metadatas"] or [])
+        })
+
+    def get_employee_names(self) -> Set[str]:
+        """Normalised names of every employee with a stored invoice"""
+        with self._employee_names_lock:
+            if self._employee_names is None:
+                try:
+                    metadatas = self.collection.get(include=["metadatas"])["metadatas"] or []
+                    self._employee_names = {
+                        metadata["employee_name"] for metadata in metadatas if metadata.get("employee_name")
+                    }
+                except Exception as e:
+                    logger.error(f"Error loading employee names: {str(e)}")
+                    return set()
+            return set(self._employee_names)
+
+    def _remember_employee(self, employee_name: str):
+        with self._employee_names_lock:
+            if self._employee_names is not None:
+                self._employee_names.add(employee_name)
+
+    def _prepare_invoice_document(self,
+                                  invoice_id: str,
+                                  invoice_text: str,
+                                  analysis_result: Dict[str, Any],
+                                  employee_name: str) -> Tuple[str, Dict[str, Any]]:
+        """Build the text to embed and the metadata for one invoice analysis"""
+
+        # Prepare text for embedding
+        text_for_embedding = f"""
             Employee: {employee_name}
             Status: {analysis_result['status']}
             Reason: {analysis_result['reason']}
             Invoice Content: {invoice_text}
             """
-            
-            # Generate embedding
-            embedding = self.embedding_model.encode(text_for_embedding).tolist()
-            # Prepare metadata
-            metadata = {
-                "employee_name": employee_name,
-                "status": analysis_result['status'],
-                "approved_amount": analysis_result.get('approved_amount', 0.0),
-                "total_amount": analysis_result.get('total_amount', 0.0),
-                "date": datetime.now().isoformat(),
-                "invoice_id": invoice_id
-            }
-            
-            # Store in vector database
-            self.collection.add(
-                documents=[text_for_embedding],
-                embeddings=[embedding],
-                metadatas=[metadata],
-                ids=[invoice_id]
+
+        # Prepare metadata
+        processed_at = datetime.now()
+        metadata = {
+            "employee_name": employee_name,
+            "status": analysis_result['status'],
+            "approved_amount": analysis_result.get('approved_amount', 0.0),
+            "total_amount": analysis_result.get('total_amount', 0.0),
+            "date": processed_at.isoformat(),
+            "invoice_id": invoice_id,
+            **self._numeric_date_fields(processed_at)
+        }
+        return text_for_embedding, metadata
+
+    @staticmethod
+    def _chunk_invoice_document(invoice_text: str,
+                                analysis_result: Dict[str, Any],
+                                metadata: Dict[str, Any],
+                                chunk_size: int = EMBEDDING_CHUNK_WORDS,
+                                overlap: int = EMBEDDING_CHUNK_OVERLAP_WORDS) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Split one invoice into (chunk_id, text_to_embed, metadata) triples, repeating the analysis header in each"""
+        invoice_id = metadata["invoice_id"]
+        if chunk_size <= 0:
+            windows = [invoice_text]
+        else:
+            windows = chunk_words(invoice_text, chunk_size, overlap)
+
+        chunks = []
+        for chunk_index, window in enumerate(windows):
+            text_for_embedding = f"""
+            Employee: {metadata['employee_name']}
+            Status: {analysis_result['status']}
+            Reason: {analysis_result['reason']}
+            Invoice Content: {window}
+            """
+            # The first chunk keeps the bare invoice ID so lookups by invoice ID still work
+            chunk_id = invoice_id if chunk_index == 0 else f"{invoice_id}#chunk{chunk_index}"
+            chunks.append((chunk_id, text_for_embedding, {
+                **metadata, "chunk_index": chunk_index, "chunk_count": len(windows)
+            }))
+        return chunks
+
+    @staticmethod
+    def _numeric_date_fields(date: datetime) -> Dict[str, Any]:
+        """Numeric copies of the date that Chroma where clauses can compare"""
+        return {
+            "date_epoch": date.timestamp(),
+            "year_month": date.year * 100 + date.month,
+            "date_day": date.year * 10000 + date.month * 100 + date.day
+        }
+
+    def _iter_stored(self, include: List[str], page_size: int = 1000):
+        """Yield collection.get pages covering every stored invoice"""
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page
+            offset += page_size
+
+    def _backfill_numeric_dates(self):
+        """Add numeric date fields to invoices stored before they existed, once per collection"""
+        if (self.collection.metadata or {}).get("numeric_dates"):
+            return
+        updated = 0
+        for page in self._iter_stored(["metadatas"]):
+            ids, metadatas = [], []
+            for invoice_id, metadata in zip(page["ids"], page["metadatas"]):
+                if "year_month" in metadata:
+                    continue
+                try:
+                    date = date_parser.parse(metadata.get("date"))
+                except Exception:
+                    continue
+                ids.append(invoice_id)
+                metadatas.append({**metadata, **self._numeric_date_fields(date)})
+            if ids:
+                self.collection.update(ids=ids, metadatas=metadatas)
+                updated += len(ids)
+        # hnsw:* settings can't be passed back through modify
+        collection_metadata = {
+            key: value for key, value in (self.collection.metadata or {}).items() if not key.startswith("hnsw:")
+        }
+        self.collection.modify(metadata={**collection_metadata, "numeric_dates": True})
+        if updated:
+            logger.info(f"Added numeric date fields to {updated} stored invoice(s)")
+
+    def _backfill_invoice_index(self):
+        """Populate an empty invoice index from invoices already in the vector store"""
+        if self.invoice_index is None or self.invoice_index.count() or not self.collection.count():
+            return
+        for page in self._iter_stored(["metadatas"]):
+            self.invoice_index.upsert_many(page["metadatas"])
+        logger.info(f"Indexed {self.invoice_index.count()} stored invoice(s) for aggregate queries")
+
+    def _backfill_lexical_index(self):
+        """Populate an empty lexical index from documents already in the vector store"""
+        if self.lexical_index is None or self.lexical_index.count() or not self.collection.count():
+            return
+        # Chunks of one invoice may span pages, so hold each invoice until all its chunks are seen
+        pending: Dict[str, Tuple[Dict[str, Any], Dict[int, str]]] = {}
+        for page in self._iter_stored(["metadatas", "documents"]):
+            complete = []
+            for metadata, document in zip(page["metadatas"], page["documents"]):
+                entry = pending.setdefault(metadata["invoice_id"], (metadata, {}))
+                entry[1][metadata.get("chunk_index", 0)] = document
+                if len(entry[1]) >= metadata.get("chunk_count", 1):
+                    complete.append(metadata["invoice_id"])
+            self._index_documents(
+                [pending[invoice_id][0] for invoice_id in complete],
+                ["\n".join(chunks[index] for index in sorted(chunks))
+                 for chunks in (pending.pop(invoice_id)[1] for invoice_id in complete)]
             )
-            logger.info(f"Metadata for invoice {invoice_id}: {metadata}")
-            logger.info(f"Stored invoice analysis for {invoice_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error storing invoice analysis: {str(e)}")
-            return False
+        # Anything left lost a chunk somewhere; index what there is
+        self._index_documents(
+            [metadata for metadata, _ in pending.values()],
+            ["\n".join(chunks[index] for index in sorted(chunks)) for _, chunks in pending.values()]
+        )
+        logger.info(f"Indexed {self.lexical_index.count()} stored invoice(s) for keyword search")
     
     def search_invoices(self, query: str, filters: Dict = None, limit: int = 10) -> List[Dict]:
-        """Search invoices using vector similarity and metadata filters"""
+        """
+        Search invoices using vector similarity and metadata filters
+
+        Returns at most one result per invoice, its best-matching chunk.
+        Exact-match, amount (within AMOUNT_FILTER_TOLERANCE) and date filters
+        are all pushed into the Chroma where clause, so the top `limit` hits
+        already satisfy them. Results are re-checked in Python and, if that
+        drops any, the query is retried with a larger n_results up to
+        SEARCH_MAX_CANDIDATES. With a lexical index, the top BM25 matches
+        passing the same filters are fused with the vector hits by reciprocal
+        rank fusion.
+        """
         
         try:
             query_embedding = self.embedding_model.encode(query).tolist()
 
-            where_clause = {}
-            amount_fuzzy = None
-            date_fuzzy = None
-
-            if filters:
-                for key, value in filters.items():
-                    if not value:
-                        continue
-
-                    if key == "amount":
-                        amount_fuzzy = float(value)  # handle fuzzy later
-                    elif key == "date":
-                        try:
-                            if isinstance(value, str) and len(value.split()) == 2:
-                                # e.g., "May 2024"
-                                parsed_date = date_parser.parse(value)
-                                date_fuzzy = parsed_date
-                            else:
-                                # exact format
-                                date_fuzzy = date_parser.parse(value)
-                        except Exception as e:
-                            logger.warning(f"Invalid date format in filter: {value}")
-                    else:
-                        where_clause[key] = value
+            conditions, amount_fuzzy, date_filter = self._split_filters(filters)
+            where_clause = self._build_where(conditions)
 
-            # Vector search with basic where_clause (employee, status, etc.)
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                where=where_clause if where_clause else None,
-                n_results=limit
-            )
+            # Long invoices have several chunks, so ask for more hits than invoices needed
+            n_results = limit * 2
+            while True:
+                results = self._format_results(self.collection.query(
+                    query_embeddings=[query_embedding],
+                    where=where_clause,
+                    n_results=n_results
+                ))
+                formatted_results = self._collapse_chunks([
+                    result for result in results
+                    if self._matches_fuzzy(result["metadata"], amount_fuzzy, date_filter)
+                ])
+                # Stop once we have enough, the index has nothing more, or the cap is reached
+                if len(formatted_results) >= limit or len(results) < n_results or n_results >= SEARCH_MAX_CANDIDATES:
+                    break
+                n_results = min(n_results * 4, SEARCH_MAX_CANDIDATES)
+            formatted_results = formatted_results[:limit]
 
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-
-                    # Fuzzy amount filtering
-                    if amount_fuzzy is not None:
-                        db_amount = float(metadata.get('total_amount', 0.0))
-                        if not (amount_fuzzy - 20 <= db_amount <= amount_fuzzy + 20):
-                            continue  # skip if outside fuzzy range
-
-                    # Fuzzy date filtering
-                    if date_fuzzy:
-                        try:
-                            db_date = date_parser.parse(metadata.get('date'))
-                            if isinstance(date_fuzzy, datetime):
-                                # Check if same month and year
-                                if (db_date.year != date_fuzzy.year or db_date.month != date_fuzzy.month):
-                                    continue
-                            else:
-                                # strict match
-                                if db_date.date() != date_fuzzy.date():
-                                    continue
-                        except Exception:
-                            continue  # Skip if date parsing fails
-
-                    formatted_results.append({
-                        "document": doc,
-                        "metadata": metadata,
-                        "distance": results['distances'][0][i] if results['distances'] else 0.0
-                    })
+            if self.lexical_index is not None:
+                lexical_results = self._lexical_results(query, limit, filters)
+                formatted_results = self._reciprocal_rank_fusion([formatted_results, lexical_results], limit)
             
             logger.info(f"Found {len(formatted_results)} results for query: {query}")
             return formatted_results
             
         except Exception as e:
             logger.error(f"Error searching invoices: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    async def search_invoices_async(self, query: str, filters: Dict = None, limit: int = 10) -> List[Dict]:
+        """Run search_invoices in a worker thread so embedding does not block the event loop"""
+        return await asyncio.to_thread(self.search_invoices, query, filters, limit)
+
+    def retrieve_candidates(self, query: str, limit: int) -> List[Dict]:
+        """Unfiltered nearest neighbours for a query, for filtering later with filter_results"""
+        try:
+            query_embedding = self.embedding_model.encode(query).tolist()
+            results = self._collapse_chunks(self._format_results(self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=limit
+            )))
+            if self.lexical_index is not None:
+                results = self._reciprocal_rank_fusion([results, self._lexical_results(query, limit)], limit)
+            return results
+        except Exception as e:
+            logger.error(f"Error retrieving invoice candidates: {str(e)}")
+            return []
+
+    async def retrieve_candidates_async(self, query: str, limit: int) -> List[Dict]:
+        """Run retrieve_candidates in a worker thread so embedding does not block the event loop"""
+        return await asyncio.to_thread(self.retrieve_candidates, query, limit)
+
+    def filter_results(self, results: List[Dict], filters: Dict = None) -> List[Dict]:
+        """Apply the same filters search_invoices uses to already retrieved results"""
+        conditions, amount_fuzzy, date_filter = self._split_filters(filters)
+        exact = {
+            key: value for condition in conditions for key, value in condition.items()
+            if not isinstance(value, dict)
+        }
+        return [
+            result for result in results
+            if all(result["metadata"].get(key) == value for key, value in exact.items())
+            and self._matches_fuzzy(result["metadata"], amount_fuzzy, date_filter)
+        ]
+
+    def index_policy(self,
+                     policy_id: str,
+                     policy_text: str,
+                     chunk_size: int = POLICY_CLAUSE_WORDS,
+                     overlap: int = POLICY_CLAUSE_OVERLAP_WORDS) -> int:
+        """
+        Chunk and embed a policy into the policy clause collection, once per policy_id
+
+        Returns:
+            Number of clauses stored for the policy
+        """
+        existing = self.policy_collection.get(where={"policy_id": policy_id}, include=[])["ids"]
+        if existing:
+            return len(existing)
+        clauses = chunk_words(policy_text, chunk_size, overlap)
+        embeddings = self.embedding_model.encode(clauses, batch_size=EMBEDDING_BATCH_SIZE).tolist()
+        # Upsert so two jobs indexing the same new policy at once write the same rows
+        self.policy_collection.upsert(
+            ids=[f"{policy_id}#{index}" for index in range(len(clauses))],
+            documents=clauses,
+            embeddings=embeddings,
+            metadatas=[{"policy_id": policy_id, "clause_index": index} for index in range(len(clauses))]
+        )
+        logger.info(f"Indexed policy {policy_id[:12]} as {len(clauses)} clause(s)")
+        return len(clauses)
+
+    def retrieve_policy_clauses(self, policy_id: str, text: str, limit: int) -> List[Tuple[int, str]]:
+        """
+        Policy clauses most similar to the text (e.g. an invoice)
+
+        Returns:
+            (clause_index, clause) pairs in policy order, so excerpts read as in the document
+        """
+        query_embedding = self.embedding_model.encode(text).tolist()
+        results = self.policy_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=limit,
+            where={"policy_id": policy_id}
+        )
+        return sorted(
+            (metadata["clause_index"], document)
+            for metadata, document in zip(results["metadatas"][0], results["documents"][0])
+        )
+
+    @staticmethod
+    def _split_filters(filters: Dict = None) -> Tuple[List[Dict[str, Any]], Optional[float], Optional[Tuple[str, int]]]:
+        """
+        Translate chatbot filters into Chroma where conditions
+
+        Returns:
+            Tuple of (where conditions, fuzzy amount, (numeric date field, value))
+        """
+        conditions = []
+        amount_fuzzy = None
+        date_filter = None
+
+        if filters:
+            for key, value in filters.items():
+                if not value:
+                    continue
+
+                if key == "amount":
+                    amount_fuzzy = float(value)
+                    conditions.append({"total_amount": {"$gte": amount_fuzzy - AMOUNT_FILTER_TOLERANCE}})
+                    conditions.append({"total_amount": {"$lte": amount_fuzzy + AMOUNT_FILTER_TOLERANCE}})
+                elif key == "date":
+                    date_filter = parse_date_filter(value)
+                    if date_filter:
+                        conditions.append({date_filter[0]: date_filter[1]})
+                    else:
+                        logger.warning(f"Invalid date format in filter: {value}")
+                else:
+                    conditions.append({key: value})
+        return conditions, amount_fuzzy, date_filter
+
+    @staticmethod
+    def _build_where(conditions: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Chroma accepts one condition per where clause; several must be combined with $and"""
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    @staticmethod
+    def _matches_fuzzy(metadata: Dict[str, Any], amount_fuzzy: Optional[float], date_filter: Optional[Tuple[str, int]]) -> bool:
+        # Fuzzy amount filtering
+        if amount_fuzzy is not None:
+            db_amount = float(metadata.get('total_amount', 0.0))
+            if not (amount_fuzzy - AMOUNT_FILTER_TOLERANCE <= db_amount <= amount_fuzzy + AMOUNT_FILTER_TOLERANCE):
+                return False  # skip if outside fuzzy range
+
+        # Date filtering on the numeric fields written at store time
+        if date_filter:
+            field, value = date_filter
+            if metadata.get(field) != value:
+                return False
+        return True
+
+    def _lexical_results(self, query: str, limit: int, filters: Dict = None) -> List[Dict]:
+        """
+        Top BM25 matches that satisfy the filters, best first, in the same shape as vector results
+
+        With an invoice index the keyword search only ranks invoices matching
+        the filters. Matches are re-checked against the store and, like the
+        vector search, the ranking is read further (up to
+        SEARCH_MAX_CANDIDATES) while the re-check leaves fewer than `limit`.
+        """
+        conditions, amount_fuzzy, date_filter = self._split_filters(filters)
+        where_clause = self._build_where(conditions)
+        scope = None
+        if where_clause is not None and self.invoice_index is not None:
+            scope = self.invoice_index.matching_ids(filters)
+        n_results = limit
+        while True:
+            ranked_ids = [invoice_id for invoice_id, _ in self.lexical_index.search(query, n_results, scope)]
+            if not ranked_ids:
+                return []
+            found = self.collection.get(ids=ranked_ids, where=where_clause, include=["documents", "metadatas"])
+            by_id = {
+                invoice_id: {"document": document, "metadata": metadata, "distance": None}
+                for invoice_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+                if self._matches_fuzzy(metadata, amount_fuzzy, date_filter)
+            }
+            results = [by_id[invoice_id] for invoice_id in ranked_ids if invoice_id in by_id]
+            if len(results) >= limit or len(ranked_ids) < n_results or n_results >= SEARCH_MAX_CANDIDATES:
+                return results[:limit]
+            n_results = min(n_results * 4, SEARCH_MAX_CANDIDATES)
+
+    @staticmethod
+    def _collapse_chunks(results: List[Dict]) -> List[Dict]:
+        """Keep only the best-ranked chunk of each invoice, preserving order"""
+        seen = set()
+        collapsed = []
+        for result in results:
+            invoice_id = result["metadata"].get("invoice_id")
+            if invoice_id in seen:
+                continue
+            seen.add(invoice_id)
+            collapsed.append(result)
+        return collapsed
+
+    @staticmethod
+    def _reciprocal_rank_fusion(rankings: List[List[Dict]], limit: int, k: int = RRF_K) -> List[Dict]:
+        """Merge ranked result lists, scoring each invoice by the sum of 1 / (k + rank) over the lists"""
+        scores: Dict[str, float] = {}
+        fused: Dict[str, Dict] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, start=1):
+                invoice_id = result["metadata"]["invoice_id"]
+                scores[invoice_id] = scores.get(invoice_id, 0.0) + 1.0 / (k + rank)
+                # Keep the vector hit when both lists have the invoice, so its distance survives
+                fused.setdefault(invoice_id, result)
+        ordered = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [{**fused[invoice_id], "score": scores[invoice_id]} for invoice_id in ordered]
+
+    @staticmethod
+    def _format_results(results: Dict[str, Any]) -> List[Dict]:
+        formatted_results = []
+        if results['documents'] and results['documents'][0]:
+            for i, doc in enumerate(results['documents'][0]):
+                formatted_results.append({
+                    "document": doc,
+                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                    "distance": results['distances'][0][i] if results['distances'] else 0.0
+                })
+        return formatted_results
@@ -1,4 +1,6 @@
 import re
+from typing import List, Optional, Tuple
+from dateutil import parser as date_parser
 
 def clean_extracted_text(text: str) -> str:
     # Remove excessive whitespace
@@ -7,3 +9,52 @@ def clean_extracted_text(text: str) -> str:
     text = re.sub(r'\n+', '\n', text)
     # Optional: replace newline with space to keep policy one-liners
     return text.strip()
+
+
+def chunk_words(text: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """
+    Split text into windows of at most chunk_size words, each sharing `overlap` words with the previous one
+
+    Always returns at least one chunk, which is empty for empty text.
+    """
+    words = text.split()
+    chunk_size = max(1, chunk_size)
+    step = max(1, chunk_size - max(0, overlap))
+    chunks = []
+    for start in range(0, max(len(words), 1), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+def parse_date_filter(value: str) -> Optional[Tuple[str, int]]:
+    """
+    Translate a chatbot date filter into a numeric invoice metadata field and value
+
+    "May 2024" style values match on year_month (YYYYMM); exact dates match
+    on date_day (YYYYMMDD). Returns None when the value can't be parsed.
+    """
+    try:
+        parsed_date = date_parser.parse(value)
+    except (ValueError, OverflowError, TypeError):
+        return None
+    if isinstance(value, str) and len(value.split()) == 2:
+        return "year_month", parsed_date.year * 100 + parsed_date.month
+    return "date_day", parsed_date.year * 10000 + parsed_date.month * 100 + parsed_date.day
+
+
+def get_memory_usage_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Fall back to peak RSS where /proc is unavailable (KB on Linux, bytes on macOS)
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,110 @@
+"""
+Chatbot answer-cache hit rate and latency on a replayed query log
+
+Replays benchmarks/data/query_log.json against POST /chatbot: sessions that
+repeat or reword each other's questions, follow-ups that lean on history
+and so must not be served from the cache, and an ingest midway that has to
+invalidate cached answers. Each run uses a fresh interpreter and store:
+once with CHATBOT_ANSWER_CACHE_SIZE=0, once with the cache on. With the
+default hash embedding only near-verbatim rewordings are close enough to
+hit; run with EMBEDDING_BACKEND=onnx for real paraphrase behaviour.
+
+    python -m benchmarks.answer_cache [--llm-latency 0.8] [--log benchmarks/data/query_log.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+
+from benchmarks.common import configure_offline, make_pdf, sample_invoice_lines
+
+LOG_PATH = os.path.join(os.path.dirname(__file__), "data", "query_log.json")
+
+
+def build_archive(start: int, count: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for index in range(start, start + count):
+            archive.writestr(f"invoices/inv{index}.pdf", make_pdf(sample_invoice_lines(index)))
+    return buffer.getvalue()
+
+
+async def replay(log):
+    import httpx
+    from app.api.deps import get_answer_cache
+    from main import app
+
+    policy_pdf = make_pdf(["Meals are reimbursable up to $50.", "Alcohol is not reimbursable."])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def ingest(start: int, count: int):
+            response = await client.post(
+                "/api/v1/analyze-invoices/analyze-invoices",
+                data={"employee_name": "Bench User"},
+                files={"policy_file": ("policy.pdf", policy_pdf, "application/pdf"),
+                       "invoices_zip": ("invoices.zip", build_archive(start, count), "application/zip")}
+            )
+            response.raise_for_status()
+
+        await ingest(0, 20)
+        stored = 20
+        sessions, latencies = {}, []
+        for entry in log:
+            if "ingest" in entry:
+                await ingest(stored, entry["ingest"])
+                stored += entry["ingest"]
+                continue
+            started = time.perf_counter()
+            response = await client.post("/api/v1/chatbot/chatbot", json={
+                "query": entry["query"], "session_id": sessions.get(entry["session"])
+            })
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            sessions[entry["session"]] = response.json()["session_id"]
+
+    answer_cache = get_answer_cache()
+    return latencies, answer_cache.get_stats() if answer_cache else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="fake LLM seconds per call")
+    parser.add_argument("--log", default=LOG_PATH)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    with open(args.log) as log_file:
+        log = json.load(log_file)["log"]
+
+    if args.worker:
+        configure_offline(llm_latency=args.llm_latency)
+        latencies, stats = asyncio.run(replay(log))
+        print(json.dumps({"latencies": latencies, "stats": stats}))
+        return
+
+    for label, cache_size in (("cache off", "0"), ("cache on", os.getenv("CHATBOT_ANSWER_CACHE_SIZE", "500"))):
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.answer_cache", "--worker",
+             "--llm-latency", str(args.llm_latency), "--log", args.log],
+            capture_output=True, text=True, env={**os.environ, "CHATBOT_ANSWER_CACHE_SIZE": cache_size}
+        )
+        if process.returncode != 0:
+            print(f"{label} failed: {process.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        latencies, stats = result["latencies"], result["stats"]
+        line = (f"{label:9}  {len(latencies)} queries  mean {statistics.mean(latencies) * 1000:6.0f} ms  "
+                f"p50 {statistics.median(latencies) * 1000:6.0f} ms  total {sum(latencies):5.1f} s")
+        if stats:
+            line += (f"  hit rate {stats['hit_rate']:.2f} ({stats['hits']}/{stats['hits'] + stats['misses']})  "
+                     f"{stats['invalidations']} invalidated")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Peak server memory while /analyze-invoices processes a large invoice ZIP
+
+Writes a ZIP of `--pdf-mb` PDFs padded with incompressible bytes up to
+`--archive-mb` on disk, starts the app under uvicorn in its own process,
+streams the archive to POST /analyze-invoices and reads the server's peak
+RSS (VmHWM) before and after, and the largest peak among its PDF
+extraction workers. Growth should stay near a few PDFs' worth,
+not the archive size. Exits non-zero if it exceeds `--max-growth-mb`.
+
+    python -m benchmarks.archive_memory [--archive-mb 200] [--pdf-mb 5] [--max-growth-mb 150]
+    python -m benchmarks.archive_memory --archive-mb 1024      # the 1 GB case
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from benchmarks.common import configure_offline, make_pdf, sample_invoice_lines
+
+
+def build_archive(path: str, archive_mb: int, pdf_mb: float) -> int:
+    """Write the ZIP and return its member count"""
+    members = max(1, int(archive_mb / pdf_mb))
+    # Stored, not deflated: the padding wouldn't compress anyway and the build stays fast
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for index in range(members):
+            archive.writestr(f"invoices/inv{index}.pdf",
+                             make_pdf(sample_invoice_lines(index), padding=int(pdf_mb * 2 ** 20)))
+    return members
+
+
+def memory_mb(pid: int):
+    """(current RSS, peak RSS) of a process in MB"""
+    with open(f"/proc/{pid}/status") as status:
+        fields = dict(line.split(":", 1) for line in status)
+    return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+
+
+def worker_peak_mb(pid: int) -> float:
+    """Largest peak RSS among a process's children, e.g. the PDF extraction pool"""
+    peaks = [0.0]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as children:
+            peaks.extend(memory_mb(int(child))[1] for child in children.read().split())
+    return max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--archive-mb", type=int, default=200)
+    parser.add_argument("--pdf-mb", type=float, default=5)
+    parser.add_argument("--max-growth-mb", type=float, default=150, help="fail above this peak RSS growth")
+    args = parser.parse_args()
+    workdir = configure_offline(llm_latency=0.0)
+
+    import httpx
+
+    archive_path = os.path.join(workdir, "invoices.zip")
+    started = time.perf_counter()
+    members = build_archive(archive_path, args.archive_mb, args.pdf_mb)
+    print(f"archive: {os.path.getsize(archive_path) / 2 ** 20:.0f} MB, {members} PDFs "
+          f"(built in {time.perf_counter() - started:.1f} s)")
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        # Spooled uploads go to the temp directory; keep them with the rest of the run's files
+        env={**os.environ, "TMPDIR": tempfile.mkdtemp(dir=workdir)}
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        with httpx.Client(base_url=base_url, timeout=3600) as client:
+            while True:
+                try:
+                    client.get("/health").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.2)
+            before, _ = memory_mb(server.pid)
+
+            policy_pdf = make_pdf(["Meals are reimbursable up to $50.", "Alcohol is not reimbursable."])
+            started = time.perf_counter()
+            with open(archive_path, "rb") as archive:
+                response = client.post(
+                    "/api/v1/analyze-invoices/analyze-invoices",
+                    data={"employee_name": "Bench User"},
+                    files={"policy_file": ("policy.pdf", policy_pdf, "application/pdf"),
+                           "invoices_zip": ("invoices.zip", archive, "application/zip")}
+                )
+            response.raise_for_status()
+            seconds = time.perf_counter() - started
+            _, peak = memory_mb(server.pid)
+            worker_peak = worker_peak_mb(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    growth = peak - before
+    print(f"{response.json()['message']} in {seconds:.1f} s")
+    print(f"server RSS before {before:.0f} MB, peak {peak:.0f} MB, growth {growth:.0f} MB; "
+          f"largest PDF worker peak {worker_peak:.0f} MB")
+    if growth > args.max_growth_mb:
+        print(f"FAIL: peak RSS grew by more than {args.max_growth_mb:.0f} MB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Invoice pipeline throughput against the number of invoices per LLM prompt (LLM_BATCH_SIZE)
+
+Runs `--invoices` synthetic invoice PDFs through InvoicePipeline once per
+batch size K. The fake model takes `--call-latency` seconds per call plus
+`--latency-per-1k-tokens` per thousand prompt tokens, so bigger prompts
+cost more, as with a hosted model. Reports LLM calls, prompt tokens, wall
+time, and how many decisions agree with K=1. Exits non-zero if any batch
+size disagrees.
+
+    python -m benchmarks.batch_size [--invoices 100] [--sizes 1,2,5,10,20] [--call-latency 0.5] [--latency-per-1k-tokens 0.1]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from benchmarks.common import configure_offline, make_pdf, sample_invoice_lines
+
+POLICY_TEXT = "Meals are reimbursable up to $50. Hotels up to $200 per night. Alcohol is not reimbursable."
+
+
+async def run(invoices: int, sizes, call_latency: float, latency_per_1k_tokens: float) -> bool:
+    from app.api.deps import get_vector_store
+    from app.services.invoice_pipeline import InvoicePipeline
+    from app.services.llm_backend import FakeBackend
+    from app.services.llm_service import LLMService
+
+    class PromptSizedBackend(FakeBackend):
+        """Fake model whose latency grows with the prompt"""
+
+        async def _generate(self, prompt: str):
+            await asyncio.sleep(call_latency + latency_per_1k_tokens * len(prompt) / 4000)
+            return await super()._generate(prompt)
+
+    files = [(f"inv{index}.pdf", make_pdf(sample_invoice_lines(index))) for index in range(invoices)]
+    reference = None
+    ok = True
+    for size in sizes:
+        llm_service = LLMService(use_context_cache=False, backend=PromptSizedBackend(latency=0.0))
+        pipeline = InvoicePipeline(llm_service, get_vector_store(), batch_size=size)
+        decisions = {}
+        started = time.perf_counter()
+        processed, errors = await pipeline.run(
+            [(name, lambda pdf=pdf: pdf) for name, pdf in files], POLICY_TEXT, f"Batch {size}",
+            progress_callback=lambda name, analysis, error: decisions.__setitem__(
+                name, analysis and (analysis["status"], analysis["approved_amount"]))
+        )
+        seconds = time.perf_counter() - started
+        usage = llm_service.get_usage_stats()
+        reference = reference or decisions
+        agree = sum(decisions.get(name) == decision for name, decision in reference.items())
+        ok = ok and agree == len(reference)
+        print(f"K={size:3d}  {processed}/{invoices} analysed  {usage['calls']:4d} LLM calls  "
+              f"{usage['prompt_tokens'] / invoices:7.0f} prompt tokens/invoice  {seconds:6.2f} s  "
+              f"{agree}/{len(reference)} agree with K={sizes[0]}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=100)
+    parser.add_argument("--sizes", default="1,2,5,10,20", help="comma-separated batch sizes; the first is the reference")
+    parser.add_argument("--call-latency", type=float, default=0.5, help="fake model seconds per call")
+    parser.add_argument("--latency-per-1k-tokens", type=float, default=0.1,
+                        help="extra fake model seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+    configure_offline(llm_latency=0.0)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if not asyncio.run(run(args.invoices, sizes, args.call_latency, args.latency_per_1k_tokens)):
+        print("FAIL: batched decisions differ from the reference batch size")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
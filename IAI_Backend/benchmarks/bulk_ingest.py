@@ -0,0 +1,69 @@
+"""
+Per-invoice vs batched ingest throughput of VectorStoreService
+
+Stores N synthetic invoice analyses one store_invoice_analysis call at a
+time, then with one store_invoice_analyses_bulk call, each into a fresh
+store. Embeddings are uncached so both paths encode every document.
+
+    python -m benchmarks.bulk_ingest [--sizes 10 100 1000] [--batch-size 64]
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.common import configure_offline, sample_invoice_lines
+
+
+def records(count: int):
+    return [
+        {
+            "invoice_id": f"bench_user_inv{index}",
+            "invoice_text": " ".join(sample_invoice_lines(index)),
+            "analysis_result": {"status": "Fully Reimbursed", "reason": "Within the meal cap",
+                                "approved_amount": 12.0, "total_amount": 12.0},
+            "employee_name": "bench_user",
+        }
+        for index in range(count)
+    ]
+
+
+def fresh_store(embedding_model):
+    from app.services.vectore_store_service import VectorStoreService
+    return VectorStoreService(tempfile.mkdtemp(prefix="iai_bench_chroma_"), embedding_model=embedding_model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--batch-size", type=int, default=None, help="defaults to EMBEDDING_BATCH_SIZE")
+    args = parser.parse_args()
+    configure_offline()
+
+    from app.core.config import EMBEDDING_BATCH_SIZE
+    from app.services.embedding_backend import create_embedding_backend
+    embedding_model = create_embedding_backend()
+    batch_size = args.batch_size or EMBEDDING_BATCH_SIZE
+    embedding_model.encode("warm up")
+
+    print(f"embedding backend {embedding_model.name}, batch size {batch_size}")
+    print(f"{'invoices':>8}  {'per-invoice':>14}  {'bulk':>14}  speed-up")
+    for size in args.sizes:
+        batch = records(size)
+
+        store = fresh_store(embedding_model)
+        started = time.perf_counter()
+        for record in batch:
+            store.store_invoice_analysis(**record)
+        per_invoice = time.perf_counter() - started
+
+        store = fresh_store(embedding_model)
+        started = time.perf_counter()
+        stored = store.store_invoice_analyses_bulk(batch, batch_size=batch_size)
+        bulk = time.perf_counter() - started
+        assert all(stored) and store.count_invoices() == size
+
+        print(f"{size:>8}  {size / per_invoice:>9.0f} inv/s  {size / bulk:>9.0f} inv/s  {per_invoice / bulk:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Chatbot latency while an invoice analysis runs on the same worker
+
+Seeds the store, measures chatbot latency on an idle app, then again while
+POST /analyze-invoices processes a ZIP of `--invoices` PDFs. With the LLM,
+PDF and embedding work off the event loop, p99 should stay close to idle.
+
+    python -m benchmarks.chatbot_latency [--invoices 200] [--queries 40] [--llm-latency 0.05]
+"""
+import argparse
+import asyncio
+import io
+import time
+import zipfile
+from typing import List
+
+from benchmarks.common import configure_offline, make_pdf, sample_invoice_lines, summarize_ms
+
+# Free-text questions with no list/aggregate intent, so each one goes through retrieval and the LLM
+QUERIES = [
+    "Why was the taxi ride for Bench User declined?",
+    "Explain the hotel room claims for Bench User",
+    "What was the dinner at the restaurant reimbursed for?",
+    "Why was the airline flight ticket only partially reimbursed?",
+]
+
+
+async def run(invoices: int, queries: int):
+    import httpx
+    from main import app
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for index in range(invoices):
+            archive.writestr(f"invoices/inv{index}.pdf", make_pdf(sample_invoice_lines(index)))
+    policy_pdf = make_pdf(["Meals are reimbursable up to $50.", "Alcohol is not reimbursable."])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def analyze(archive_bytes: bytes):
+            response = await client.post(
+                "/api/v1/analyze-invoices/analyze-invoices",
+                data={"employee_name": "Bench User"},
+                files={"policy_file": ("policy.pdf", policy_pdf, "application/pdf"),
+                       "invoices_zip": ("invoices.zip", archive_bytes, "application/zip")}
+            )
+            response.raise_for_status()
+            return response.json()
+
+        async def chat(count: int) -> List[float]:
+            latencies = []
+            for number in range(count):
+                # Distinct wording each time so the answer cache doesn't answer for us
+                query = f"{QUERIES[number % len(QUERIES)]} ({number})"
+                started = time.perf_counter()
+                response = await client.post("/api/v1/chatbot/chatbot", json={"query": query, "session_id": None})
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+            return latencies
+
+        seed = io.BytesIO()
+        with zipfile.ZipFile(seed, "w") as archive:
+            for index in range(20):
+                archive.writestr(f"seed/inv{index}.pdf", make_pdf(sample_invoice_lines(10_000 + index)))
+        await analyze(seed.getvalue())
+
+        idle = await chat(queries)
+        started = time.perf_counter()
+        analysis, busy = await asyncio.gather(analyze(buffer.getvalue()), chat(queries))
+        analysis_seconds = time.perf_counter() - started
+
+    print(f"idle chatbot:            {summarize_ms(idle)}")
+    print(f"during analysis:         {summarize_ms(busy)}")
+    print(f"analysis of {invoices} invoices: {analysis_seconds:.1f} s, {analysis['message']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM seconds per call")
+    args = parser.parse_args()
+    configure_offline(llm_latency=args.llm_latency, CHATBOT_ANSWER_CACHE_SIZE="0")
+    asyncio.run(run(args.invoices, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Index size, ingest time, query latency and tail recall against EMBEDDING_CHUNK_WORDS
+
+Each chunk size runs in a fresh interpreter with its own Chroma store. The
+corpus is `--invoices` invoices of `--words` words, each with unique
+reference codes about 80% of the way through. The embedding is word hashing
+that only reads the first `--truncate-words` words of a text, standing in
+for MiniLM's 256-token limit. Queries ask for the reference codes, so
+recall@10 shows whether text past the limit is searchable. Recall is given
+for search_invoices and for exact nearest neighbours over the stored
+vectors; the gap is what Chroma's approximate HNSW search loses.
+
+    python -m benchmarks.chunk_size [--sizes 0,300,150,75] [--invoices 2000] [--words 600] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import configure_offline, percentile
+
+FILLER = ("item quantity unit price subtotal tax service charge delivery fee description date vendor address "
+          "phone payment card cash receipt total amount currency hotel meal taxi flight").split()
+
+
+def detail(index: int) -> str:
+    """Words found in one invoice only, and the query that looks for them"""
+    return f"RC{index:05d} LOT{index:05d} SKU{index:05d}"
+
+
+def build_corpus(invoices: int, words: int):
+    rng = random.Random(1)
+    records = []
+    for index in range(invoices):
+        body = [rng.choice(FILLER) for _ in range(words)]
+        body[int(words * 0.8)] = detail(index)
+        records.append({
+            "invoice_id": f"bench_inv_{index}",
+            "invoice_text": " ".join(body),
+            "analysis_result": {"status": "Declined", "reason": "Benchmark record",
+                                "approved_amount": 0.0, "total_amount": 1.0},
+            "employee_name": f"emp_{index % 20}",
+        })
+    return records
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 2 ** 20
+
+
+def worker(args):
+    workdir = configure_offline()
+    from app.services.embedding_backend import HashEmbeddingBackend
+    from app.services.vectore_store_service import VectorStoreService
+
+    class TruncatingHashEmbedding(HashEmbeddingBackend):
+        """Hash embeddings that ignore everything past the model's input limit"""
+
+        def _encode(self, model, texts, batch_size):
+            return super()._encode(model, [" ".join(text.split()[:args.truncate_words]) for text in texts], batch_size)
+
+    embedding_model = TruncatingHashEmbedding()
+    vector_store = VectorStoreService(embedding_model=embedding_model)
+    started = time.perf_counter()
+    vector_store.store_invoice_analyses_bulk(build_corpus(args.invoices, args.words))
+    store_seconds = time.perf_counter() - started
+
+    # Every stored vector, for exact nearest neighbours next to Chroma's approximate ones
+    embeddings, owners = [], []
+    for page in vector_store._iter_stored(["embeddings", "metadatas"]):
+        embeddings.extend(page["embeddings"])
+        owners.extend(metadata["invoice_id"] for metadata in page["metadatas"])
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    rng = random.Random(2)
+    hits, exact_hits, latencies = 0, 0, []
+    for index in rng.sample(range(args.invoices), min(args.queries, args.invoices)):
+        expected = f"bench_inv_{index}"
+        started = time.perf_counter()
+        results = vector_store.search_invoices(detail(index), None, 10)
+        latencies.append(time.perf_counter() - started)
+        hits += any(result["metadata"]["invoice_id"] == expected for result in results)
+        ranked = []
+        for row in np.argsort(-(embeddings @ embedding_model.encode(detail(index)))):
+            if owners[row] not in ranked:
+                ranked.append(owners[row])
+                if len(ranked) == 10:
+                    break
+        exact_hits += expected in ranked
+    print(json.dumps({
+        "embeddings": vector_store.collection.count(),
+        "index_mb": directory_mb(os.path.join(workdir, "chroma_db")),
+        "store_s": store_seconds,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "recall": hits / len(latencies),
+        "exact_recall": exact_hits / len(latencies),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="0,300,150,75", help="comma-separated chunk sizes in words; 0 is unchunked")
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--truncate-words", type=int, default=200, help="words the stand-in embedding reads")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    for size in args.sizes.split(","):
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.chunk_size", "--worker", "--invoices", str(args.invoices),
+             "--words", str(args.words), "--queries", str(args.queries), "--truncate-words", str(args.truncate_words)],
+            capture_output=True, text=True, env={**os.environ, "EMBEDDING_CHUNK_WORDS": size}
+        )
+        if process.returncode != 0:
+            print(f"chunk {size:>4} words failed: {process.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        print(f"chunk {'off' if size == '0' else size:>4} words  {result['embeddings']:6d} embeddings  "
+              f"{result['index_mb']:6.1f} MB  store {result['store_s']:5.1f} s  "
+              f"query p50 {result['p50_ms']:5.1f} ms  p95 {result['p95_ms']:5.1f} ms  "
+              f"tail recall@10 {result['recall']:.2f} (exact search {result['exact_recall']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
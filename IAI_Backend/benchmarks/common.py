@@ -0,0 +1,105 @@
+"""
+Shared setup for the benchmark scripts
+
+Run them from IAI_Backend, e.g. `python -m benchmarks.chatbot_latency`. By
+default they run offline: the fake LLM backend, hash embeddings and every
+store in a fresh temporary directory. Environment variables set beforehand
+win, e.g. EMBEDDING_BACKEND=sentence-transformers for real embedding numbers.
+"""
+import base64
+import contextlib
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from typing import Iterator, List
+
+
+def configure_offline(llm_latency: float = 0.05, **overrides: str) -> str:
+    """Select offline backends and throwaway stores; call before importing anything from app"""
+    workdir = tempfile.mkdtemp(prefix="iai_bench_")
+    settings = {
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY": str(llm_latency),
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_TOKENS_PER_MINUTE": "0",
+        "EMBEDDING_BACKEND": "hash",
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma_db"),
+        "INVOICE_INDEX_PATH": os.path.join(workdir, "invoice_index.db"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.db"),
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.db"),
+        "POLICY_CACHE_DIR": os.path.join(workdir, "policy_cache"),
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "JOBS_UPLOAD_DIR": os.path.join(workdir, "job_uploads"),
+        **overrides,
+    }
+    for name, value in settings.items():
+        os.environ.setdefault(name, value)
+    return workdir
+
+
+def make_pdf(text_lines: List[str], pages: int = 1, padding: int = 0) -> bytes:
+    """Minimal PDF of `pages` pages, each showing one text line per entry, plus `padding` bytes of incompressible comment"""
+    content = "BT /F1 12 Tf 50 750 Td 14 TL " + " ".join(f"({line}) '" for line in text_lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{5 + page} 0 R' for page in range(pages))}] /Count {pages} >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ] + [
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 3 0 R "
+        "/Resources << /Font << /F1 4 0 R >> >> >>"
+    ] * pages
+    pdf = b"%PDF-1.4\n"
+    if padding:
+        pdf += b"%" + base64.b64encode(os.urandom(padding * 3 // 4)) + b"\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return pdf
+
+
+def sample_invoice_lines(index: int) -> List[str]:
+    """Text of a synthetic invoice; the index varies the item and amount"""
+    items = ["Dinner at restaurant", "Hotel room 2 nights", "Taxi cab ride to airport", "Airline flight ticket"]
+    return [f"INVOICE #{1000 + index}", f"Vendor: Vendor {index}", items[index % len(items)],
+            f"Total: ${12 + index * 7 % 300:.2f}"]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile, e.g. fraction=0.99 for p99"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize_ms(values: List[float]) -> str:
+    """p50 / p99 / max of durations in seconds, printed in milliseconds"""
+    return (f"p50 {statistics.median(values) * 1000:7.1f} ms  p99 {percentile(values, 0.99) * 1000:7.1f} ms  "
+            f"max {max(values) * 1000:7.1f} ms  (n={len(values)})")
+
+
+@contextlib.contextmanager
+def serve(app) -> Iterator[str]:
+    """Run the ASGI app under uvicorn on a free local port, yielding its base URL"""
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
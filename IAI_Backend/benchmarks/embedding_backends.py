@@ -0,0 +1,89 @@
+"""
+Startup time, memory and cosine agreement of the embedding backends
+
+Each backend runs in a fresh interpreter so its imports and model load are
+measured on their own: time from start to the first embedding, peak RSS,
+and throughput over `--texts` invoice-like texts. Vectors are compared with
+the first backend listed (the reference) by per-text cosine similarity.
+Backends whose packages or model weights are unavailable are reported and
+skipped.
+
+    python -m benchmarks.embedding_backends [--backends sentence-transformers,onnx,onnx-int8] [--texts 512]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import sample_invoice_lines
+
+
+def texts(count: int):
+    return [" ".join(sample_invoice_lines(index)) for index in range(count)]
+
+
+def worker(backend_name: str, count: int, output: str):
+    """Measure one backend in this process and write its vectors to `output`"""
+    started = time.perf_counter()
+    from app.services.embedding_backend import create_embedding_backend
+
+    backend = create_embedding_backend(backend_name)
+    backend.encode("warm up")
+    startup = time.perf_counter() - started
+    batch = texts(count)
+    started = time.perf_counter()
+    vectors = backend.encode(batch, batch_size=64)
+    encode = time.perf_counter() - started
+    np.save(output, vectors)
+    print(json.dumps({
+        "startup_s": startup,
+        "texts_per_s": count / encode,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="sentence-transformers,onnx,onnx-int8",
+                        help="comma-separated EMBEDDING_BACKEND names; the first is the reference")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.texts, args.output)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="iai_bench_")
+    reference = None
+    for backend_name in args.backends.split(","):
+        output = os.path.join(workdir, f"{backend_name}.npy")
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.embedding_backends", "--worker", backend_name,
+             "--texts", str(args.texts), "--output", output],
+            capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            print(f"{backend_name:22} skipped: {process.stderr.strip().splitlines()[-1:] or ['failed']}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        vectors = np.load(output)
+        if reference is None:
+            reference, agreement = (backend_name, vectors), "reference"
+        else:
+            # Both sides are L2-normalised, so the row-wise dot product is the cosine similarity
+            cosine = np.sum(reference[1] * vectors, axis=1)
+            agreement = f"cosine vs {reference[0]}: mean {cosine.mean():.4f} min {cosine.min():.4f}"
+        print(f"{backend_name:22} startup {result['startup_s']:6.2f} s  peak RSS {result['peak_rss_mb']:7.1f} MB  "
+              f"{result['texts_per_s']:8.1f} texts/s  {agreement}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Accuracy and LLM-avoidance of the local chatbot filter extractor
+
+Runs FilterExtractor.extract over the labelled corpus in
+data/filter_queries.json. Each query is labelled "local" with the filters it
+should yield, or "llm" when its filters can't be read reliably by rules
+(relative dates, ranges, bare years, ...) and it should fall back to the LLM.
+Exits non-zero when a query is extracted locally with the wrong filters.
+
+    python -m benchmarks.filter_extraction [--corpus PATH] [--verbose]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import configure_offline
+
+DEFAULT_CORPUS = Path(__file__).parent / "data" / "filter_queries.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--verbose", action="store_true", help="print every query")
+    args = parser.parse_args()
+    configure_offline()
+
+    from app.services.filter_extractor import FilterExtractor
+    corpus = json.loads(Path(args.corpus).read_text())
+    known_employees = set(corpus["known_employees"])
+    extractor = FilterExtractor(None, None)
+
+    local = correct = wrong = missed = 0
+    elapsed = 0.0
+    for item in corpus["queries"]:
+        started = time.perf_counter()
+        filters, confidence = extractor.extract(item["query"], known_employees)
+        elapsed += time.perf_counter() - started
+        found = {name: value for name, value in filters.items() if value is not None}
+        handled_locally = confidence >= extractor.min_confidence
+
+        if not handled_locally:
+            verdict = "LLM " if item["route"] == "llm" else "MISS"
+            missed += item["route"] == "local"
+        elif item["route"] == "local" and found == item["filters"]:
+            verdict = "OK  "
+            correct += 1
+        else:
+            verdict = "BAD "
+            wrong += 1
+        local += handled_locally
+        if args.verbose or verdict in ("BAD ", "MISS"):
+            print(f"{verdict} {confidence:.2f} {item['query']!r} -> {found}")
+
+    total = len(corpus["queries"])
+    labelled_local = sum(item["route"] == "local" for item in corpus["queries"])
+    print(f"queries:                 {total} ({labelled_local} labelled local)")
+    print(f"answered without LLM:    {local}/{total} ({local / total:.0%})")
+    print(f"local extractions right: {correct}/{local}")
+    print(f"wrongly local:           {wrong}")
+    print(f"local sent to LLM:       {missed}")
+    print(f"mean extraction time:    {elapsed / total * 1e6:.0f} us")
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == "__main__":
+    main()
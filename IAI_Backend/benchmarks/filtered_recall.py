@@ -0,0 +1,102 @@
+"""
+Recall@10 of filtered vector search: filters pushed into Chroma against a top-k post-filter
+
+Stores `--invoices` synthetic invoices spread over employees, statuses and
+amounts, then asks the same questions with several filter combinations two
+ways: the old behaviour (unfiltered top 10 from Chroma, filtered afterwards
+with filter_results) and search_invoices, which puts every filter in the
+where clause. Recall counts returned invoices that satisfy the filters, out
+of min(10, invoices that do). Exits non-zero if the pushed-down search
+misses any or returns one that doesn't match.
+
+    python -m benchmarks.filtered_recall [--invoices 50000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.common import configure_offline, percentile
+
+EMPLOYEES = 200
+STATUSES = ["Fully Reimbursed", "Partially Reimbursed", "Declined"]
+ITEMS = ["dinner at restaurant", "hotel room two nights", "taxi cab ride to airport", "airline flight ticket"]
+QUERIES = ["Why was the taxi ride declined?", "hotel stays", "expensive dinners", "flight tickets"]
+
+
+def build_corpus(invoices: int, rng: random.Random):
+    records = []
+    for index in range(invoices):
+        amount = float(rng.randint(5, 1500))
+        records.append({
+            "invoice_id": f"bench_inv_{index}",
+            "invoice_text": f"Invoice {index}: {rng.choice(ITEMS)}, total ${amount:.2f}",
+            "analysis_result": {"status": rng.choice(STATUSES), "reason": "Benchmark record",
+                                "approved_amount": 0.0, "total_amount": amount},
+            "employee_name": f"emp_{rng.randrange(EMPLOYEES)}",
+        })
+    return records
+
+
+def filter_combinations(records, rng: random.Random):
+    """Filters of growing selectivity, each anchored on a stored invoice so at least one matches"""
+    combinations = []
+    for record in rng.sample(records, 5):
+        analysis = record["analysis_result"]
+        combinations.append({"status": analysis["status"]})
+        combinations.append({"employee_name": record["employee_name"]})
+        combinations.append({"employee_name": record["employee_name"], "status": analysis["status"]})
+        combinations.append({"status": analysis["status"], "amount": analysis["total_amount"]})
+    return combinations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=50000)
+    args = parser.parse_args()
+    configure_offline()
+
+    from app.services.invoice_index import InvoiceIndex
+    from app.services.vectore_store_service import VectorStoreService
+
+    rng = random.Random(1)
+    records = build_corpus(args.invoices, rng)
+    vector_store = VectorStoreService(invoice_index=InvoiceIndex())
+    started = time.perf_counter()
+    vector_store.store_invoice_analyses_bulk(records)
+    print(f"stored {args.invoices} invoices in {time.perf_counter() - started:.1f} s")
+
+    metadatas = [{"invoice_id": record["invoice_id"], "employee_name": record["employee_name"],
+                  "status": record["analysis_result"]["status"],
+                  "total_amount": record["analysis_result"]["total_amount"]} for record in records]
+    ok = True
+    totals = {"post-filter": [0.0, []], "pushed down": [0.0, []]}
+    searches = [(query, filters) for filters in filter_combinations(records, rng) for query in QUERIES]
+    for query, filters in searches:
+        matching = {metadata["invoice_id"]: metadata for metadata in metadatas
+                    if vector_store.filter_results([{"metadata": metadata}], filters)}
+        for label in totals:
+            started = time.perf_counter()
+            if label == "post-filter":
+                results = vector_store.filter_results(vector_store.retrieve_candidates(query, 10), filters)
+            else:
+                results = vector_store.search_invoices(query, filters, 10)
+            totals[label][1].append(time.perf_counter() - started)
+            found = {result["metadata"]["invoice_id"] for result in results}
+            recall = len(found & matching.keys()) / min(10, len(matching))
+            totals[label][0] += recall
+            if label == "pushed down" and (recall < 1 or found - matching.keys()):
+                ok = False
+                print(f"MISS {query!r} {filters}: {len(found & matching.keys())} valid of {len(found)} returned")
+
+    for label, (recall, latencies) in totals.items():
+        print(f"{label:11}  recall@10 {recall / len(searches):.2f}  "
+              f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p95 {percentile(latencies, 0.95) * 1000:6.1f} ms  "
+              f"({len(searches)} searches)")
+    if not ok:
+        print("FAIL: pushed-down filtered search missed matching invoices")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Recall@10 and latency of vector-only against hybrid (vector + BM25) search
+
+Stores `--invoices` synthetic invoices, each with a unique invoice number and
+a project code shared by about 50 invoices of different employees, then runs
+two workloads with the lexical index detached and attached:
+
+  lookup    "invoice INV-000123", no filters; the one invoice must be found
+  filtered  "project PRJ-0042" filtered to one employee; every invoice of
+            that employee on the project should be found
+
+    python -m benchmarks.hybrid_search [--invoices 20000] [--queries 100]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import configure_offline, percentile
+
+VENDORS = ["Acme Catering", "Blue Cab Co", "Hotel Orchid", "Skyline Air", "Metro Rail", "Cafe Mocha", "Zenith Travels"]
+EMPLOYEES = 20
+INVOICES_PER_PROJECT = 50
+
+
+def build_corpus(invoices: int, rng: random.Random):
+    records = []
+    for index in range(invoices):
+        records.append({
+            "invoice_id": f"bench_inv_{index}",
+            "invoice_text": (f"{rng.choice(VENDORS)} invoice number INV-{index:06d} "
+                             f"project PRJ-{index % max(1, invoices // INVOICES_PER_PROJECT):04d} "
+                             f"total {rng.randint(10, 900)}.00 USD"),
+            "analysis_result": {"status": "Declined", "reason": "Benchmark record",
+                                "approved_amount": 0.0, "total_amount": 1.0},
+            "employee_name": f"emp_{rng.randrange(EMPLOYEES)}",
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    configure_offline()
+
+    from app.services.invoice_index import InvoiceIndex
+    from app.services.lexical_index import LexicalIndex
+    from app.services.vectore_store_service import VectorStoreService
+
+    rng = random.Random(1)
+    records = build_corpus(args.invoices, rng)
+    lexical_index = LexicalIndex()
+    vector_store = VectorStoreService(invoice_index=InvoiceIndex(), lexical_index=lexical_index)
+    started = time.perf_counter()
+    vector_store.store_invoice_analyses_bulk(records)
+    print(f"stored {args.invoices} invoices in {time.perf_counter() - started:.1f} s")
+
+    projects = {}
+    for index, record in enumerate(records):
+        project = record["invoice_text"].split("project ")[1].split()[0]
+        projects.setdefault((project, record["employee_name"]), set()).add(record["invoice_id"])
+
+    lookups = [(f"invoice INV-{index:06d}", None, {f"bench_inv_{index}"})
+               for index in rng.sample(range(args.invoices), min(args.queries, args.invoices))]
+    filtered = [(f"project {project}", {"employee_name": employee}, expected)
+                for (project, employee), expected in rng.sample(sorted(projects.items()), min(args.queries, len(projects)))]
+
+    for workload, queries in (("lookup", lookups), ("filtered", filtered)):
+        for label, index in (("vector only", None), ("hybrid", lexical_index)):
+            vector_store.lexical_index = index
+            recall, latencies = 0.0, []
+            for query, filters, expected in queries:
+                started = time.perf_counter()
+                results = vector_store.search_invoices(query, filters, 10)
+                latencies.append(time.perf_counter() - started)
+                found = {result["metadata"]["invoice_id"] for result in results}
+                recall += len(found & expected) / min(10, len(expected))
+            print(f"{workload:8} {label:11}  recall@10 {recall / len(queries):.2f}  "
+                  f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p95 {percentile(latencies, 0.95) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Pages per second and peak memory of PDF extraction for 1-, 20- and 200-page documents
+
+Each extractor (PDF_EXTRACTOR) runs in a fresh interpreter, extracting
+`--repeats` copies of each document through
+PDFProcessor.extract_text_from_pdf_async, i.e. on the process pool, with
+documents of PDF_PARALLEL_MIN_PAGES pages or more split into page ranges.
+Peak RSS is the largest of the parent and its pool workers. Set
+PDF_EXTRACTION_WORKERS to compare pool sizes; with one worker nothing is
+split.
+
+    python -m benchmarks.pdf_extraction [--extractors pypdf2,pypdfium2,pdfminer] [--pages 1,20,200] [--repeats 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.common import make_pdf, sample_invoice_lines
+
+
+async def measure(page_counts, repeats: int):
+    from app.services.pdf_processor import PDFProcessor, get_process_pool
+
+    # Start the pool before timing, as the app does at startup
+    await asyncio.get_running_loop().run_in_executor(get_process_pool(), sum, [])
+    rows = []
+    for pages in page_counts:
+        pdf = make_pdf(sample_invoice_lines(pages), pages=pages)
+        # Untimed first pass, so library imports in the workers aren't counted
+        await PDFProcessor.extract_text_from_pdf_async(pdf)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            text = await PDFProcessor.extract_text_from_pdf_async(pdf)
+        seconds = time.perf_counter() - started
+        rows.append({"pages": pages, "pages_per_s": pages * repeats / seconds,
+                     "ms_per_doc": seconds / repeats * 1000, "chars": len(text)})
+    get_process_pool().shutdown()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--extractors", default="pypdf2,pypdfium2,pdfminer")
+    parser.add_argument("--pages", default="1,20,200", help="comma-separated page counts")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    page_counts = [int(pages) for pages in args.pages.split(",")]
+
+    if args.worker:
+        rows = asyncio.run(measure(page_counts, args.repeats))
+        # ru_maxrss is in kilobytes on Linux; RUSAGE_CHILDREN covers the finished pool workers
+        peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        print(json.dumps({"rows": rows, "peak_rss_mb": peak_kb / 1024}))
+        return
+
+    for extractor in args.extractors.split(","):
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.pdf_extraction", "--worker",
+             "--pages", args.pages, "--repeats", str(args.repeats)],
+            capture_output=True, text=True, env={**os.environ, "PDF_EXTRACTOR": extractor}
+        )
+        if process.returncode != 0:
+            print(f"{extractor:10} failed: {process.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        for row in result["rows"]:
+            print(f"{extractor:10} {row['pages']:4d} pages  {row['pages_per_s']:8.1f} pages/s  "
+                  f"{row['ms_per_doc']:8.1f} ms/doc  {row['chars']:7d} chars")
+        print(f"{extractor:10} peak RSS {result['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
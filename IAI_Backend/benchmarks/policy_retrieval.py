@@ -0,0 +1,151 @@
+"""
+Invoice analysis accuracy against prompt tokens when sending retrieved policy clauses
+
+Builds a long policy of boilerplate sections with one rule clause per
+expense category and `--invoices` invoices across those categories, each
+with a known correct decision. A fake model applies exactly the rules
+visible in its prompt, with latency growing with prompt size, so a missing
+clause shows up as a wrong decision. The pipeline runs with the whole
+policy and with the top-k retrieved clauses (POLICY_RETRIEVAL_TOP_K), alone
+and batched. Exits non-zero if the default top-k is less accurate than the
+whole policy.
+
+    python -m benchmarks.policy_retrieval [--invoices 40] [--top-k 2,4,8] [--batch-size 5]
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+
+from benchmarks.common import configure_offline, make_pdf
+
+# Category: (words naming it, per-claim limit or None when never reimbursable, invoice line item)
+RULES = {
+    "meals": ("meal restaurant lunch dinner breakfast food", 50, "Dinner at restaurant"),
+    "lodging": ("hotel lodging room night accommodation", 200, "Hotel room 2 nights"),
+    "taxi": ("taxi cab rideshare ride", 60, "Taxi cab ride to airport"),
+    "airfare": ("flight airfare airline ticket economy", 800, "Airline flight ticket economy"),
+    "alcohol": ("alcohol wine beer bar liquor", None, "Bar tab wine and beer"),
+    "parking": ("parking garage valet", 25, "Airport parking garage"),
+    "internet": ("internet wifi broadband data", 40, "Wifi internet access"),
+    "fuel": ("fuel petrol gasoline mileage", 120, "Fuel petrol for rental car"),
+}
+FILLER = ("approvals manager finance department compliance audit records retention submission deadline quarter "
+          "form signature documentation employees contractors exceptions escalation review").split()
+RULE_PATTERN = re.compile(r"(\w+) expenses \([^)]*\) are reimbursable up to \$(\d+)|(\w+) \([^)]*\) is not reimbursable")
+
+
+def build_policy(rng: random.Random) -> str:
+    sections = [f"Section {number}: " + " ".join(rng.choice(FILLER) for _ in range(60)) + "." for number in range(60)]
+    for category, (words, limit, _) in RULES.items():
+        names = ", ".join(words.split())
+        rule = (f"{category.title()} expenses ({names}) are reimbursable up to ${limit} per claim; "
+                f"amounts above ${limit} are partially reimbursed at ${limit}." if limit
+                else f"{category.title()} ({names}) is not reimbursable under any circumstances.")
+        sections.insert(rng.randrange(len(sections)), rule)
+    return "\n".join(sections)
+
+
+def decide(policy: str, invoice: str):
+    """The decision the policy text shown implies for an invoice"""
+    limits = {(match.group(1) or match.group(3)).lower(): int(match.group(2)) if match.group(2) else None
+              for match in RULE_PATTERN.finditer(policy)}
+    amount = float(re.search(r"\$(\d+\.\d\d)", invoice).group(1))
+    words = invoice.lower().split()
+    category = next((name for name, (names, _, _) in RULES.items() if any(word in words for word in names.split())), None)
+    if category not in limits or limits[category] is None:
+        return {"status": "Declined", "reason": "No clause allows it", "approved_amount": 0.0, "total_amount": amount}
+    limit = limits[category]
+    if amount <= limit:
+        return {"status": "Fully Reimbursed", "reason": "Within limit", "approved_amount": amount, "total_amount": amount}
+    return {"status": "Partially Reimbursed", "reason": "Over limit", "approved_amount": float(limit), "total_amount": amount}
+
+
+async def run(args) -> bool:
+    from app.core.config import POLICY_RETRIEVAL_TOP_K
+    from app.services.embedding_backend import HashEmbeddingBackend
+    from app.services.invoice_pipeline import InvoicePipeline
+    from app.services.llm_backend import LLMBackend, LLMResponse, LLMUsage
+    from app.services.llm_service import LLMService
+    from app.services.vectore_store_service import VectorStoreService
+
+    class PolicyJudge(LLMBackend):
+        """Applies exactly the policy rules visible in its prompt"""
+
+        name = "judge"
+
+        def __init__(self):
+            super().__init__("judge")
+
+        async def _generate(self, prompt: str) -> LLMResponse:
+            tokens = len(prompt) // 4
+            await asyncio.sleep(args.call_latency + tokens * args.latency_per_token)
+            policy = prompt.split("EMPLOYEE INVOICE", 1)[0]
+            if "EMPLOYEE INVOICES:" in prompt:
+                parts = re.findall(r"INVOICE \[(\d+)\]:\n(.*?)(?=\nINVOICE \[|\nAnalyze each)", prompt, re.DOTALL)
+                text = json.dumps([{"index": int(index), **decide(policy, invoice)} for index, invoice in parts])
+            else:
+                text = json.dumps(decide(policy, prompt.split("Invoice Content:", 1)[1].split("Based on the policy", 1)[0]))
+            return LLMResponse(text, LLMUsage(tokens, len(text) // 4))
+
+    rng = random.Random(7)
+    policy = build_policy(rng)
+    invoices = []
+    for index in range(args.invoices):
+        category = list(RULES)[index % len(RULES)]
+        amount = round(rng.uniform(0.3, 1.6) * (RULES[category][1] or 100), 2)
+        lines = [f"INVOICE #{1000 + index}", f"Vendor: Vendor {index}", RULES[category][2], f"Total: ${amount:.2f}"]
+        invoices.append((f"inv{index}.pdf", make_pdf(lines), decide(policy, " ".join(lines))))
+    print(f"policy: {len(policy.split())} words, {len(RULES)} rule clauses among {len(policy.splitlines())} sections")
+
+    accuracy = {}
+    runs = [(0, 1)] + [(top_k, 1) for top_k in args.top_k] + [(0, args.batch_size), (POLICY_RETRIEVAL_TOP_K, args.batch_size)]
+    for top_k, batch_size in runs:
+        # Wider than the default hash: at 384 buckets invoice numbers collide with clause words often
+        # enough to push a rule out of the top k, which says more about the stand-in than retrieval
+        vector_store = VectorStoreService(tempfile.mkdtemp(prefix="iai_bench_chroma_"),
+                                          embedding_model=HashEmbeddingBackend(dimensions=4096))
+        llm_service = LLMService(use_context_cache=False, backend=PolicyJudge())
+        pipeline = InvoicePipeline(llm_service, vector_store, batch_size=batch_size, policy_top_k=top_k,
+                                   policy_min_words=1000)
+        decisions = {}
+        started = time.perf_counter()
+        await pipeline.run([(name, lambda pdf=pdf: pdf) for name, pdf, _ in invoices], policy, "Bench User",
+                           progress_callback=lambda name, analysis, error: decisions.__setitem__(name, analysis))
+        seconds = time.perf_counter() - started
+        correct = sum(
+            decisions.get(name) is not None and decisions[name]["status"] == truth["status"]
+            and abs(decisions[name]["approved_amount"] - truth["approved_amount"]) < 0.01
+            for name, _, truth in invoices
+        )
+        accuracy[(top_k, batch_size)] = correct
+        usage = llm_service.get_usage_stats()
+        label = "whole policy" if not top_k else f"top-{top_k} clauses"
+        print(f"{label:15} batch {batch_size:2d}  accuracy {correct}/{len(invoices)}  "
+              f"prompt tokens/invoice {usage['prompt_tokens'] / len(invoices):6.0f}  "
+              f"{usage['calls']:3d} LLM calls  {seconds:5.1f} s")
+    return all(accuracy[(POLICY_RETRIEVAL_TOP_K, size)] >= accuracy[(0, size)] for size in {1, args.batch_size}
+               if (POLICY_RETRIEVAL_TOP_K, size) in accuracy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=40)
+    parser.add_argument("--top-k", type=lambda value: [int(k) for k in value.split(",")], default=[2, 4, 8],
+                        help="comma-separated clause counts to compare")
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--call-latency", type=float, default=0.3, help="fake model seconds per call")
+    parser.add_argument("--latency-per-token", type=float, default=0.0001, help="fake model seconds per prompt token")
+    args = parser.parse_args()
+    configure_offline(llm_latency=0.0)
+    if not asyncio.run(run(args)):
+        print("FAIL: the default number of retrieved clauses loses accuracy against the whole policy")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Retry and backoff of the LLM client against a server that injects 429s
+
+Serves a fake OpenAI-compatible /chat/completions endpoint that allows
+`--quota` requests per second, answers 429 beyond that and 503 for a random
+`--error-rate` of the rest. `--invoices` analyses are started at once, first
+through a client without retries or rate limiting, then through the default
+retrying client limited to the server's quota. Finally `--duplicates`
+identical concurrent prompts check that deduplication sends one request and
+that token usage is counted once. Exits non-zero if the retrying client
+loses an invoice or usage disagrees with what the server served.
+
+    python -m benchmarks.rate_limit_retries [--invoices 60] [--quota 4] [--error-rate 0.1] [--duplicates 10]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.common import configure_offline, serve
+
+ANALYSIS = '{"status": "Declined", "reason": "No itemised receipt", "approved_amount": 0, "total_amount": 12.5}'
+POLICY_TEXT = "Meals are reimbursable up to $50 with an itemised receipt."
+
+
+def make_server(quota: float, error_rate: float, latency: float, stats: Dict[str, int]):
+    """FastAPI app answering chat completions within a per-second quota"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    window = []
+    rng = random.Random(7)
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        now = time.monotonic()
+        while window and window[0] < now - 1:
+            window.pop(0)
+        if len(window) >= quota:
+            stats["429"] += 1
+            return JSONResponse({"error": {"message": "Rate limit exceeded"}}, status_code=429)
+        window.append(now)
+        if rng.random() < error_rate:
+            stats["503"] += 1
+            return JSONResponse({"error": {"message": "The model is overloaded"}}, status_code=503)
+        await asyncio.sleep(latency)
+        stats["ok"] += 1
+        prompt_tokens = len(body["messages"][0]["content"]) // 4
+        stats["prompt_tokens"] += prompt_tokens
+        return {
+            "choices": [{"message": {"role": "assistant", "content": ANALYSIS}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 20},
+        }
+
+    return app
+
+
+async def analyse_all(llm_service, invoices: int):
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        llm_service.analyze_invoice(f"Invoice #{index}: dinner, total $12.50", POLICY_TEXT, "Bench User")
+        for index in range(invoices)
+    ])
+    return sum(result is not None for result in results), time.perf_counter() - started
+
+
+async def run(url: str, args, stats: Dict[str, Any]) -> bool:
+    from app.services.llm_backend import OpenAICompatibleBackend
+    from app.services.llm_client import RateLimitedLLMClient
+    from app.services.llm_service import LLMService
+
+    def service(client: RateLimitedLLMClient) -> LLMService:
+        return LLMService(use_context_cache=False, client=client,
+                          backend=OpenAICompatibleBackend(model_name="fake", base_url=url))
+
+    clients = (
+        ("no retries", RateLimitedLLMClient(requests_per_minute=0, tokens_per_minute=0, max_retries=0)),
+        ("retrying", RateLimitedLLMClient(requests_per_minute=args.quota * 60, tokens_per_minute=0)),
+    )
+    for label, client in clients:
+        for key in stats:
+            stats[key] = 0
+        analysed, seconds = await analyse_all(service(client), args.invoices)
+        client_stats = client.get_stats()
+        print(f"{label:10}  {analysed}/{args.invoices} analysed in {seconds:5.1f} s  "
+              f"server: {stats['ok']} ok, {stats['429']} x 429, {stats['503']} x 503  "
+              f"client: {client_stats['retries']} retries, {client_stats['rate_limited']} rate limited, "
+              f"{client_stats['throttled_seconds']:.1f} s throttled")
+    # The loop ends on the retrying client, which must not lose any invoice
+    ok = analysed == args.invoices
+
+    for key in stats:
+        stats[key] = 0
+    llm_service = service(RateLimitedLLMClient(requests_per_minute=0, tokens_per_minute=0, max_retries=0))
+    duplicates = await asyncio.gather(*[
+        llm_service.analyze_invoice("Invoice #1: dinner, total $12.50", POLICY_TEXT, "Bench User")
+        for _ in range(args.duplicates)
+    ])
+    usage = llm_service.get_usage_stats()
+    print(f"duplicates  {sum(result is not None for result in duplicates)}/{args.duplicates} answered by "
+          f"{stats['ok']} request(s); usage counted {usage['calls']} call(s), "
+          f"{usage['prompt_tokens']} prompt tokens (server served {stats['prompt_tokens']})")
+    return ok and usage["calls"] == stats["ok"] and usage["prompt_tokens"] == stats["prompt_tokens"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=60)
+    parser.add_argument("--quota", type=float, default=4, help="requests per second the server allows")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="share of allowed requests answered 503")
+    parser.add_argument("--latency", type=float, default=0.2, help="server seconds per answered request")
+    parser.add_argument("--duplicates", type=int, default=10)
+    args = parser.parse_args()
+    configure_offline(LLM_RETRY_BASE_DELAY="0.5", LLM_RETRY_MAX_DELAY="8", LLM_MAX_RETRIES="8")
+
+    stats = {"ok": 0, "429": 0, "503": 0, "prompt_tokens": 0}
+    with serve(make_server(args.quota, args.error_rate, args.latency, stats)) as url:
+        passed = asyncio.run(run(url, args, stats))
+    if not passed:
+        print("FAIL: the retrying client lost invoices or usage disagrees with the server")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Regression check: re-analysing the same ZIP must not add invoice records
+
+Builds a ZIP of `--invoices` PDFs that also holds an identical copy of one
+invoice and two same-named files in different folders, runs it through the
+invoice pipeline `--runs` times against the same stores, and prints the
+stored invoice count after each run. Exits non-zero if a rerun changes it.
+
+    python -m benchmarks.rerun_ingest [--invoices 30] [--runs 3]
+"""
+import argparse
+import asyncio
+import io
+import sys
+import zipfile
+
+from benchmarks.common import configure_offline, make_pdf, sample_invoice_lines
+
+
+def build_archive(invoices: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for index in range(invoices):
+            archive.writestr(f"invoices/inv{index}.pdf", make_pdf(sample_invoice_lines(index)))
+        # The same invoice uploaded twice, and two different invoices sharing a file name
+        archive.writestr("copies/inv0.pdf", make_pdf(sample_invoice_lines(0)))
+        archive.writestr("march/receipt.pdf", make_pdf(sample_invoice_lines(invoices)))
+        archive.writestr("april/receipt.pdf", make_pdf(sample_invoice_lines(invoices + 1)))
+    return buffer.getvalue()
+
+
+async def run(invoices: int, runs: int) -> bool:
+    from app.api.deps import get_invoice_pipeline, get_vector_store
+    from app.services.invoice_archive import open_invoice_archive
+
+    pipeline = get_invoice_pipeline()
+    vector_store = get_vector_store()
+    archive = build_archive(invoices)
+    policy_text = "Meals are reimbursable up to $50. Alcohol is not reimbursable."
+
+    counts = []
+    for number in range(1, runs + 1):
+        zip_ref, invoice_files = open_invoice_archive(io.BytesIO(archive))
+        with zip_ref:
+            processed, errors = await pipeline.run(invoice_files, policy_text, "Bench User")
+        counts.append(vector_store.count_invoices())
+        print(f"run {number}: {processed} processed, {len(errors)} error(s), {counts[-1]} invoice(s) stored")
+    return len(set(counts)) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    configure_offline(llm_latency=0.0)
+    if not asyncio.run(run(args.invoices, args.runs)):
+        print("FAIL: a rerun changed the number of stored invoices")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Chatbot context retrieval with and without speculative over-fetching
+
+Seeds `--invoices` analysed invoices, then times the chatbot's context
+retrieval (filter extraction plus vector search) for free-text questions the
+local extractor reads on its own and for ones that fall back to the LLM,
+with CHATBOT_SPECULATIVE_RETRIEVAL off and on. Embedding gets an artificial
+`--embedding-latency` per call to stand in for a real model; the count of
+embedding calls shows the extra searches speculation costs.
+
+    python -m benchmarks.speculative_retrieval [--invoices 2000] [--llm-latency 0.3] [--embedding-latency 0.15]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import configure_offline
+
+LOCAL_QUERIES = [
+    "Why was the taxi invoice for John Doe declined?",
+    "Explain the declined hotel claims for Priya Nair",
+    "What were Ronit Shah's fully reimbursed dinners for?",
+    "Explain the airline tickets declined in May 2024",
+]
+FALLBACK_QUERIES = [
+    "Why were the taxi rides reimbursed?",
+    "Explain the hotel claims declined last week",
+    "Why was the 42 dollar dinner only partly covered",
+    "What were the flights over $500 for?",
+]
+EMPLOYEES = ["john_doe", "priya_nair", "ronit_shah"]
+STATUSES = ["Fully Reimbursed", "Partially Reimbursed", "Declined"]
+ITEMS = ["dinner at restaurant", "hotel room two nights", "taxi cab ride to airport", "airline flight ticket"]
+
+
+async def run(invoices: int, embedding_latency: float, repeats: int):
+    from app.api.v1.endpoints import chatbot
+    from app.models.models import ChatbotRequest
+    from app.services.embedding_backend import HashEmbeddingBackend
+    from app.services.filter_extractor import FilterExtractor
+    from app.services.invoice_index import InvoiceIndex
+    from app.services.lexical_index import LexicalIndex
+    from app.services.llm_service import LLMService
+    from app.services.vectore_store_service import VectorStoreService
+
+    class TimedEmbedding(HashEmbeddingBackend):
+        """Hash embeddings that take as long as a real model and count their calls"""
+
+        calls = 0
+
+        def _encode(self, model, texts, batch_size):
+            TimedEmbedding.calls += 1
+            time.sleep(embedding_latency)
+            return super()._encode(model, texts, batch_size)
+
+    vector_store = VectorStoreService(
+        invoice_index=InvoiceIndex(), lexical_index=LexicalIndex(), embedding_model=HashEmbeddingBackend()
+    )
+    vector_store.store_invoice_analyses_bulk([
+        {
+            "invoice_id": f"{EMPLOYEES[index % 3]}_inv{index}",
+            "invoice_text": f"Invoice {index}: {ITEMS[index % len(ITEMS)]}, total ${10 + index % 400}.00",
+            "analysis_result": {"status": STATUSES[index % 3], "reason": "Benchmark record",
+                                "approved_amount": 0.0, "total_amount": float(10 + index % 400)},
+            "employee_name": EMPLOYEES[index % 3],
+        }
+        for index in range(invoices)
+    ])
+    vector_store.embedding_model = TimedEmbedding()
+    filter_extractor = FilterExtractor(LLMService(), vector_store)
+
+    for label, queries in (("local filters", LOCAL_QUERIES), ("LLM fallback", FALLBACK_QUERIES)):
+        for speculative in (False, True):
+            chatbot.CHATBOT_SPECULATIVE_RETRIEVAL = speculative
+            TimedEmbedding.calls = 0
+            latencies = []
+            for _ in range(repeats):
+                for query in queries:
+                    request = ChatbotRequest(query=query)
+                    started = time.perf_counter()
+                    local = await filter_extractor.extract_local(query)
+                    await chatbot._retrieve_context(request, filter_extractor, vector_store, local)
+                    latencies.append(time.perf_counter() - started)
+            print(f"{label:14} speculative={'on ' if speculative else 'off'}  "
+                  f"mean {statistics.mean(latencies) * 1000:6.1f} ms  "
+                  f"embedding calls/query {TimedEmbedding.calls / len(latencies):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM seconds per call")
+    parser.add_argument("--embedding-latency", type=float, default=0.15, help="seconds per embedding call")
+    args = parser.parse_args()
+    configure_offline(llm_latency=args.llm_latency, EMBEDDING_CACHE_SIZE="0")
+    asyncio.run(run(args.invoices, args.embedding_latency, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
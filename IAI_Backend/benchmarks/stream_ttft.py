@@ -0,0 +1,119 @@
+"""
+Time to first token of POST /chatbot/stream against a stub streaming model
+
+The stub emits its first token after --first-token seconds and one more
+every --token-interval seconds. The script reports client-side time to
+first token and to the done event for the stream endpoint, next to the
+latency of the non-streaming /chatbot endpoint on the same questions.
+
+    python -m benchmarks.stream_ttft [--requests 20] [--first-token 0.3] [--token-interval 0.05] [--tokens 40]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Tuple
+
+from benchmarks.common import configure_offline, serve, summarize_ms
+
+QUESTIONS = [
+    "Explain the reasoning behind the taxi reimbursement decisions",
+    "Summarise what the hotel stays had in common",
+    "Why would a restaurant bill get only part of its amount back?",
+    "Describe the airfare claims in plain words",
+]
+
+
+def make_stub_backend(first_token: float, token_interval: float, tokens: int):
+    from app.services.llm_backend import LLMBackend, LLMResponse, LLMUsage
+
+    class StubStreamingBackend(LLMBackend):
+        """Streams `tokens` words: the first after first_token seconds, then one per token_interval"""
+
+        name = "stub-stream"
+
+        def __init__(self):
+            super().__init__("stub-stream")
+
+        async def _stream(self, prompt: str):
+            await asyncio.sleep(first_token)
+            for index in range(tokens):
+                if index:
+                    await asyncio.sleep(token_interval)
+                yield LLMResponse(f"word{index} ", LLMUsage(len(prompt) // 4, tokens) if index == tokens - 1 else None)
+
+        async def _generate(self, prompt: str) -> LLMResponse:
+            if "extracts structured filters" in prompt:
+                # Filter extraction fallback: no filters, answered at once
+                return LLMResponse("{}", LLMUsage(len(prompt) // 4, 1))
+            await asyncio.sleep(first_token + token_interval * (tokens - 1))
+            return LLMResponse("".join(f"word{index} " for index in range(tokens)), LLMUsage(len(prompt) // 4, tokens))
+
+    return StubStreamingBackend()
+
+
+async def stream_once(client, query: str) -> Tuple[float, float, int]:
+    """(seconds to first token, seconds to done, token events)"""
+    started = time.perf_counter()
+    first_token, token_events = None, 0
+    async with client.stream("POST", "/api/v1/chatbot/stream", json={"query": query, "session_id": None}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data:") and "token" in json.loads(line[len("data:"):]):
+                token_events += 1
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+    return first_token, time.perf_counter() - started, token_events
+
+
+async def measure(client, requests: int, tokens: int) -> Tuple[List[float], List[float], List[float]]:
+    """Per question: stream time to first token, stream time to done, and /chatbot latency"""
+    ttft, stream_total, blocking = [], [], []
+    for number in range(requests):
+        query = f"{QUESTIONS[number % len(QUESTIONS)]} ({number})"
+        first, total, token_events = await stream_once(client, query)
+        if token_events < tokens:
+            raise RuntimeError(f"Expected {tokens} streamed tokens for {query!r}, got {token_events}")
+        ttft.append(first)
+        stream_total.append(total)
+
+        started = time.perf_counter()
+        response = await client.post("/api/v1/chatbot/chatbot", json={"query": query + "?", "session_id": None})
+        response.raise_for_status()
+        blocking.append(time.perf_counter() - started)
+    return ttft, stream_total, blocking
+
+
+async def run(requests: int, first_token: float, token_interval: float, tokens: int):
+    import httpx
+    from main import app
+    from app.api.deps import get_llm_service
+
+    llm_service = get_llm_service()
+    llm_service.model = make_stub_backend(first_token, token_interval, tokens)
+    llm_service.model_name = llm_service.model.model_name
+
+    # A real server: httpx's in-process ASGI transport buffers whole responses
+    with serve(app) as base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            ttft, stream_total, blocking = await measure(client, requests, tokens)
+
+    print(f"stub model: first token after {first_token * 1000:.0f} ms, {tokens} tokens {token_interval * 1000:.0f} ms apart")
+    print(f"/stream time to first token: {summarize_ms(ttft)}")
+    print(f"/stream time to done:        {summarize_ms(stream_total)}")
+    print(f"/chatbot full response:      {summarize_ms(blocking)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=40)
+    args = parser.parse_args()
+    configure_offline(CHATBOT_ANSWER_CACHE_SIZE="0")
+    asyncio.run(run(args.requests, args.first_token, args.token_interval, args.tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,27 @@
+from contextlib import asynccontextmanager
 from logger import logger
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.endpoints import router as api_router
+from app.api.deps import get_vector_store, get_llm_service, get_analysis_cache, get_job_manager, get_filter_extractor, get_answer_cache, get_rule_engine
+from app.services.pdf_processor import get_process_pool
+from app.services.embedding_backend import CachedEmbeddingBackend
+from app.utils.utils import get_memory_usage_mb
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the persistent vector store before serving traffic; the embedding model loads on first use
+    get_vector_store()
+    logger.info(f"Services warmed up, RSS {get_memory_usage_mb():.1f} MB")
+    # Pick up analysis jobs interrupted by the last shutdown
+    get_job_manager().resume_pending()
+    yield
+    await get_job_manager().shutdown()
+    get_process_pool().shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -17,3 +35,32 @@ logger.info("Starting FastAPI application...")
 app.include_router(api_router, prefix="/api/v1")
 
 logger.info("FastAPI application started successfully.")
+
+
+@app.get("/health")
+async def health():
+    """Liveness probe reporting process memory, vector store size, LLM token usage and rate limiting, cache, rule engine and filter extraction metrics"""
+    analysis_cache = get_analysis_cache()
+    answer_cache = get_answer_cache()
+    rule_engine = get_rule_engine()
+    embedding_model = get_vector_store().embedding_model
+    return {
+        "status": "ok",
+        "rss_mb": round(get_memory_usage_mb(), 1),
+        "invoices_indexed": get_vector_store().count_invoices(),
+        "embeddings_indexed": get_vector_store().collection.count(),
+        "embedding_backend": {
+            "name": embedding_model.name,
+            "loaded": embedding_model.loaded
+        },
+        "embedding_cache": (
+            embedding_model.get_stats() if isinstance(embedding_model, CachedEmbeddingBackend) else None
+        ),
+        "llm_backend": get_llm_service().model.name if get_llm_service().model else None,
+        "llm_usage": get_llm_service().get_usage_stats(),
+        "llm_client": get_llm_service().client.get_stats(),
+        "analysis_cache": analysis_cache.get_stats() if analysis_cache else None,
+        "answer_cache": answer_cache.get_stats() if answer_cache else None,
+        "rule_engine": rule_engine.get_stats() if rule_engine else None,
+        "filter_extraction": get_filter_extractor().get_stats()
+    }
@@ -2,12 +2,15 @@ import streamlit as st
 import requests
 import json
 import uuid
+import hashlib
 from datetime import datetime
 import time
 from typing import Dict, List, Any
 
 # Configuration
 API_BASE_URL = "http://localhost:8000"  # Adjust this to your FastAPI server URL
+REQUEST_TIMEOUT = 120  # Seconds to wait for a single API call
+JOB_POLL_INTERVAL = 2  # Seconds between analysis job status checks
 
 # Page configuration
 st.set_page_config(
@@ -105,6 +108,8 @@ if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
+if 'policy_ids' not in st.session_state:
+    st.session_state.policy_ids = {}
 
 def create_new_chat_session():
     """Create a new chat session"""
@@ -149,6 +154,25 @@ def display_invoice_analysis_results(results: Dict[str, Any]):
         </div>
         """, unsafe_allow_html=True)
     
+    # Per-invoice decisions
+    invoice_results = [r for r in results.get('results', []) if not r.get('error')]
+    if invoice_results:
+        st.subheader("🧾 Invoice Decisions")
+        st.dataframe(
+            [
+                {
+                    "File": r['file_name'],
+                    "Status": r.get('status'),
+                    "Approved": r.get('approved_amount'),
+                    "Total": r.get('total_amount'),
+                    "Decided By": r.get('decided_by'),
+                    "Reason": r.get('reason')
+                }
+                for r in invoice_results
+            ],
+            use_container_width=True
+        )
+    
     # Display errors if any
     if results.get('errors'):
         st.subheader("⚠️ Errors Encountered")
@@ -159,6 +183,65 @@ def display_invoice_analysis_results(results: Dict[str, Any]):
             </div>
             """, unsafe_allow_html=True)
 
+def get_registered_policy_id(policy_file, refresh: bool = False) -> str:
+    """Register the policy PDF once per content hash and return its policy ID; refresh re-registers it"""
+    content = policy_file.getvalue()
+    content_hash = hashlib.sha256(content).hexdigest()
+    if refresh:
+        st.session_state.policy_ids.pop(content_hash, None)
+    if content_hash in st.session_state.policy_ids:
+        return st.session_state.policy_ids[content_hash]
+
+    try:
+        response = requests.post(
+            f"{API_BASE_URL}/api/v1/policies/policies",
+            files={"policy_file": (policy_file.name, content, "application/pdf")},
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code == 200:
+            policy_id = response.json()["policy_id"]
+            st.session_state.policy_ids[content_hash] = policy_id
+            return policy_id
+    except Exception:
+        pass
+    return None
+
+def poll_analysis_job(job_id: str) -> Dict[str, Any]:
+    """Poll a background analysis job, showing progress, until it finishes"""
+    progress_bar = st.progress(0.0, text="Queued...")
+    while True:
+        try:
+            response = requests.get(
+                f"{API_BASE_URL}/api/v1/analyze-invoices/jobs/{job_id}",
+                timeout=REQUEST_TIMEOUT
+            )
+        except requests.RequestException:
+            # Transient network errors don't lose the job; keep polling
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        if response.status_code != 200:
+            st.error(f"Could not fetch job status: {response.status_code} - {response.text}")
+            return None
+
+        job = response.json()
+        total = job.get('total_invoices', 0) or 1
+        completed = job.get('completed_invoices', 0)
+        progress_bar.progress(min(completed / total, 1.0), text=f"Analyzed {completed} of {job.get('total_invoices', 0)} invoice(s)")
+
+        if job['status'] == 'failed':
+            st.error(f"Analysis failed: {job.get('message', '')}")
+            return None
+        if job['status'] == 'completed':
+            return {
+                "status": "success" if job['invoices_processed'] > 0 else "partial_success",
+                "message": job.get('message', ''),
+                "invoices_processed": job['invoices_processed'],
+                "errors": job.get('errors', []),
+                "results": job.get('results', [])
+            }
+        time.sleep(JOB_POLL_INTERVAL)
+
 def send_chatbot_query(query: str, session_id: str = None) -> Dict[str, Any]:
     """Send query to chatbot API"""
     try:
@@ -170,7 +253,8 @@ def send_chatbot_query(query: str, session_id: str = None) -> Dict[str, Any]:
         response = requests.post(
             f"{API_BASE_URL}/api/v1/chatbot/chatbot",
             json=payload,
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json"},
+            timeout=REQUEST_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -186,6 +270,40 @@ def send_chatbot_query(query: str, session_id: str = None) -> Dict[str, Any]:
             "session_id": session_id
         }
 
+def stream_chatbot_query(query: str, session_id: str = None, placeholder=None) -> Dict[str, Any]:
+    """Send query to the streaming chatbot API, rendering tokens into placeholder as they arrive"""
+    result = {"response": "", "session_id": session_id}
+    try:
+        with requests.post(
+            f"{API_BASE_URL}/api/v1/chatbot/stream",
+            json={"query": query, "session_id": session_id},
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+            stream=True,
+            timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                result["response"] = f"Error: {response.status_code} - {response.text}"
+                return result
+
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    event = None
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event in ("session", "done"):
+                        result["session_id"] = data.get("session_id", session_id)
+                    elif "token" in data:
+                        result["response"] += data["token"]
+                        if placeholder is not None:
+                            placeholder.markdown(f"**Assistant:** {result['response']}▌")
+    except Exception as e:
+        result["response"] = result["response"] or f"Connection error: {str(e)}"
+    return result
+
 def display_chat_history():
     """Display chat history in a formatted way"""
     if st.session_state.chat_history:
@@ -263,25 +381,40 @@ if page == "Invoice Analysis":
                     try:
                         # Prepare files for API request
                         files = {
-                            "policy_file": (policy_file.name, policy_file.getvalue(), "application/pdf"),
                             "invoices_zip": (invoice_zip.name, invoice_zip.getvalue(), "application/zip")
                         }
                         
                         data = {
                             "employee_name": employee_name
                         }
-                        
-                        # Send request to API
-                        response = requests.post(
-                            f"{API_BASE_URL}/api/v1/analyze-invoices/analyze-invoices",
-                            files=files,
-                            data=data
-                        )
+
+                        # Send the policy by ID once it is registered, otherwise upload it.
+                        # The backend forgets policies when its cache is wiped or evicts them,
+                        # so a 404 re-registers the policy and submits once more.
+                        for refresh in (False, True):
+                            policy_id = get_registered_policy_id(policy_file, refresh=refresh)
+                            if policy_id:
+                                data["policy_id"] = policy_id
+                                files.pop("policy_file", None)
+                            else:
+                                data.pop("policy_id", None)
+                                files["policy_file"] = (policy_file.name, policy_file.getvalue(), "application/pdf")
+
+                            # Queue the analysis as a background job and poll for progress
+                            response = requests.post(
+                                f"{API_BASE_URL}/api/v1/analyze-invoices/jobs",
+                                files=files,
+                                data=data,
+                                timeout=REQUEST_TIMEOUT
+                            )
+                            if response.status_code != 404 or not policy_id:
+                                break
                         
                         if response.status_code == 200:
-                            results = response.json()
-                            st.session_state.analysis_results = results
-                            display_invoice_analysis_results(results)
+                            results = poll_analysis_job(response.json()["job_id"])
+                            if results:
+                                st.session_state.analysis_results = results
+                                display_invoice_analysis_results(results)
                         else:
                             st.error(f"Analysis failed: {response.status_code} - {response.text}")
                     
@@ -337,24 +470,24 @@ elif page == "AI Chatbot":
             if not st.session_state.chat_session_id:
                 create_new_chat_session()
             
-            with st.spinner("Getting response..."):
-                # Send query to chatbot
-                response = send_chatbot_query(user_query, st.session_state.chat_session_id)
-                
-                # Update session state
-                if response.get('session_id'):
-                    st.session_state.chat_session_id = response['session_id']
-                
-                # Add to chat history
-                chat_entry = {
-                    'user': user_query,
-                    'bot': response.get('response', 'Sorry, I could not process your request.'),
-                    'timestamp': datetime.now().isoformat()
-                }
-                st.session_state.chat_history.append(chat_entry)
-                
-                # Refresh the page to show new message
-                st.rerun()
+            # Stream the answer into the page as it is generated
+            response_placeholder = st.empty()
+            response = stream_chatbot_query(user_query, st.session_state.chat_session_id, response_placeholder)
+            
+            # Update session state
+            if response.get('session_id'):
+                st.session_state.chat_session_id = response['session_id']
+            
+            # Add to chat history
+            chat_entry = {
+                'user': user_query,
+                'bot': response.get('response') or 'Sorry, I could not process your request.',
+                'timestamp': datetime.now().isoformat()
+            }
+            st.session_state.chat_history.append(chat_entry)
+            
+            # Refresh the page to show new message
+            st.rerun()
     
     # Quick action buttons
     st.subheader("🚀 Quick Actions")
@@ -450,18 +583,20 @@ elif page == "About":
     For technical support or feature requests, please contact the development team.
     """)
     
-    # # System status
-    # st.subheader("🔧 System Status")
-    
-    # try:
-    #     # Test API connection
-    #     response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-    #     if response.status_code == 200:
-    #         st.success("✅ API Service: Online")
-    #     else:
-    #         st.error(f"❌ API Service: Error ({response.status_code})")
-    # except:
-    #     st.error("❌ API Service: Offline")
+    # System status
+    st.subheader("🔧 System Status")
+    
+    try:
+        # Test API connection
+        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        if response.status_code == 200:
+            health = response.json()
+            st.success("✅ API Service: Online")
+            st.caption(f"Invoices indexed: {health.get('invoices_indexed', 0)} | Backend memory: {health.get('rss_mb', 0)} MB")
+        else:
+            st.error(f"❌ API Service: Error ({response.status_code})")
+    except:
+        st.error("❌ API Service: Offline")
     
     # Configuration info
     st.subheader("⚙️ Configuration")